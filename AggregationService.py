@@ -0,0 +1,498 @@
+from ApiCaller import ApiCaller
+from GeoMath import GeoMath
+from SettingsService import SettingsService
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlparse
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+class AggregationService():
+    '''
+    Author: Marian Neff
+    -------------------
+    The AggregationService is an optional local server for many devices in the same area. It offers the list and prices endpoints of Tankerkoenig, so an ApiCaller only has to be pointed at it with ApiCaller.setBaseUrl() or the environment variable TANKER_API_URL.
+    Queries are not forwarded one by one. Every query is mapped to a region: a circle of REGION_RADIUS kilometers around the nearest point of a grid with REGION_STEP degrees. The region is fetched once with the type "all" and every query within it is answered from that shared copy, cut to the circle and the type of the query. Concurrent queries for a region that is being fetched wait for the same fetch.
+    Clients can subscribe to a circle through subscribe.php. They receive the stations of the circle once and afterwards only the stations whose prices changed, as one JSON object per line. Regions with subscribers are refreshed every REFRESH_INTERVAL seconds. The interval is a minute longer than the CACHE_TTL of the ApiCaller, so a forced refresh never gets the cached response of the previous one.
+    The upstream requests are sent by the ApiCaller of this process, so they share its cache, retries and circuit breaker. The service has to run in its own process, otherwise its ApiCaller would query the service itself.
+    -------------------
+    '''
+
+    REGION_STEP = 0.1
+    REGION_RADIUS = 25.0
+    REFRESH_INTERVAL = ApiCaller.CACHE_TTL + 60
+    MAX_REGIONS = 64
+    FUEL_TYPES = ('e5', 'e10', 'diesel')
+    FAILED_SOURCES = ('last_known', 'none')
+
+    def __init__(self, host='127.0.0.1', port=8765):
+        '''
+        Sets the address the service listens on. The server is only started with start() or run().
+        -------------------
+        Parameters:
+            host: string
+            port: integer, 0 for a free port
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        self.host = host
+        self.port = port
+        self.__regions = {}
+        self.__stationRegions = {}
+        self.__server = None
+        self.__refreshTask = None
+
+    @property
+    def url(self):
+        '''
+        Returns the base URL of the running service, like http://127.0.0.1:8765/json
+        '''
+
+        return 'http://' + self.host + ':' + str(self.port) + '/json'
+
+    async def start(self):
+        '''
+        Starts the server and the periodic refresh of the subscribed regions on the running event loop.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            AggregationService
+        -------------------
+        '''
+
+        self.__server = await asyncio.start_server(self.__handleConnection, self.host, self.port)
+        self.port = self.__server.sockets[0].getsockname()[1]
+        self.__refreshTask = asyncio.ensure_future(self.__refreshRegions())
+
+        return self
+
+    async def stop(self):
+        '''
+        Stops the server and the periodic refresh.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        if self.__refreshTask is not None:
+            self.__refreshTask.cancel()
+            self.__refreshTask = None
+
+        if self.__server is not None:
+            self.__server.close()
+            await self.__server.wait_closed()
+            self.__server = None
+
+    def run(self):
+        '''
+        Starts the service and blocks until the process is stopped.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        async def serve():
+            await self.start()
+            print(f'The aggregation service is listening on {self.url}')
+            await self.__server.serve_forever()
+
+        asyncio.run(serve())
+
+    async def getTankerData(self, lat, lng, radius, type):
+        '''
+        Answers a query like ApiCaller.getTankerDataAround() from the shared copy of the matching region.
+        -------------------
+        Parameters:
+            lat: float
+            lng: float
+            radius: float, range 1 - 25
+            type: string, ["e5", "e10", "diesel", "all"]
+        -------------------
+        Returns:
+            dictionary, with the structure of a response of the list endpoint, or None if the region could not be fetched
+        -------------------
+        '''
+
+        region = self.__getRegion(lat, lng, radius)
+        await self.__refresh(region)
+        if region.fetchedAt is None:
+            return None
+
+        return { "ok": True, "status": "ok", "stations": self.__project(region.stations.values(), lat, lng, radius, type) }
+
+    async def getPrices(self, ids):
+        '''
+        Answers a query of the prices endpoint from the regions the stations belong to. Expired regions are fetched again first.
+        -------------------
+        Parameters:
+            ids: list of strings
+        -------------------
+        Returns:
+            dictionary, station id -> prices, or None if one of the stations is not known
+        -------------------
+        '''
+
+        regions = {}
+        for stationId in ids:
+            regionKey = self.__stationRegions.get(stationId)
+            if regionKey is None or regionKey not in self.__regions:
+                return None
+            regions[regionKey] = self.__regions[regionKey]
+
+        await asyncio.gather(*(self.__refresh(region) for region in regions.values()))
+
+        prices = {}
+        for stationId in ids:
+            station = self.__regions[self.__stationRegions[stationId]].stations.get(stationId)
+            if station is None:
+                return None
+
+            prices[stationId] = {'status': 'open' if station.get('isOpen') else 'closed'}
+            for fuel in self.FUEL_TYPES:
+                prices[stationId][fuel] = station.get(fuel) or False
+
+        return prices
+
+    def __getRegion(self, lat, lng, radius):
+        '''
+        Returns the region that covers the circle. A circle that does not fit into the region of its grid point gets a region of its own.
+        -------------------
+        Parameters:
+            lat: float
+            lng: float
+            radius: float
+        -------------------
+        Returns:
+            _Region
+        -------------------
+        '''
+
+        (row, column) = (round(lat / self.REGION_STEP), round(lng / self.REGION_STEP))
+        (regionLat, regionLng) = (row * self.REGION_STEP, column * self.REGION_STEP)
+        if GeoMath.haversine(regionLat, regionLng, lat, lng) + radius <= self.REGION_RADIUS:
+            (key, regionRadius) = ((row, column), self.REGION_RADIUS)
+        else:
+            (regionLat, regionLng) = (round(lat, 4), round(lng, 4))
+            (key, regionRadius) = ((regionLat, regionLng, radius), radius)
+
+        region = self.__regions.get(key)
+        if region is None:
+            self.__evictRegions()
+            region = _Region(key, regionLat, regionLng, regionRadius)
+            self.__regions[key] = region
+
+        region.usedAt = time.monotonic()
+
+        return region
+
+    def __evictRegions(self):
+        '''
+        Removes the least recently used regions without subscribers until there is room for a new one.
+        '''
+
+        unused = sorted((region for region in self.__regions.values() if not region.subscribers), key=lambda region: region.usedAt)
+        while len(self.__regions) >= self.MAX_REGIONS and unused:
+            region = unused.pop(0)
+            del self.__regions[region.key]
+            for stationId in region.stations:
+                if self.__stationRegions.get(stationId) == region.key:
+                    del self.__stationRegions[stationId]
+
+    async def __refresh(self, region, force=False):
+        '''
+        Fetches the region if it has never been fetched or has expired. Concurrent calls for the same region wait for the same fetch.
+        -------------------
+        Parameters:
+            region: _Region
+            force: boolean, fetches the region even if it has not expired
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        if not force and region.fetchedAt is not None and time.monotonic() - region.fetchedAt < ApiCaller.CACHE_TTL:
+            return
+
+        if region.fetch is None:
+            region.fetch = asyncio.ensure_future(self.__fetch(region))
+
+        await asyncio.shield(region.fetch)
+
+    async def __fetch(self, region):
+        '''
+        Fetches all stations of the region upstream, stores them and pushes the changed prices to the subscribers. If the fetch fails, the previous stations are kept.
+        -------------------
+        Parameters:
+            region: _Region
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        try:
+            apiCaller = ApiCaller(SettingsService())
+            data = await asyncio.get_running_loop().run_in_executor(None, apiCaller.getTankerDataAround, region.lat, region.lng, region.radius, 'all')
+            source = apiCaller.getLastSource()
+            if source == 'none' or (source in self.FAILED_SOURCES and region.fetchedAt is not None):
+                return
+
+            changes = region.update(data.get('stations', []))
+            for stationId in region.stations:
+                self.__stationRegions[stationId] = region.key
+
+            if changes:
+                for subscriber in list(region.subscribers):
+                    stations = self.__project(changes, subscriber.lat, subscriber.lng, subscriber.radius, subscriber.type)
+                    if stations:
+                        subscriber.queue.put_nowait({ "type": "delta", "stations": stations })
+        except Exception as error:
+            print(f'An error has occurred while fetching the region {region.key}, message: {error}')
+        finally:
+            region.fetch = None
+
+    async def __refreshRegions(self):
+        while True:
+            await asyncio.sleep(self.REFRESH_INTERVAL)
+            subscribed = [region for region in self.__regions.values() if region.subscribers]
+            await asyncio.gather(*(self.__refresh(region, True) for region in subscribed), return_exceptions=True)
+
+    def __project(self, stations, lat, lng, radius, type):
+        '''
+        Cuts the stations to the circle, sets their distance to its center and reduces the prices to the type, like a response of the list endpoint.
+        -------------------
+        Parameters:
+            stations: iterable of dictionaries with the prices of all fuel types
+            lat: float
+            lng: float
+            radius: float
+            type: string
+        -------------------
+        Returns:
+            list of dictionaries, sorted by distance
+        -------------------
+        '''
+
+        projected = []
+        for station in stations:
+            dist = GeoMath.haversine(lat, lng, station.get('lat'), station.get('lng'))
+            if dist > radius:
+                continue
+
+            if type == 'all':
+                result = dict(station)
+            else:
+                result = {key: value for key, value in station.items() if key not in self.FUEL_TYPES}
+                result['price'] = station.get(type)
+            result['dist'] = round(dist, 1)
+            projected.append(result)
+
+        projected.sort(key=lambda station: station.get('dist'))
+
+        return projected
+
+    async def __handleConnection(self, reader, writer):
+        try:
+            requestLine = await reader.readline()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+
+            parts = requestLine.decode('latin-1').split()
+            if len(parts) < 2 or parts[0] != 'GET':
+                await self.__send(writer, 405, { "ok": False, "message": "Only GET requests are supported." })
+                return
+
+            url = urlparse(parts[1])
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            if url.path.endswith('/list.php'):
+                await self.__handleList(writer, query)
+            elif url.path.endswith('/prices.php'):
+                await self.__handlePrices(writer, query)
+            elif url.path.endswith('/subscribe.php'):
+                await self.__handleSubscribe(reader, writer, query)
+            else:
+                await self.__send(writer, 404, { "ok": False, "message": "Unknown endpoint." })
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def __handleList(self, writer, query):
+        circle = self.__parseCircle(query)
+        if circle is None:
+            await self.__send(writer, 400, { "ok": False, "message": "The parameters lat, lng, rad or type are missing or not allowed." })
+            return
+
+        data = await self.getTankerData(*circle)
+        if data is None:
+            await self.__send(writer, 503, { "ok": False, "message": "The stations could not be fetched upstream." })
+            return
+
+        await self.__send(writer, 200, data)
+
+    async def __handlePrices(self, writer, query):
+        ids = [stationId for stationId in query.get('ids', '').split(',') if stationId != '']
+        prices = await self.getPrices(ids) if ids else None
+        if prices is None:
+            await self.__send(writer, 200, { "ok": False, "message": "The stations are not known, query them through list.php." })
+            return
+
+        await self.__send(writer, 200, { "ok": True, "status": "ok", "prices": prices })
+
+    async def __handleSubscribe(self, reader, writer, query):
+        '''
+        Streams the stations of the circle and afterwards their changed prices as chunked NDJSON until the client disconnects.
+        The subscriber is added to the region before it is fetched, so the region can not be evicted in the meantime. Changes of that first fetch are already part of the snapshot and are dropped from the queue.
+        While waiting for changes, the connection is read as well, so a closed connection removes the subscriber right away instead of only with the next failed write.
+        -------------------
+        Parameters:
+            reader: asyncio.StreamReader
+            writer: asyncio.StreamWriter
+            query: dictionary with lat, lng, rad and type
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        circle = self.__parseCircle(query)
+        if circle is None:
+            await self.__send(writer, 400, { "ok": False, "message": "The parameters lat, lng, rad or type are missing or not allowed." })
+            return
+
+        region = self.__getRegion(circle[0], circle[1], circle[2])
+        subscriber = _Subscriber(*circle)
+        region.subscribers.append(subscriber)
+        received = None
+        nextMessage = None
+        try:
+            await self.__refresh(region)
+            if region.fetchedAt is None:
+                await self.__send(writer, 503, { "ok": False, "message": "The stations could not be fetched upstream." })
+                return
+
+            while not subscriber.queue.empty():
+                subscriber.queue.get_nowait()
+
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nTransfer-Encoding: chunked\r\nConnection: close\r\n\r\n')
+            message = { "type": "snapshot", "stations": self.__project(region.stations.values(), *circle) }
+            while True:
+                content = (json.dumps(message) + '\n').encode('utf-8')
+                writer.write(format(len(content), 'x').encode('ascii') + b'\r\n' + content + b'\r\n')
+                await writer.drain()
+
+                nextMessage = asyncio.ensure_future(subscriber.queue.get())
+                while not nextMessage.done():
+                    if received is None:
+                        received = asyncio.ensure_future(reader.read(1024))
+                    await asyncio.wait((nextMessage, received), return_when=asyncio.FIRST_COMPLETED)
+                    if received.done():
+                        if received.cancelled() or received.exception() is not None or received.result() == b'':
+                            return
+                        received = None
+
+                message = nextMessage.result()
+                nextMessage = None
+        finally:
+            region.subscribers.remove(subscriber)
+            for task in (received, nextMessage):
+                if task is not None:
+                    task.cancel()
+
+    def __parseCircle(self, query):
+        try:
+            circle = (float(query['lat']), float(query['lng']), float(query['rad']), query.get('type', 'all'))
+            SettingsService().validateSettingParameters(circle[2], circle[3])
+        except Exception:
+            return None
+
+        return circle
+
+    async def __send(self, writer, status, body):
+        content = json.dumps(body).encode('utf-8')
+        header = 'HTTP/1.1 ' + str(status) + ' ' + HTTPStatus(status).phrase + '\r\nContent-Type: application/json\r\nContent-Length: ' + str(len(content)) + '\r\nConnection: close\r\n\r\n'
+        writer.write(header.encode('latin-1') + content)
+        await writer.drain()
+
+class _Region():
+    '''
+    Author: Marian Neff
+    -------------------
+    A region of the AggregationService with its stations by id, the time of the last fetch, a running fetch and its subscribers.
+    -------------------
+    '''
+
+    def __init__(self, key, lat, lng, radius):
+        self.key = key
+        self.lat = lat
+        self.lng = lng
+        self.radius = radius
+        self.stations = {}
+        self.fetchedAt = None
+        self.usedAt = time.monotonic()
+        self.fetch = None
+        self.subscribers = []
+
+    def update(self, stations):
+        '''
+        Replaces the stations and returns the ones that are new or whose prices or opening state have changed.
+        -------------------
+        Parameters:
+            stations: list of dictionaries
+        -------------------
+        Returns:
+            list of dictionaries
+        -------------------
+        '''
+
+        changes = []
+        updated = {}
+        for station in stations:
+            previous = self.stations.get(station.get('id'))
+            if previous is None or any(previous.get(key) != station.get(key) for key in AggregationService.FUEL_TYPES + ('isOpen',)):
+                changes.append(station)
+            updated[station.get('id')] = station
+
+        self.stations = updated
+        self.fetchedAt = time.monotonic()
+
+        return changes
+
+class _Subscriber():
+    def __init__(self, lat, lng, radius, type):
+        self.lat = lat
+        self.lng = lng
+        self.radius = radius
+        self.type = type
+        self.queue = asyncio.Queue()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local aggregation service for the Tankerkoenig API.')
+    parser.add_argument('--host', default='127.0.0.1', help='address the service listens on')
+    parser.add_argument('--port', type=int, default=8765, help='port the service listens on')
+    parser.add_argument('--upstream', help='base URL of the upstream API, defaults to Tankerkoenig')
+    arguments = parser.parse_args()
+
+    if arguments.upstream is not None:
+        ApiCaller.setBaseUrl(arguments.upstream)
+
+    try:
+        AggregationService(arguments.host, arguments.port).run()
+    except KeyboardInterrupt:
+        sys.exit(0)
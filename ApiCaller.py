@@ -1,4 +1,16 @@
 from SettingsService import SettingsService
+from ResponseCache import ResponseCache
+from StationStore import StationStore
+from StationIndex import StationIndex
+from RetryPolicy import RetryPolicy
+from CircuitBreaker import CircuitBreaker
+from ApiExceptions import ApiError, FatalApiError, RetryableApiError
+from HttpTransport import HttpTransport
+from StationDataset import StationDataset
+from Metrics import Metrics
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
 import requests
 import time
 
@@ -7,12 +19,35 @@ class ApiCaller():
     Author: Marian Neff
     -------------------
     The ApiCaller is a service that is used to communicate with the Tankerkoenig API. The api returns all the different petrol stations within a chosen radius around the user's location.
-    The class constants KEY and URL are used to put together the correct API url.
+    The class constants KEY and URL are used to put together the correct API url. Both URLs are built from BASE_URL, which can be set with the environment variable TANKER_API_URL or setBaseUrl(), for example to query a local AggregationService instead of Tankerkoenig.
+    Responses are kept in the process-wide RESPONSE_CACHE, so every ApiCaller instance shares them and the API is queried at most once per CACHE_TTL for the same query.
+    The station metadata of an area is kept in the STATION_STORE. As long as the area and the radius stay the same, only the current prices of the known stations are queried through the prices endpoint.
+    Queries within the circle of a fresh response, like a smaller radius or a slightly moved location, are answered locally by the STATION_INDEX.
+    Every area is only fetched and cached with the type "all", which contains the prices of every fuel type. The views of a single fuel type are projected from it in memory, so switching the fuel type needs no API call.
+    All instances send their requests through the pooled session of the HttpTransport. Failed requests are retried according to the RETRY_POLICY. Once the API keeps failing, the CIRCUIT_BREAKER stops further requests for a while and the last successful response is returned instead.
+    Where a query is answered from, the duration and the attempts of every request are recorded in the Metrics.
     -------------------
     '''
 
     KEY = '1e89035b-ed46-fdc3-4baf-feff2614dc10'
-    URL = 'https://creativecommons.tankerkoenig.de/json/list.php'
+    BASE_URL = os.environ.get('TANKER_API_URL', 'https://creativecommons.tankerkoenig.de/json').rstrip('/')
+    URL = BASE_URL + '/list.php'
+    PRICES_URL = BASE_URL + '/prices.php'
+    PRICES_BATCH_SIZE = 10
+    PRICES_MAX_WORKERS = 4
+    FUEL_TYPES = ('e5', 'e10', 'diesel')
+    CACHE_TTL = 300
+    CACHE_MAX_ENTRIES = 32
+    STATION_METADATA_MAX_AGE = StationStore.MAX_AGE
+    RESPONSE_CACHE = ResponseCache(CACHE_TTL, CACHE_MAX_ENTRIES)
+    STATION_STORE = StationStore()
+    STATION_INDEX = StationIndex(CACHE_TTL)
+    RETRY_POLICY = RetryPolicy()
+    CIRCUIT_BREAKER = CircuitBreaker()
+
+    __lastDataset = None
+    __lastDatasetLock = threading.Lock()
+    __projections = {}
 
     def __init__(self, settingsService):
         '''
@@ -28,32 +63,437 @@ class ApiCaller():
 
         assert isinstance(settingsService, SettingsService)
         self.__settingsService = settingsService
-        self.__session = requests.Session()
+        self.__session = HttpTransport.getSession()
+        self.__rateLimiter = None
+        self.__local = threading.local()
+
+    def setRateLimiter(self, rateLimiter):
+        '''
+        Throttles every single request of this instance to the API, including retries and the batches of the prices endpoint.
+        -------------------
+        Parameters:
+            rateLimiter: RateLimiter or None
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        self.__rateLimiter = rateLimiter
+
+    @classmethod
+    def setBaseUrl(cls, baseUrl):
+        '''
+        Points every instance at another server with the same endpoints as Tankerkoenig. The cached responses of the previous server are dropped.
+        -------------------
+        Parameters:
+            baseUrl: string, like "http://127.0.0.1:8765/json"
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        cls.BASE_URL = baseUrl.rstrip('/')
+        cls.URL = cls.BASE_URL + '/list.php'
+        cls.PRICES_URL = cls.BASE_URL + '/prices.php'
+        cls.RESPONSE_CACHE.invalidate()
+        cls.STATION_INDEX.clear()
 
     def getQueriedTankerData(self):
         '''
         Uses the provided location values to query the Tankerkoenig API and get back matching values. The settings and the location values for the API call are loaded through the SettingsService class.
-        Retries the API call 3 times in case there is an issue.
+        Identical queries are answered from the shared RESPONSE_CACHE and concurrent identical queries share one request.
+        If the API can not be reached, the last successful response for the query is returned, even if it is older than CACHE_TTL.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            dictionary
+        -------------------
+        '''
+
+        query = self.__loadQuery()
+        if query is None:
+            return { "stations": [] }
+
+        return self.getTankerDataAround(*query)
+
+    def getQueriedStationDataset(self):
+        '''
+        Returns the response of getQueriedTankerData() as a StationDataset. The dataset is built directly from the cached response of the type "all". As long as that response comes from the cache, the same dataset is returned to every caller, so it is only built once per response and type.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            StationDataset
+        -------------------
+        '''
+
+        query = self.__loadQuery()
+        if query is None:
+            return StationDataset({ "stations": [] }, 'all')
+
+        (lat, long, radius, type) = query
+        data = self.__getAreaData(lat, long, radius)
+
+        with ApiCaller.__lastDatasetLock:
+            lastDataset = ApiCaller.__lastDataset
+            if lastDataset is not None and lastDataset[0] is data and lastDataset[1] == type:
+                return lastDataset[2]
+
+        dataset = StationDataset(data, type)
+        with ApiCaller.__lastDatasetLock:
+            ApiCaller.__lastDataset = (data, type, dataset)
+
+        return dataset
+
+    def getTankerDataAround(self, lat, long, radius, type):
+        '''
+        Queries the Tankerkoenig API for the stations around the provided location, independent of the saved settings.
+        It shares the RESPONSE_CACHE and the fallback to the last successful response with getQueriedTankerData().
+        A query that lies completely within the circle of a fresh response is answered by the STATION_INDEX without an API call.
+        For a single fuel type, the response of the type "all" is projected to the structure of a response of that type.
+        -------------------
+        Parameters:
+            lat: float
+            long: float
+            radius: float, range 1 - 25
+            type: string, ["e5", "e10", "diesel", "all"]
+        -------------------
+        Returns:
+            dictionary
+        -------------------
+        '''
+
+        return self.__project(self.__getAreaData(lat, long, radius), type)
+
+    def __loadQuery(self):
+        '''
+        Loads the settings and the location for a query.
         -------------------
         Parameters:
             none
         -------------------
+        Returns:
+            tupel, (lat, long, radius, type), or None if they could not be loaded
+        -------------------
+        '''
+
+        try:
+            settings = self.__settingsService.loadSettings()
+            (lat, long) = self.__settingsService.loadLocationSettings()
+        except Exception as error:
+            print(f'An error has occurred while preparing the API call, message: {error}')
+
+            return None
+
+        return (lat, long, settings.get('radius'), settings.get('type'))
+
+    def __getAreaData(self, lat, long, radius):
+        '''
+        Returns the stations around the location with the prices of every fuel type, from the RESPONSE_CACHE, the STATION_INDEX, the API or the last successful response, in this order.
+        -------------------
+        Parameters:
+            lat: float
+            long: float
+            radius: float, range 1 - 25
+        -------------------
         Returns:
             dictionary
         -------------------
         '''
-        attempts = 3
 
-        while attempts is not 0:
-            try: 
-                settings = self.__settingsService.loadSettings()
-                (lat, long) = self.__settingsService.loadLocationSettings()
-                url = self.URL + "?lat=" + str(lat) + '&lng=' + str(long) + '&rad=' + str(settings.get('radius')) + '&sort=dist&type=' + settings.get('type') + '&apikey=' + self.KEY
-                data = self.__session.get(url, timeout=5)
+        try:
+            key = ResponseCache.normalizeKey(lat, long, radius, 'all')
+        except Exception as error:
+            print(f'An error has occurred while preparing the API call, message: {error}')
 
-                return data.json()
-            except Exception as error:
+            return { "stations": [] }
+
+        source = 'cache'
+        data = self.RESPONSE_CACHE.get(key)
+        if data is None:
+            source = 'index'
+            data = self.STATION_INDEX.query(*key)
+
+        if data is None:
+            source = 'api'
+            data = self.RESPONSE_CACHE.getOrFetch(key, lambda: self.__requestAndIndexTankerData(*key))
+
+        if data is None:
+            source = 'last_known'
+            data = self.RESPONSE_CACHE.getLastKnown(key)
+
+        if data is None:
+            source = 'none'
+            data = { "stations": [] }
+
+        Metrics.increment('queries', source=source)
+        self.__local.source = source
+
+        return data
+
+    def __project(self, data, type):
+        '''
+        Reduces a response of the type "all" to the structure of a response of a single fuel type: the fuel prices are replaced by the price of the type.
+        The last projection of every type is kept, so repeated queries of the same cached response return the same dictionary.
+        -------------------
+        Parameters:
+            data: dictionary, response of the type "all"
+            type: string, ["e5", "e10", "diesel", "all"]
+        -------------------
+        Returns:
+            dictionary
+        -------------------
+        '''
+
+        if type == 'all':
+            return data
+
+        with ApiCaller.__lastDatasetLock:
+            projection = ApiCaller.__projections.get(type)
+            if projection is not None and projection[0] is data:
+                return projection[1]
+
+        stations = []
+        for station in data.get('stations', []):
+            projected = {key: value for key, value in station.items() if key not in self.FUEL_TYPES}
+            projected['price'] = station.get(type)
+            stations.append(projected)
+
+        projected = dict(data, stations=stations)
+        with ApiCaller.__lastDatasetLock:
+            ApiCaller.__projections[type] = (data, projected)
+
+        return projected
+
+    def getLastSource(self):
+        '''
+        Returns where the last query of this instance on the current thread was answered from. "last_known" and "none" mean that the API could not be reached.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            string or None, ["cache", "index", "api", "last_known", "none"]
+        -------------------
+        '''
+
+        return getattr(self.__local, 'source', None)
+
+    def __requestAndIndexTankerData(self, lat, long, radius, type):
+        '''
+        Queries the Tankerkoenig API for the provided values and adds a successful response to the STATION_INDEX.
+        -------------------
+        Parameters:
+            lat: float
+            long: float
+            radius: float
+            type: string
+        -------------------
+        Returns:
+            dictionary or None
+        -------------------
+        '''
+        data = self.__requestTankerData(lat, long, radius, type)
+        if data is not None:
+            self.STATION_INDEX.add(lat, long, radius, type, data)
+
+        return data
+
+    def __requestTankerData(self, lat, long, radius, type):
+        '''
+        Queries the Tankerkoenig API for the provided values. If the stations of the area are known, only their prices are queried, otherwise the whole list is queried and its stations are saved.
+        -------------------
+        Parameters:
+            lat: float
+            long: float
+            radius: float
+            type: string
+        -------------------
+        Returns:
+            dictionary or None
+        -------------------
+        '''
+        areaKey = (lat, long, radius)
+        stations = self.STATION_STORE.loadArea(areaKey, self.STATION_METADATA_MAX_AGE)
+        if stations is not None:
+            data = self.__requestPrices(stations, type)
+            if data is not None:
+                return data
+
+        data = self.__requestStationList(lat, long, radius, type)
+        if data is not None:
+            self.STATION_STORE.saveArea(areaKey, data.get('stations'))
+
+        return data
+
+    def __requestStationList(self, lat, long, radius, type):
+        '''
+        Queries the list endpoint of the Tankerkoenig API for the provided values.
+        -------------------
+        Parameters:
+            lat: float
+            long: float
+            radius: float
+            type: string
+        -------------------
+        Returns:
+            dictionary or None
+        -------------------
+        '''
+        url = self.URL + "?lat=" + str(lat) + '&lng=' + str(long) + '&rad=' + str(radius) + '&sort=dist&type=' + type + '&apikey=' + self.KEY
+
+        return self.__request(url, 'stations')
+
+    def __requestPrices(self, stations, type):
+        '''
+        Queries the current prices of the provided stations in batches of PRICES_BATCH_SIZE, which are sent concurrently, and merges them into the stations.
+        The result has the same structure as a response of the list endpoint for the type.
+        -------------------
+        Parameters:
+            stations: list of dictionaries without prices
+            type: string
+        -------------------
+        Returns:
+            dictionary or None if one of the batches failed
+        -------------------
+        '''
+        ids = [station.get('id') for station in stations]
+        batches = [ids[index:index + self.PRICES_BATCH_SIZE] for index in range(0, len(ids), self.PRICES_BATCH_SIZE)]
+        if batches == []:
+            return { "ok": True, "stations": [] }
+
+        with ThreadPoolExecutor(max_workers=min(self.PRICES_MAX_WORKERS, len(batches))) as executor:
+            results = list(executor.map(self.__requestPriceBatch, batches))
+
+        if None in results:
+            return None
+
+        prices = {}
+        for result in results:
+            prices.update(result)
+
+        mergedStations = []
+        for station in stations:
+            stationPrices = prices.get(station.get('id'), {})
+            merged = dict(station)
+            merged['isOpen'] = stationPrices.get('status') == 'open'
+            fuelPrices = {fuel: stationPrices.get(fuel) or None for fuel in self.FUEL_TYPES}
+            if type == 'all':
+                merged.update(fuelPrices)
+            else:
+                merged['price'] = fuelPrices.get(type)
+            mergedStations.append(merged)
+
+        return { "ok": True, "stations": mergedStations }
+
+    def __requestPriceBatch(self, ids):
+        '''
+        Queries the prices endpoint of the Tankerkoenig API for up to PRICES_BATCH_SIZE stations.
+        -------------------
+        Parameters:
+            ids: list of strings
+        -------------------
+        Returns:
+            dictionary, station id -> prices, or None
+        -------------------
+        '''
+        url = self.PRICES_URL + '?ids=' + ','.join(ids) + '&apikey=' + self.KEY
+        data = self.__request(url, 'prices')
+        if data is None:
+            return None
+
+        return data.get('prices')
+
+    def __request(self, url, expectedKey):
+        '''
+        Retries the request according to the RETRY_POLICY and sends every attempt through the CIRCUIT_BREAKER, so that each failed attempt counts towards opening the circuit.
+        -------------------
+        Parameters:
+            url: string
+            expectedKey: string, key the response has to contain
+        -------------------
+        Returns:
+            dictionary or None if the request failed
+        -------------------
+        '''
+
+        endpoint = 'prices' if expectedKey == 'prices' else 'list'
+        attempts = [0]
+
+        def getJson():
+            attempts[0] += 1
+
+            return self.__getJson(url, expectedKey, endpoint)
+
+        outcome = 'ok'
+        with Metrics.span('api.' + endpoint) as span, Metrics.timer('api_request_duration_ms', endpoint=endpoint):
+            try:
+                return self.RETRY_POLICY.run(lambda: self.CIRCUIT_BREAKER.call(getJson))
+            except ApiError as error:
+                outcome = type(error).__name__
                 print(f'An error has occurred during the API call, message: {error}')
-                attempts -= 1
 
-        return { "stations": [] }
\ No newline at end of file
+                return None
+            finally:
+                Metrics.increment('api_requests', endpoint=endpoint, outcome=outcome)
+                Metrics.observe('api_request_attempts', attempts[0], endpoint=endpoint)
+                if span is not None:
+                    span.end(attempts=attempts[0], outcome=outcome)
+
+    def __getJson(self, url, expectedKey, endpoint):
+        '''
+        Sends a single request and sorts out failures into retryable and fatal errors. Every attempt is counted with its status in the Metrics.
+        -------------------
+        Parameters:
+            url: string
+            expectedKey: string, key the response has to contain
+            endpoint: string, name of the endpoint in the Metrics
+        -------------------
+        Returns:
+            dictionary
+        -------------------
+        Raises:
+            RetryableApiError
+            FatalApiError
+        -------------------
+        '''
+
+        if self.__rateLimiter is not None:
+            self.__rateLimiter.acquire()
+
+        try:
+            with Metrics.timer('api_attempt_duration_ms', endpoint=endpoint):
+                response = self.__session.get(url, timeout=self.RETRY_POLICY.getTimeout())
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as error:
+            Metrics.increment('api_attempts', endpoint=endpoint, status=type(error).__name__)
+            raise RetryableApiError(str(error))
+        except requests.exceptions.RequestException as error:
+            Metrics.increment('api_attempts', endpoint=endpoint, status=type(error).__name__)
+            raise FatalApiError(str(error))
+
+        Metrics.increment('api_attempts', endpoint=endpoint, status=str(response.status_code))
+
+        if self.RETRY_POLICY.isRetryableStatus(response.status_code):
+            retryAfter = self.RETRY_POLICY.parseRetryAfter(response.headers.get('Retry-After'))
+            raise RetryableApiError('The API responded with status ' + str(response.status_code) + '.', retryAfter)
+
+        if response.status_code != 200:
+            raise FatalApiError('The API responded with status ' + str(response.status_code) + '.')
+
+        try:
+            data = response.json()
+        except ValueError as error:
+            raise FatalApiError('The response could not be read, message: ' + str(error))
+
+        if not isinstance(data, dict):
+            raise FatalApiError('The response is not a JSON object.')
+
+        if not data.get('ok', True) or expectedKey not in data:
+            raise FatalApiError(data.get('message', 'The response does not contain any ' + expectedKey + '.'))
+
+        return data
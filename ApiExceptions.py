@@ -0,0 +1,49 @@
+class ApiError(Exception):
+    '''
+    Author: Marian Neff
+    -------------------
+    The ApiError is an exception that is raised whenever a request to the Tankerkoenig API fails within the ApiCaller class.
+    It serves as a foundation for further inheritance to define more precise errors and inherits from the default Exception.
+    -------------------
+    '''
+
+    def __init__(self, message):
+        super().__init__(message)
+
+class RetryableApiError(ApiError):
+        '''
+        Author: Marian Neff
+        -------------------
+        The RetryableApiError is an exception that is raised when a request failed for a temporary reason, like a timeout, a lost connection, a rate limit or an error of the server.
+        The retryAfter value holds the seconds the server asked to wait before the next request, if it sent a Retry-After header.
+        It inherits the ApiError.
+        -------------------
+        '''
+
+        def __init__(self, message, retryAfter=None):
+            super().__init__(message)
+            self.retryAfter = retryAfter
+
+class FatalApiError(ApiError):
+        '''
+        Author: Marian Neff
+        -------------------
+        The FatalApiError is an exception that is raised when a request failed for a reason that will not go away by retrying it, like an invalid request or a response that can not be read.
+        It inherits the ApiError.
+        -------------------
+        '''
+
+        def __init__(self, message):
+            super().__init__(message)
+
+class CircuitOpenError(ApiError):
+        '''
+        Author: Marian Neff
+        -------------------
+        The CircuitOpenError is an exception that is raised without sending a request while the CircuitBreaker considers the API to be down.
+        It inherits the ApiError.
+        -------------------
+        '''
+
+        def __init__(self, message):
+            super().__init__(message)
@@ -0,0 +1,142 @@
+from concurrent.futures import ThreadPoolExecutor
+from kivy.clock import Clock
+import threading
+
+class BackgroundLoader():
+    '''
+    Author: Marian Neff
+    -------------------
+    The BackgroundLoader runs blocking work like API calls and geocoding on a small pool of worker threads, so that the Kivy main thread keeps rendering frames.
+    Results are handed back to the main thread through the kivy Clock. Every task belongs to a channel and a newer task on the same channel makes older ones stale, so their results are discarded instead of overwriting newer data.
+    -------------------
+    '''
+
+    MAX_WORKERS = 4
+
+    __sharedLoader = None
+    __sharedLock = threading.Lock()
+
+    def __init__(self, maxWorkers=MAX_WORKERS):
+        '''
+        Creates the worker pool used to run the tasks.
+        -------------------
+        Parameters:
+            maxWorkers: integer
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        self.__executor = ThreadPoolExecutor(max_workers=maxWorkers, thread_name_prefix='BackgroundLoader')
+        self.__lock = threading.Lock()
+        self.__generations = {}
+        self.__futures = {}
+
+    @classmethod
+    def shared(cls):
+        '''
+        Returns the loader shared by the whole application.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            BackgroundLoader
+        -------------------
+        '''
+
+        with cls.__sharedLock:
+            if cls.__sharedLoader is None:
+                cls.__sharedLoader = cls()
+
+            return cls.__sharedLoader
+
+    def submit(self, channel, task, onSuccess=None, onError=None):
+        '''
+        Runs the task on a worker thread. Once it finishes, onSuccess is called with its result or onError with the raised exception, both on the main thread.
+        Submitting a task makes every earlier task of the same channel stale: queued ones are cancelled and the results of running ones are dropped.
+        -------------------
+        Parameters:
+            channel: string
+            task: function without parameters
+            onSuccess: function with one parameter or None
+            onError: function with one parameter or None
+        -------------------
+        Returns:
+            integer, the generation of the submitted task
+        -------------------
+        '''
+
+        with self.__lock:
+            generation = self.__generations.get(channel, 0) + 1
+            self.__generations[channel] = generation
+            previousFuture = self.__futures.get(channel)
+            if previousFuture is not None:
+                previousFuture.cancel()
+
+            future = self.__executor.submit(task)
+            self.__futures[channel] = future
+
+        future.add_done_callback(lambda finished: self.__deliver(channel, generation, finished, onSuccess, onError))
+
+        return generation
+
+    def cancel(self, channel):
+        '''
+        Makes the running or queued task of the channel stale without starting a new one.
+        -------------------
+        Parameters:
+            channel: string
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        with self.__lock:
+            self.__generations[channel] = self.__generations.get(channel, 0) + 1
+            future = self.__futures.pop(channel, None)
+
+        if future is not None:
+            future.cancel()
+
+    def isCurrent(self, channel, generation):
+        '''
+        Checks whether the provided generation is still the newest one of the channel.
+        -------------------
+        Parameters:
+            channel: string
+            generation: integer
+        -------------------
+        Returns:
+            boolean
+        -------------------
+        '''
+
+        with self.__lock:
+            return self.__generations.get(channel) == generation
+
+    def __deliver(self, channel, generation, future, onSuccess, onError):
+        if future.cancelled():
+            return
+
+        error = future.exception()
+
+        def dispatch(dt):
+            if not self.isCurrent(channel, generation):
+                return
+
+            with self.__lock:
+                if self.__futures.get(channel) is future:
+                    del self.__futures[channel]
+
+            if error is not None:
+                if onError is not None:
+                    onError(error)
+                else:
+                    print(f'An error has occurred in the background task "{channel}", message: {error}')
+            elif onSuccess is not None:
+                onSuccess(future.result())
+
+        Clock.schedule_once(dispatch)
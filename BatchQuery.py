@@ -0,0 +1,191 @@
+from ApiCaller import ApiCaller
+from GeoMath import GeoMath
+from RateLimiter import RateLimiter
+from SettingsService import SettingsService
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import math
+
+class BatchQuery():
+    '''
+    Author: Marian Neff
+    -------------------
+    The BatchQuery answers queries that are larger than a single API call allows, like the stations along a route or within a large area.
+    The area is covered with overlapping circles of at most MAX_RADIUS kilometers. The circles are queried concurrently through the ApiCaller and the stations are streamed back as soon as they arrive, each station only once.
+    The RateLimiter is attached to the ApiCaller, so it throttles every single HTTP request, not only every circle. Circles that could not be queried from the API are reported as failed.
+    -------------------
+    '''
+
+    MAX_RADIUS = 25.0
+    MAX_WORKERS = 4
+    REQUESTS_PER_SECOND = 1.0
+    FAILED_SOURCES = ('last_known', 'none')
+
+    def __init__(self, apiCaller, maxWorkers=MAX_WORKERS, rateLimiter=None):
+        '''
+        Sets the required dependencies for the class and attaches the rate limiter to the apiCaller.
+        -------------------
+        Parameters:
+            apiCaller: ApiCaller
+            maxWorkers: integer, amount of concurrent API calls
+            rateLimiter: RateLimiter or None, a limiter with REQUESTS_PER_SECOND for every HTTP request is used if none is provided
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        assert isinstance(apiCaller, ApiCaller)
+        self.__apiCaller = apiCaller
+        self.__maxWorkers = maxWorkers
+        self.__rateLimiter = rateLimiter if rateLimiter is not None else RateLimiter(self.REQUESTS_PER_SECOND)
+        self.__apiCaller.setRateLimiter(self.__rateLimiter)
+
+    def coverPoints(self, points, radius):
+        '''
+        Returns one circle for every point.
+        -------------------
+        Parameters:
+            points: list of tupels, (lat, lon)
+            radius: float, range 1 - 25
+        -------------------
+        Returns:
+            list of tupels, (lat, lon, radius)
+        -------------------
+        Raises:
+            UnallowedRadiusError
+        -------------------
+        '''
+
+        SettingsService().validateSettingParameters(radius, 'all')
+
+        return [(lat, lon, float(radius)) for (lat, lon) in points]
+
+    def coverPolyline(self, points, corridorWidth, radius=MAX_RADIUS):
+        '''
+        Returns circles along the polyline that together cover a corridor of corridorWidth kilometers on each side of it.
+        Two neighbouring circles overlap enough that the corridor has no gaps, which requires the corridor to be narrower than the radius.
+        -------------------
+        Parameters:
+            points: list of tupels, (lat, lon)
+            corridorWidth: float, kilometers on each side of the route
+            radius: float, range 1 - 25
+        -------------------
+        Returns:
+            list of tupels, (lat, lon, radius)
+        -------------------
+        Raises:
+            UnallowedRadiusError
+            ValueError
+        -------------------
+        '''
+
+        SettingsService().validateSettingParameters(radius, 'all')
+        if corridorWidth <= 0 or corridorWidth >= radius:
+            raise ValueError('The corridor width of ' + str(corridorWidth) + ' km has to be between 0 and the radius of ' + str(radius) + ' km.')
+
+        spacing = 2 * math.sqrt(radius ** 2 - corridorWidth ** 2)
+
+        return [(lat, lon, float(radius)) for (lat, lon) in GeoMath.samplePolyline(points, spacing)]
+
+    def coverBoundingBox(self, latMin, lonMin, latMax, lonMax, radius=MAX_RADIUS):
+        '''
+        Returns circles on a hexagonal grid that together cover the whole bounding box.
+        -------------------
+        Parameters:
+            latMin: float
+            lonMin: float
+            latMax: float
+            lonMax: float
+            radius: float, range 1 - 25
+        -------------------
+        Returns:
+            list of tupels, (lat, lon, radius)
+        -------------------
+        Raises:
+            UnallowedRadiusError
+        -------------------
+        '''
+
+        SettingsService().validateSettingParameters(radius, 'all')
+        rowSpacing = 1.5 * radius
+        columnSpacing = math.sqrt(3) * radius
+        height = GeoMath.haversine(latMin, lonMin, latMax, lonMin)
+        rows = int(math.ceil(height / rowSpacing)) + 1
+
+        circles = []
+        for row in range(rows):
+            (lat, ignored) = GeoMath.offset(latMin, lonMin, row * rowSpacing, 0)
+            width = GeoMath.haversine(lat, lonMin, lat, lonMax)
+            shift = columnSpacing / 2 if row % 2 == 1 else 0
+            columns = int(math.ceil((width + shift) / columnSpacing)) + 1
+            for column in range(columns):
+                circles.append(GeoMath.offset(lat, lonMin, 0, column * columnSpacing - shift) + (float(radius),))
+
+        return circles
+
+    def stream(self, circles, type, failedCircles=None):
+        '''
+        Queries every circle and yields the stations as soon as their circle has been answered. Stations that were already yielded for another circle are skipped.
+        The "dist" of a station refers to the center of the circle it was first found in.
+        A circle fails if the API could not be reached. Its last known stations are still yielded, if there are any, and the circle is appended to failedCircles.
+        -------------------
+        Parameters:
+            circles: list of tupels, (lat, lon, radius)
+            type: string, ["e5", "e10", "diesel", "all"]
+            failedCircles: list or None, receives the failed circles
+        -------------------
+        Returns:
+            generator of dictionaries
+        -------------------
+        '''
+
+        seenIds = set()
+        executor = ThreadPoolExecutor(max_workers=self.__maxWorkers)
+        try:
+            futures = [executor.submit(self.__queryCircle, circle, type) for circle in circles]
+            for future in as_completed(futures):
+                (circle, stations, source) = future.result()
+                if source in self.FAILED_SOURCES and failedCircles is not None:
+                    failedCircles.append(circle)
+
+                for station in stations:
+                    stationId = station.get('id')
+                    if stationId in seenIds:
+                        continue
+
+                    seenIds.add(stationId)
+                    yield station
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def query(self, circles, type):
+        '''
+        Queries every circle and returns the merged stations sorted by their distance. "ok" is only true if every circle could be queried from the API, the others are listed in "failedCircles".
+        -------------------
+        Parameters:
+            circles: list of tupels, (lat, lon, radius)
+            type: string, ["e5", "e10", "diesel", "all"]
+        -------------------
+        Returns:
+            dictionary
+        -------------------
+        '''
+
+        failedCircles = []
+        stations = sorted(self.stream(circles, type, failedCircles), key=lambda station: station.get('dist', 0))
+
+        return { "ok": failedCircles == [], "stations": stations, "failedCircles": failedCircles }
+
+    def __queryCircle(self, circle, type):
+        '''
+        Queries the stations of a single circle. This runs on a worker thread.
+        -------------------
+        Returns:
+            tupel, (circle, stations, source of the ApiCaller)
+        -------------------
+        '''
+
+        (lat, lon, radius) = circle
+        stations = self.__apiCaller.getTankerDataAround(lat, lon, radius, type).get('stations', [])
+
+        return (circle, stations, self.__apiCaller.getLastSource())
@@ -0,0 +1,30 @@
+'''
+Author: Marc Lepold
+-------------------
+Hooks of python-for-android, registered in buildozer.spec as p4a.hook.
+Before the APK is built, the postal code table of the PostalCodeLookup is created from the GeoNames export in the app directory that python-for-android packs into the APK. buildozer has copied the sources there already, so a table in the project directory would not be bundled.
+The export is only accepted with the checksum GEONAMES_SHA256, which has to be updated together with the export. The verified download is kept in DOWNLOAD_FILE_NAME, so later builds do not download it again. The environment variables TANKER_PLZ_SOURCE and TANKER_PLZ_SHA256 replace the URL and the checksum.
+-------------------
+'''
+
+import os
+import sys
+
+ROOT_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT_DIRECTORY)
+
+from PostalCodeLookup import PostalCodeLookup
+
+GEONAMES_SHA256 = ''
+DOWNLOAD_FILE_NAME = os.path.join(ROOT_DIRECTORY, '.buildozer', 'geonames', 'DE.zip')
+
+def before_apk_build(toolchain):
+    sha256 = os.environ.get('TANKER_PLZ_SHA256', GEONAMES_SHA256)
+    if not sha256:
+        raise RuntimeError('The checksum of the GeoNames export is not pinned. Set GEONAMES_SHA256 in BuildHooks.py to the SHA-256 of ' + PostalCodeLookup.GEONAMES_URL + '.')
+
+    appDirectory = getattr(getattr(toolchain, 'args', None), 'private', None) or ROOT_DIRECTORY
+    tableFileName = os.path.join(appDirectory, PostalCodeLookup.TABLE_FILE_NAME)
+    source = os.environ.get('TANKER_PLZ_SOURCE', PostalCodeLookup.GEONAMES_URL)
+    count = PostalCodeLookup.buildTableFromGeoNames(source, tableFileName, sha256, DOWNLOAD_FILE_NAME)
+    print(f'The postal code table {tableFileName} has been created with {count} postal codes.')
@@ -0,0 +1,102 @@
+from ApiExceptions import CircuitOpenError, RetryableApiError
+import threading
+import time
+
+class CircuitBreaker():
+    '''
+    Author: Marian Neff
+    -------------------
+    The CircuitBreaker stops requests to the Tankerkoenig API for a while once it keeps failing, so that callers fail fast instead of waiting for timeouts and the server is not flooded with further requests.
+    Every single attempt of a request goes through the breaker, so the retries of the RetryPolicy count as well. After failureThreshold failed attempts in a row the circuit opens and every call raises a CircuitOpenError, which is not retried. Once resetTimeout seconds have passed, a single trial call is let through: if it succeeds the circuit closes again, otherwise it stays open.
+    Only RetryableApiErrors count as failures, errors caused by the request itself say nothing about the state of the server.
+    -------------------
+    '''
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failureThreshold=3, resetTimeout=60.0):
+        '''
+        Sets the values of the breaker.
+        -------------------
+        Parameters:
+            failureThreshold: integer, failed attempts in a row before the circuit opens
+            resetTimeout: float, seconds the circuit stays open
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        self.failureThreshold = failureThreshold
+        self.resetTimeout = resetTimeout
+        self.__lock = threading.Lock()
+        self.__state = self.CLOSED
+        self.__failures = 0
+        self.__openedAt = 0.0
+
+    def getState(self):
+        '''
+        Returns the current state of the circuit.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            string, "closed", "open" or "half-open"
+        -------------------
+        '''
+
+        with self.__lock:
+            return self.__state
+
+    def call(self, request):
+        '''
+        Calls the request if the circuit allows it and records its outcome.
+        -------------------
+        Parameters:
+            request: function without parameters
+        -------------------
+        Returns:
+            any, the result of the request
+        -------------------
+        Raises:
+            CircuitOpenError, if the circuit is open
+            ApiError, if the request failed
+        -------------------
+        '''
+
+        with self.__lock:
+            if self.__state == self.OPEN:
+                if time.monotonic() - self.__openedAt < self.resetTimeout:
+                    raise CircuitOpenError('The API is currently unavailable, the request was not sent.')
+
+                self.__state = self.HALF_OPEN
+            elif self.__state == self.HALF_OPEN:
+                raise CircuitOpenError('The API is currently being checked, the request was not sent.')
+
+        try:
+            result = request()
+        except RetryableApiError:
+            self.__recordFailure()
+            raise
+        except Exception:
+            self.__recordSuccess()
+            raise
+
+        self.__recordSuccess()
+
+        return result
+
+    def __recordSuccess(self):
+        with self.__lock:
+            self.__state = self.CLOSED
+            self.__failures = 0
+
+    def __recordFailure(self):
+        with self.__lock:
+            self.__failures += 1
+            if self.__state == self.HALF_OPEN or self.__failures >= self.failureThreshold:
+                self.__state = self.OPEN
+                self.__openedAt = time.monotonic()
@@ -0,0 +1,75 @@
+from StationDataset import StationDataset
+import os
+import struct
+import threading
+import time
+
+class DatasetSnapshot():
+    '''
+    Author: Marian Neff
+    -------------------
+    The DatasetSnapshot keeps the last successfully fetched StationDataset on disk together with the location it was fetched for, so the map and the table can show it right at the start of the app and while the device is offline.
+    The file holds the location followed by the binary format of the StationDataset, so loading it needs no JSON parsing of the stations and no processing of prices. A loaded dataset is marked as stale until fresh data replaces it.
+    -------------------
+    '''
+
+    FILE_NAME = 'last_dataset.bin'
+    LOCATION = struct.Struct('<dd')
+
+    __lock = threading.Lock()
+
+    def __init__(self, fileName=FILE_NAME):
+        self.__fileName = fileName
+
+    def save(self, lat, lon, dataset, fetchedAt=None):
+        '''
+        Writes the dataset and its location atomically, so a reader never sees a partially written snapshot.
+        -------------------
+        Parameters:
+            lat: float
+            lon: float
+            dataset: StationDataset
+            fetchedAt: float or None, defaults to now
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        dataset.fetchedAt = fetchedAt if fetchedAt is not None else time.time()
+        content = self.LOCATION.pack(lat, lon) + dataset.toBytes()
+        temporaryFileName = self.__fileName + '.tmp'
+        with DatasetSnapshot.__lock:
+            with open(temporaryFileName, 'wb') as snapshotFile:
+                snapshotFile.write(content)
+            os.replace(temporaryFileName, self.__fileName)
+
+    def load(self):
+        '''
+        Reads the snapshot. The returned dataset is marked as stale.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            tupel, (lat, lon, dataset), or None if there is no readable snapshot
+        -------------------
+        '''
+
+        try:
+            with DatasetSnapshot.__lock:
+                with open(self.__fileName, 'rb') as snapshotFile:
+                    content = snapshotFile.read()
+
+            (lat, lon) = self.LOCATION.unpack_from(content, 0)
+            dataset = StationDataset.fromBytes(memoryview(content)[self.LOCATION.size:])
+        except FileNotFoundError:
+            return None
+        except Exception as error:
+            print(f'The saved station data could not be loaded, message: {error}')
+
+            return None
+
+        dataset.isStale = True
+
+        return (lat, lon, dataset)
@@ -0,0 +1,84 @@
+import math
+
+class GeoMath():
+    '''
+    Author: Marian Neff
+    -------------------
+    The GeoMath class bundles the calculations on coordinates that are needed to query and filter petrol stations, like distances and positions along a route.
+    All distances are in kilometers and all coordinates in degrees.
+    -------------------
+    '''
+
+    EARTH_RADIUS = 6371.0
+
+    @staticmethod
+    def haversine(lat1, lon1, lat2, lon2):
+        '''
+        Calculates the great circle distance between two coordinates.
+        -------------------
+        Parameters:
+            lat1: float
+            lon1: float
+            lat2: float
+            lon2: float
+        -------------------
+        Returns:
+            float
+        -------------------
+        '''
+
+        phi1 = math.radians(lat1)
+        phi2 = math.radians(lat2)
+        deltaPhi = phi2 - phi1
+        deltaLambda = math.radians(lon2 - lon1)
+        a = math.sin(deltaPhi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(deltaLambda / 2) ** 2
+
+        return 2 * GeoMath.EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+    @staticmethod
+    def offset(lat, lon, northKm, eastKm):
+        '''
+        Moves a coordinate by the provided distances. The approximation is good enough for the few kilometers used by the API.
+        -------------------
+        Parameters:
+            lat: float
+            lon: float
+            northKm: float
+            eastKm: float
+        -------------------
+        Returns:
+            tupel, (lat, lon)
+        -------------------
+        '''
+
+        newLat = lat + math.degrees(northKm / GeoMath.EARTH_RADIUS)
+        newLon = lon + math.degrees(eastKm / (GeoMath.EARTH_RADIUS * math.cos(math.radians(lat))))
+
+        return (newLat, newLon)
+
+    @staticmethod
+    def samplePolyline(points, spacing):
+        '''
+        Returns points along the polyline that are at most spacing kilometers apart. The first and the last point of the polyline are always included.
+        -------------------
+        Parameters:
+            points: list of tupels, (lat, lon)
+            spacing: float
+        -------------------
+        Returns:
+            list of tupels, (lat, lon)
+        -------------------
+        '''
+
+        if len(points) == 0:
+            return []
+
+        samples = [tuple(points[0])]
+        for (start, end) in zip(points, points[1:]):
+            length = GeoMath.haversine(start[0], start[1], end[0], end[1])
+            steps = max(1, int(math.ceil(length / spacing)))
+            for step in range(1, steps + 1):
+                fraction = step / steps
+                samples.append((start[0] + (end[0] - start[0]) * fraction, start[1] + (end[1] - start[1]) * fraction))
+
+        return samples
@@ -0,0 +1,90 @@
+from requests.adapters import HTTPAdapter
+import requests
+import ssl
+import threading
+
+class HttpTransport():
+    '''
+    Author: Marian Neff
+    -------------------
+    The HttpTransport provides the single requests.Session that every ApiCaller of the process shares. Its connections are kept alive and pooled, so that refreshes after the first one skip the TCP and TLS handshakes.
+    Responses are requested with gzip/deflate compression and the SSL context is created once and reused for every connection.
+    -------------------
+    '''
+
+    POOL_CONNECTIONS = 4
+    POOL_MAXSIZE = 10
+    HEADERS = {
+        'Accept': 'application/json',
+        'Accept-Encoding': 'gzip, deflate',
+        'Connection': 'keep-alive'
+    }
+
+    __session = None
+    __sslContext = None
+    __lock = threading.Lock()
+
+    @classmethod
+    def getSslContext(cls):
+        '''
+        Returns the SSL context of the process. It uses the certificates bundled with certifi if they are available, because Android does not provide its certificates to Python.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            ssl.SSLContext
+        -------------------
+        '''
+
+        with cls.__lock:
+            if cls.__sslContext is None:
+                try:
+                    import certifi
+                    cls.__sslContext = ssl.create_default_context(cafile=certifi.where())
+                except ImportError:
+                    cls.__sslContext = ssl.create_default_context()
+
+            return cls.__sslContext
+
+    @classmethod
+    def getSession(cls):
+        '''
+        Returns the shared session and creates it on first use.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            requests.Session
+        -------------------
+        '''
+
+        sslContext = cls.getSslContext()
+        with cls.__lock:
+            if cls.__session is None:
+                session = requests.Session()
+                session.headers.update(cls.HEADERS)
+                adapter = _SslContextAdapter(sslContext, pool_connections=cls.POOL_CONNECTIONS, pool_maxsize=cls.POOL_MAXSIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                cls.__session = session
+
+            return cls.__session
+
+class _SslContextAdapter(HTTPAdapter):
+    '''
+    HTTPAdapter that hands the shared SSL context to the connection pools it creates.
+    '''
+
+    def __init__(self, sslContext, **kwargs):
+        self.__sslContext = sslContext
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['ssl_context'] = self.__sslContext
+        return super().init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, *args, **kwargs):
+        kwargs['ssl_context'] = self.__sslContext
+        return super().proxy_manager_for(*args, **kwargs)
@@ -0,0 +1,332 @@
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import itertools
+import json
+import threading
+import time
+
+class Metrics():
+    '''
+    Author: Marian Neff
+    -------------------
+    The Metrics class is the process-wide registry for counters, latency histograms and traces of the app, so that it can be seen where the time of a refresh goes on a device.
+    Counters and histograms are identified by their name and labels. Spans measure a single step, spans with a parent form the trace of a whole refresh. Only the last MAX_SPANS finished spans are kept.
+    Everything can be exported as JSON or in the Prometheus text format, either directly or through a local HTTP endpoint started with startServer().
+    -------------------
+    '''
+
+    PREFIX = 'tanker_'
+    BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+    MAX_SPANS = 200
+    TRACING_ENABLED = True
+
+    __lock = threading.Lock()
+    __counters = {}
+    __histograms = {}
+    __spans = deque(maxlen=MAX_SPANS)
+    __spanIds = itertools.count(1)
+    __currentSpan = threading.local()
+    __server = None
+
+    @classmethod
+    def increment(cls, name, amount=1, **labels):
+        '''
+        Increases a counter.
+        -------------------
+        Parameters:
+            name: string
+            amount: float
+            labels: strings
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        key = (name, tuple(sorted(labels.items())))
+        with cls.__lock:
+            cls.__counters[key] = cls.__counters.get(key, 0) + amount
+
+    @classmethod
+    def observe(cls, name, value, **labels):
+        '''
+        Adds a value, typically a duration in milliseconds, to a histogram.
+        -------------------
+        Parameters:
+            name: string
+            value: float
+            labels: strings
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        key = (name, tuple(sorted(labels.items())))
+        with cls.__lock:
+            histogram = cls.__histograms.get(key)
+            if histogram is None:
+                histogram = {'buckets': [0] * len(cls.BUCKETS), 'count': 0, 'sum': 0.0, 'max': 0.0}
+                cls.__histograms[key] = histogram
+
+            for index, bound in enumerate(cls.BUCKETS):
+                if value <= bound:
+                    histogram['buckets'][index] += 1
+            histogram['count'] += 1
+            histogram['sum'] += value
+            histogram['max'] = max(histogram['max'], value)
+
+    @classmethod
+    @contextmanager
+    def timer(cls, name, **labels):
+        '''
+        Measures the duration of the with block in milliseconds and adds it to the histogram.
+        -------------------
+        Parameters:
+            name: string
+            labels: strings
+        -------------------
+        Returns:
+            context manager
+        -------------------
+        '''
+
+        startedAt = time.perf_counter()
+        try:
+            yield
+        finally:
+            cls.observe(name, (time.perf_counter() - startedAt) * 1000, **labels)
+
+    @classmethod
+    def startSpan(cls, name, parent=None, **attributes):
+        '''
+        Starts a span. The span has to be ended with its end() method, which may happen on another thread.
+        -------------------
+        Parameters:
+            name: string
+            parent: Span or None
+            attributes: values that are saved with the span
+        -------------------
+        Returns:
+            Span, or None if tracing is disabled
+        -------------------
+        '''
+
+        if not cls.TRACING_ENABLED:
+            return None
+
+        return Span(cls, next(cls.__spanIds), name, parent, attributes)
+
+    @classmethod
+    @contextmanager
+    def span(cls, name, parent=None, **attributes):
+        '''
+        Measures the with block as a span. Without a parent, the span of the enclosing with block on the same thread is used as parent, so nested steps end up in the same trace.
+        -------------------
+        Parameters:
+            name: string
+            parent: Span or None
+            attributes: values that are saved with the span
+        -------------------
+        Returns:
+            context manager that provides the Span
+        -------------------
+        '''
+
+        if parent is None:
+            parent = getattr(cls.__currentSpan, 'span', None)
+
+        span = cls.startSpan(name, parent, **attributes)
+        previous = getattr(cls.__currentSpan, 'span', None)
+        cls.__currentSpan.span = span
+        try:
+            yield span
+        finally:
+            cls.__currentSpan.span = previous
+            if span is not None:
+                span.end()
+
+    @classmethod
+    def _finishSpan(cls, span):
+        with cls.__lock:
+            cls.__spans.append(span.toDictionary())
+
+    @classmethod
+    def reset(cls):
+        '''
+        Removes every counter, histogram and span.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        with cls.__lock:
+            cls.__counters.clear()
+            cls.__histograms.clear()
+            cls.__spans.clear()
+
+    @classmethod
+    def exportJson(cls):
+        '''
+        Returns all counters, histograms and finished spans as a JSON string.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            string
+        -------------------
+        '''
+
+        with cls.__lock:
+            report = {
+                'counters': [
+                    {'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in sorted(cls.__counters.items())
+                ],
+                'histograms': [
+                    {'name': name, 'labels': dict(labels), 'count': histogram['count'], 'sum': histogram['sum'], 'max': histogram['max'], 'buckets': dict(zip(cls.BUCKETS, histogram['buckets']))}
+                    for (name, labels), histogram in sorted(cls.__histograms.items())
+                ],
+                'spans': list(cls.__spans)
+            }
+
+        return json.dumps(report)
+
+    @classmethod
+    def exportPrometheus(cls):
+        '''
+        Returns all counters and histograms in the Prometheus text format. Spans are not part of it.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            string
+        -------------------
+        '''
+
+        lines = []
+        with cls.__lock:
+            for name in sorted({name for (name, labels) in cls.__counters}):
+                lines.append('# TYPE ' + cls.PREFIX + name + '_total counter')
+                for (counterName, labels), value in sorted(cls.__counters.items()):
+                    if counterName == name:
+                        lines.append(cls.PREFIX + name + '_total' + cls.__formatLabels(labels) + ' ' + repr(float(value)))
+
+            for name in sorted({name for (name, labels) in cls.__histograms}):
+                lines.append('# TYPE ' + cls.PREFIX + name + ' histogram')
+                for (histogramName, labels), histogram in sorted(cls.__histograms.items()):
+                    if histogramName != name:
+                        continue
+
+                    for bound, count in zip(cls.BUCKETS, histogram['buckets']):
+                        lines.append(cls.PREFIX + name + '_bucket' + cls.__formatLabels(labels + (('le', str(bound)),)) + ' ' + str(count))
+                    lines.append(cls.PREFIX + name + '_bucket' + cls.__formatLabels(labels + (('le', '+Inf'),)) + ' ' + str(histogram['count']))
+                    lines.append(cls.PREFIX + name + '_sum' + cls.__formatLabels(labels) + ' ' + repr(histogram['sum']))
+                    lines.append(cls.PREFIX + name + '_count' + cls.__formatLabels(labels) + ' ' + str(histogram['count']))
+
+        return '\n'.join(lines) + '\n'
+
+    @classmethod
+    def startServer(cls, port=9464, host='127.0.0.1'):
+        '''
+        Starts a local HTTP endpoint in a background thread. It serves /metrics in the Prometheus text format and /metrics.json as JSON.
+        -------------------
+        Parameters:
+            port: integer
+            host: string
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        with cls.__lock:
+            if cls.__server is not None:
+                return
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path == '/metrics':
+                        (body, contentType) = (cls.exportPrometheus(), 'text/plain; version=0.0.4')
+                    elif self.path == '/metrics.json':
+                        (body, contentType) = (cls.exportJson(), 'application/json')
+                    else:
+                        self.send_error(404)
+                        return
+
+                    content = body.encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type', contentType)
+                    self.send_header('Content-Length', str(len(content)))
+                    self.end_headers()
+                    self.wfile.write(content)
+
+                def log_message(self, format, *args):
+                    pass
+
+            cls.__server = ThreadingHTTPServer((host, port), Handler)
+            cls.__server.daemon_threads = True
+            threading.Thread(target=cls.__server.serve_forever, daemon=True).start()
+
+    @staticmethod
+    def __formatLabels(labels):
+        if len(labels) == 0:
+            return ''
+
+        return '{' + ','.join(key + '="' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"' for (key, value) in labels) + '}'
+
+class Span():
+    '''
+    Author: Marian Neff
+    -------------------
+    The Span measures a single step of the app. Spans that share a root form one trace, the trace id is the id of the root span.
+    -------------------
+    '''
+
+    def __init__(self, metrics, spanId, name, parent, attributes):
+        self.__metrics = metrics
+        self.spanId = spanId
+        self.traceId = parent.traceId if parent is not None else spanId
+        self.parentId = parent.spanId if parent is not None else None
+        self.name = name
+        self.attributes = attributes
+        self.startedAt = time.time()
+        self.__startedAt = time.perf_counter()
+        self.duration = None
+
+    def end(self, **attributes):
+        '''
+        Ends the span and hands it to the Metrics. Ending a span twice has no effect.
+        -------------------
+        Parameters:
+            attributes: values that are added to the span
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        if self.duration is not None:
+            return
+
+        self.duration = (time.perf_counter() - self.__startedAt) * 1000
+        self.attributes.update(attributes)
+        self.__metrics._finishSpan(self)
+
+    def toDictionary(self):
+        return {
+            'traceId': self.traceId,
+            'spanId': self.spanId,
+            'parentId': self.parentId,
+            'name': self.name,
+            'startedAt': self.startedAt,
+            'durationMs': self.duration,
+            'attributes': {key: value if isinstance(value, (int, float, str, bool)) or value is None else str(value) for key, value in self.attributes.items()}
+        }
@@ -0,0 +1,350 @@
+from Metrics import Metrics
+import argparse
+import csv
+import hashlib
+import io
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import urllib.request
+import zipfile
+
+class PostalCodeLookup():
+    '''
+    Author: Marc Lepold
+    -------------------
+    The PostalCodeLookup resolves a German postal code (PLZ) into the coordinates of its centroid.
+    The primary source is a bundled binary table that is memory-mapped and searched binary, so a lookup needs neither the network nor parsing the whole table. Inputs that are not in the table are resolved through Nominatim, whose results are cached on disk.
+    The table holds one record per postal code, sorted by postal code: the code as unsigned integer and the latitude and longitude as floats, little endian. It is created with buildTable() from a CSV file with the columns "plz", "lat" and "lon", or with buildTableFromGeoNames() from the postal code export of GeoNames (CC BY 4.0), which the BuildHooks run before every APK build.
+    -------------------
+    '''
+
+    TABLE_FILE_NAME = 'data/plz_centroids.bin'
+    CACHE_FILE_NAME = 'plz_cache.json'
+    MAGIC = b'PLZ1'
+    RECORD = struct.Struct('<Iff')
+    USER_AGENT = 'Geopy Library'
+    GEONAMES_URL = 'https://download.geonames.org/export/zip/DE.zip'
+    GEONAMES_FILE_NAME = 'DE.txt'
+    MIN_TABLE_SIZE = 8000
+
+    __sharedLookup = None
+    __sharedLock = threading.Lock()
+
+    def __init__(self, tableFileName=TABLE_FILE_NAME, cacheFileName=CACHE_FILE_NAME):
+        '''
+        Sets the files of the table and the cache. Both are only opened once they are needed.
+        -------------------
+        Parameters:
+            tableFileName: string
+            cacheFileName: string
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        self.__tableFileName = tableFileName
+        self.__cacheFileName = cacheFileName
+        self.__table = None
+        self.__tableLoaded = False
+        self.__cache = None
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        '''
+        Returns the lookup shared by the whole application.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            PostalCodeLookup
+        -------------------
+        '''
+
+        with cls.__sharedLock:
+            if cls.__sharedLookup is None:
+                cls.__sharedLookup = cls()
+
+            return cls.__sharedLookup
+
+    def lookup(self, location):
+        '''
+        Resolves the location into coordinates. Postal codes are looked up in the table first, everything else and unknown postal codes are resolved through the disk cache or Nominatim.
+        -------------------
+        Parameters:
+            location: string, postal code or place name
+        -------------------
+        Returns:
+            tupel, (lat, lon), or None if the location could not be found
+        -------------------
+        '''
+
+        location = location.strip()
+        coordinates = self.lookupOffline(location)
+        if coordinates is not None:
+            Metrics.increment('geocoding_requests', source='offline', outcome='ok')
+
+            return coordinates
+
+        return self.__lookupNominatim(location)
+
+    def lookupOffline(self, location):
+        '''
+        Resolves the location without the network, through the table or the disk cache.
+        -------------------
+        Parameters:
+            location: string, postal code or place name
+        -------------------
+        Returns:
+            tupel, (lat, lon), or None
+        -------------------
+        '''
+
+        location = location.strip()
+        if len(location) == 5 and location.isdigit():
+            coordinates = self.__lookupTable(int(location))
+            if coordinates is not None:
+                return coordinates
+
+        with self.__lock:
+            cached = self.__getCache().get(location.lower())
+
+        return tuple(cached) if cached is not None else None
+
+    def __lookupTable(self, postalCode):
+        '''
+        Searches the memory-mapped table binary for the postal code.
+        -------------------
+        Parameters:
+            postalCode: integer
+        -------------------
+        Returns:
+            tupel, (lat, lon), or None
+        -------------------
+        '''
+
+        table = self.__getTable()
+        if table is None:
+            return None
+
+        low = 0
+        high = (len(table) - len(self.MAGIC)) // self.RECORD.size - 1
+        while low <= high:
+            middle = (low + high) // 2
+            (code, lat, lon) = self.RECORD.unpack_from(table, len(self.MAGIC) + middle * self.RECORD.size)
+            if code == postalCode:
+                return (lat, lon)
+
+            if code < postalCode:
+                low = middle + 1
+            else:
+                high = middle - 1
+
+        return None
+
+    def __lookupNominatim(self, location):
+        '''
+        Resolves the location through Nominatim and saves the result in the disk cache.
+        -------------------
+        Parameters:
+            location: string
+        -------------------
+        Returns:
+            tupel, (lat, lon), or None
+        -------------------
+        '''
+
+        from geopy.geocoders import Nominatim
+        from HttpTransport import HttpTransport
+
+        try:
+            with Metrics.timer('geocoding_duration_ms', source='nominatim'):
+                result = Nominatim(user_agent=self.USER_AGENT, ssl_context=HttpTransport.getSslContext()).geocode(location, country_codes='de')
+        except Exception as error:
+            Metrics.increment('geocoding_requests', source='nominatim', outcome='error')
+            print(f'An error has occurred while resolving the location, message: {error}')
+
+            return None
+
+        Metrics.increment('geocoding_requests', source='nominatim', outcome='ok' if result is not None else 'not_found')
+        if result is None:
+            return None
+
+        coordinates = (result.latitude, result.longitude)
+        with self.__lock:
+            cache = self.__getCache()
+            cache[location.lower()] = list(coordinates)
+            try:
+                temporaryFileName = self.__cacheFileName + '.tmp'
+                with open(temporaryFileName, 'w') as jsonFile:
+                    json.dump(cache, jsonFile)
+                os.replace(temporaryFileName, self.__cacheFileName)
+            except Exception as error:
+                print(f'An error has occurred while saving the location cache, message: {error}')
+
+        return coordinates
+
+    def __getTable(self):
+        with self.__lock:
+            if not self.__tableLoaded:
+                self.__tableLoaded = True
+                try:
+                    with open(self.__tableFileName, 'rb') as tableFile:
+                        table = mmap.mmap(tableFile.fileno(), 0, access=mmap.ACCESS_READ)
+                    if table[:len(self.MAGIC)] == self.MAGIC:
+                        self.__table = table
+                    else:
+                        print(f'The postal code table {self.__tableFileName} has an unknown format.')
+                except (OSError, ValueError) as error:
+                    print(f'The postal code table could not be opened, message: {error}')
+
+            return self.__table
+
+    def __getCache(self):
+        if self.__cache is None:
+            try:
+                with open(self.__cacheFileName, 'r') as jsonFile:
+                    self.__cache = json.load(jsonFile)
+            except FileNotFoundError:
+                self.__cache = {}
+            except Exception as error:
+                print(f'An error has occurred while loading the location cache, message: {error}')
+                self.__cache = {}
+
+        return self.__cache
+
+    @classmethod
+    def buildTable(cls, csvFileName, tableFileName=TABLE_FILE_NAME):
+        '''
+        Creates the binary table from a CSV file with the columns "plz", "lat" and "lon". Postal codes that occur several times keep their first row.
+        -------------------
+        Parameters:
+            csvFileName: string
+            tableFileName: string
+        -------------------
+        Returns:
+            integer, the amount of postal codes in the table
+        -------------------
+        '''
+
+        records = {}
+        with open(csvFileName, 'r', encoding='utf-8', newline='') as csvFile:
+            for row in csv.DictReader(csvFile):
+                records.setdefault(int(row['plz']), (float(row['lat']), float(row['lon'])))
+
+        return cls.__writeTable(records, tableFileName)
+
+    @classmethod
+    def buildTableFromGeoNames(cls, source, tableFileName, sha256, downloadFileName=None):
+        '''
+        Creates the binary table from the postal code export of GeoNames. The export lists every place of a postal code, the centroid of a postal code is the average of its places.
+        GeoNames does not version the export, so the exact file has to be pinned through its SHA-256 checksum. A download with the pinned checksum is kept in downloadFileName and used again by later builds instead of downloading the export again.
+        -------------------
+        Parameters:
+            source: string, URL or file name of DE.zip
+            tableFileName: string
+            sha256: string, expected checksum of DE.zip
+            downloadFileName: string or None
+        -------------------
+        Returns:
+            integer, the amount of postal codes in the table
+        -------------------
+        Raises:
+            ValueError: if no checksum is provided, the checksum does not match or the export holds less than MIN_TABLE_SIZE postal codes
+        -------------------
+        '''
+
+        if not sha256:
+            raise ValueError('The checksum of the GeoNames export has to be pinned.')
+
+        content = None
+        if downloadFileName is not None and os.path.exists(downloadFileName):
+            with open(downloadFileName, 'rb') as downloadFile:
+                content = downloadFile.read()
+            if hashlib.sha256(content).hexdigest() != sha256.lower():
+                content = None
+
+        if content is None:
+            if source.startswith(('http://', 'https://')):
+                with urllib.request.urlopen(source, timeout=60) as response:
+                    content = response.read()
+            else:
+                with open(source, 'rb') as sourceFile:
+                    content = sourceFile.read()
+
+            checksum = hashlib.sha256(content).hexdigest()
+            if checksum != sha256.lower():
+                raise ValueError(f'The checksum of {source} is {checksum} instead of {sha256}.')
+
+            if downloadFileName is not None:
+                os.makedirs(os.path.dirname(downloadFileName) or '.', exist_ok=True)
+                with open(downloadFileName, 'wb') as downloadFile:
+                    downloadFile.write(content)
+
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            lines = archive.read(cls.GEONAMES_FILE_NAME).decode('utf-8').splitlines()
+
+        sums = {}
+        for line in lines:
+            columns = line.split('\t')
+            if len(columns) < 11 or not (len(columns[1]) == 5 and columns[1].isdigit()):
+                continue
+
+            (count, latSum, lonSum) = sums.get(int(columns[1]), (0, 0.0, 0.0))
+            sums[int(columns[1])] = (count + 1, latSum + float(columns[9]), lonSum + float(columns[10]))
+
+        if len(sums) < cls.MIN_TABLE_SIZE:
+            raise ValueError(f'{source} only holds {len(sums)} postal codes.')
+
+        return cls.__writeTable({code: (latSum / count, lonSum / count) for code, (count, latSum, lonSum) in sums.items()}, tableFileName)
+
+    @classmethod
+    def __writeTable(cls, records, tableFileName):
+        '''
+        Writes the records sorted by postal code. The file is replaced atomically, so a running app never reads half a table.
+        '''
+
+        directory = os.path.dirname(tableFileName)
+        if directory != '':
+            os.makedirs(directory, exist_ok=True)
+
+        temporaryFileName = tableFileName + '.tmp'
+        with open(temporaryFileName, 'wb') as tableFile:
+            tableFile.write(cls.MAGIC)
+            for code in sorted(records):
+                tableFile.write(cls.RECORD.pack(code, *records[code]))
+        os.replace(temporaryFileName, tableFileName)
+
+        return len(records)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python PostalCodeLookup.py', description='Creates the postal code table of the PostalCodeLookup.')
+    parser.add_argument('source', nargs='?', help='CSV file with the columns plz, lat and lon, or DE.zip of GeoNames with --geonames')
+    parser.add_argument('--geonames', action='store_true', help='reads the GeoNames export, downloaded if no source is provided')
+    parser.add_argument('--sha256', help='expected checksum of the GeoNames export, required with --geonames')
+    parser.add_argument('--output', default=PostalCodeLookup.TABLE_FILE_NAME, help='file name of the table')
+    arguments = parser.parse_args(argv)
+
+    if arguments.geonames:
+        if arguments.sha256 is None:
+            parser.error('--geonames requires --sha256')
+        count = PostalCodeLookup.buildTableFromGeoNames(arguments.source or PostalCodeLookup.GEONAMES_URL, arguments.output, arguments.sha256)
+    elif arguments.source is not None:
+        count = PostalCodeLookup.buildTable(arguments.source, arguments.output)
+    else:
+        parser.print_usage()
+
+        return 1
+
+    print(f'The postal code table has been created with {count} postal codes.')
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,409 @@
+from array import array
+import math
+import mmap
+import operator
+import os
+import struct
+import threading
+import time
+
+class PriceHistory():
+    '''
+    Author: Marian Neff
+    -------------------
+    The PriceHistory keeps the prices of the last fetches on the device, so that trends and the cheapest times of the week can be shown without a server.
+    It is a memory-mapped file of fixed size: a table of up to MAX_STATIONS stations followed by one ring buffer of CAPACITY entries per station and fuel type. Once a ring buffer is full, the oldest entries are overwritten. Once the table is full, the station that was updated the longest time ago is replaced, but never one that was updated by the same record() call, further stations of that call are skipped. So the file never grows.
+    An entry holds the time in seconds and the price in tenths of a cent. A price is only appended if it differs from the last entry of the ring buffer or the last entry is older than HEARTBEAT seconds, so repeated fetches of unchanged prices do not push out the history.
+    For getCheapestHours() every ring buffer gets sums and counts per hour of the week in memory, which are updated with every appended or overwritten entry and whenever the window moves. So only the first query reads the whole file, later ones only the entries that entered or left the window.
+    -------------------
+    '''
+
+    FILE_NAME = 'price_history.bin'
+    MAGIC = b'PHS1'
+    FUEL_TYPES = ('e5', 'e10', 'diesel')
+    MAX_STATIONS = 512
+    CAPACITY = 512
+    HEARTBEAT = 60 * 60
+    HEADER = struct.Struct('<4sII')
+    SLOT = struct.Struct('<40sffI')
+    RING_HEADER = struct.Struct('<II')
+    ENTRY = struct.Struct('<IH')
+    HOURS_PER_WEEK = 7 * 24
+    MAX_CACHED_QUARTERS = 16384
+
+    __sharedHistory = None
+    __sharedLock = threading.Lock()
+
+    def __init__(self, fileName=FILE_NAME, maxStations=MAX_STATIONS, capacity=CAPACITY):
+        '''
+        Opens the file or creates it if it does not exist or was created with other sizes.
+        -------------------
+        Parameters:
+            fileName: string
+            maxStations: integer
+            capacity: integer, entries per station and fuel type
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        self.__fileName = fileName
+        self.__maxStations = maxStations
+        self.__capacity = capacity
+        self.__ringSize = self.RING_HEADER.size + capacity * self.ENTRY.size
+        self.__ringsOffset = self.HEADER.size + maxStations * self.SLOT.size
+        self.__size = self.__ringsOffset + maxStations * len(self.FUEL_TYPES) * self.__ringSize
+        self.__lock = threading.Lock()
+        self.__map = None
+        self.__slots = {}
+        self.__updatedAt = [0] * maxStations
+        self.__locations = [None] * maxStations
+        self.__aggregates = {}
+        self.__hoursOfWeek = {}
+
+    @classmethod
+    def shared(cls):
+        '''
+        Returns the history shared by the whole application.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            PriceHistory
+        -------------------
+        '''
+
+        with cls.__sharedLock:
+            if cls.__sharedHistory is None:
+                cls.__sharedHistory = cls()
+
+            return cls.__sharedHistory
+
+    def record(self, dataset, timestamp=None):
+        '''
+        Appends the prices of every station of the dataset, for every fuel type that has a price.
+        -------------------
+        Parameters:
+            dataset: StationDataset
+            timestamp: float or None, defaults to now
+        -------------------
+        Returns:
+            integer, the amount of appended entries
+        -------------------
+        '''
+
+        timestamp = int(timestamp if timestamp is not None else time.time())
+        columns = [(fuelIndex, dataset.price if fuel == dataset.type else dataset.fuelPrices.get(fuel)) for fuelIndex, fuel in enumerate(self.FUEL_TYPES)]
+        columns = [(fuelIndex, prices) for (fuelIndex, prices) in columns if prices is not None]
+
+        appended = 0
+        with self.__lock:
+            self.__open()
+            for index in range(dataset.size):
+                stationId = dataset.getText('id', index)
+                if not stationId:
+                    continue
+
+                slot = self.__getSlot(str(stationId), dataset.lat[index], dataset.lng[index], timestamp)
+                if slot is None:
+                    continue
+
+                for (fuelIndex, prices) in columns:
+                    price = prices[index]
+                    if not math.isnan(price) and price > 0 and self.__append(slot, fuelIndex, timestamp, int(round(price * 1000))):
+                        appended += 1
+
+            self.__map.flush()
+
+        return appended
+
+    def getSeries(self, stationId, fuel, since=0):
+        '''
+        Returns the recorded prices of the station in chronological order.
+        -------------------
+        Parameters:
+            stationId: string
+            fuel: string, ["e5", "e10", "diesel"]
+            since: float, only entries from this time on are returned
+        -------------------
+        Returns:
+            list of tupels, (timestamp, price)
+        -------------------
+        '''
+
+        with self.__lock:
+            self.__open()
+            slot = self.__slots.get(stationId)
+            if slot is None:
+                return []
+
+            return [(timestamp, price / 1000) for (timestamp, price) in self.__readRing(slot, self.FUEL_TYPES.index(fuel)) if timestamp >= since]
+
+    def getTrend(self, stationId, fuel, window=7 * 24 * 60 * 60):
+        '''
+        Describes how the price of the station has developed within the window, including the slope of a least squares line in euro per day.
+        -------------------
+        Parameters:
+            stationId: string
+            fuel: string, ["e5", "e10", "diesel"]
+            window: float, seconds
+        -------------------
+        Returns:
+            dictionary with count, first, last, change, minimum, maximum and slopePerDay, or None without entries
+        -------------------
+        '''
+
+        series = self.getSeries(stationId, fuel, time.time() - window)
+        if not series:
+            return None
+
+        prices = [price for (timestamp, price) in series]
+        slope = 0.0
+        if len(series) > 1:
+            meanTime = sum(timestamp for (timestamp, price) in series) / len(series)
+            meanPrice = sum(prices) / len(prices)
+            variance = sum((timestamp - meanTime) ** 2 for (timestamp, price) in series)
+            if variance > 0:
+                slope = sum((timestamp - meanTime) * (price - meanPrice) for (timestamp, price) in series) / variance * 24 * 60 * 60
+
+        return {
+            'count': len(series),
+            'first': prices[0],
+            'last': prices[-1],
+            'change': round(prices[-1] - prices[0], 3),
+            'minimum': min(prices),
+            'maximum': max(prices),
+            'slopePerDay': slope
+        }
+
+    def getCheapestHours(self, lat, lng, radius, fuel, limit=3, window=28 * 24 * 60 * 60):
+        '''
+        Finds the hours of the week in which the stations within the circle have been the cheapest.
+        Every entry is compared to the average price of its station, so stations with generally higher prices do not distort the result. The hours are in the local time of the entry, so entries from before a change of the daylight saving time are in the right hour as well. Monday 0:00 is hour 0.
+        -------------------
+        Parameters:
+            lat: float
+            lng: float
+            radius: float, kilometers
+            fuel: string, ["e5", "e10", "diesel"]
+            limit: integer, amount of returned hours
+            window: float, only entries within this amount of seconds are used
+        -------------------
+        Returns:
+            list of dictionaries with weekday (0 = Monday), hour, difference to the average price in euro and samples, the cheapest first
+        -------------------
+        '''
+
+        from GeoMath import GeoMath
+
+        since = int(time.time() - window)
+        fuelIndex = self.FUEL_TYPES.index(fuel)
+        aggregates = []
+        averages = []
+
+        with self.__lock:
+            self.__open()
+            for slot in self.__slots.values():
+                (stationLat, stationLng) = self.__locations[slot]
+                if GeoMath.haversine(lat, lng, stationLat, stationLng) > radius:
+                    continue
+
+                aggregate = self.__getAggregate(slot, fuelIndex, since)
+                if aggregate.count == 0:
+                    continue
+
+                aggregates.append(aggregate)
+                averages.append(aggregate.total / aggregate.count)
+
+            if not aggregates:
+                return []
+
+            # Summed up per hour over all stations, every entry is compared to the average of its station.
+            sums = [sum(column) for column in zip(*(aggregate.sums for aggregate in aggregates))]
+            counts = [sum(column) for column in zip(*(aggregate.counts for aggregate in aggregates))]
+            expected = [sum(map(operator.mul, column, averages)) for column in zip(*(aggregate.counts for aggregate in aggregates))]
+
+        hours = [
+            {'weekday': hour // 24, 'hour': hour % 24, 'difference': (sums[hour] - expected[hour]) / counts[hour] / 1000, 'samples': counts[hour]}
+            for hour in range(self.HOURS_PER_WEEK) if counts[hour] > 0
+        ]
+        hours.sort(key=lambda hour: hour['difference'])
+
+        return hours[:limit]
+
+    def close(self):
+        '''
+        Writes all changes to disk and closes the file.
+        '''
+
+        with self.__lock:
+            if self.__map is not None:
+                self.__map.flush()
+                self.__map.close()
+                self.__map = None
+                self.__slots = {}
+                self.__aggregates = {}
+
+    def __open(self):
+        '''
+        Maps the file into memory and reads the station table. A file with another format or other sizes is replaced by an empty one.
+        '''
+
+        if self.__map is not None:
+            return
+
+        header = self.HEADER.pack(self.MAGIC, self.__maxStations, self.__capacity)
+        mode = 'r+b' if os.path.exists(self.__fileName) else 'w+b'
+        with open(self.__fileName, mode) as historyFile:
+            if historyFile.read(self.HEADER.size) != header or os.fstat(historyFile.fileno()).st_size != self.__size:
+                historyFile.seek(0)
+                historyFile.truncate(0)
+                historyFile.truncate(self.__size)
+                historyFile.write(header)
+                historyFile.flush()
+
+            self.__map = mmap.mmap(historyFile.fileno(), self.__size)
+
+        for slot in range(self.__maxStations):
+            (stationId, lat, lng, updatedAt) = self.SLOT.unpack_from(self.__map, self.HEADER.size + slot * self.SLOT.size)
+            stationId = stationId.rstrip(b'\0').decode('ascii', 'replace')
+            if stationId != '':
+                self.__slots[stationId] = slot
+                self.__updatedAt[slot] = updatedAt
+                self.__locations[slot] = (lat, lng)
+
+    def __getSlot(self, stationId, lat, lng, timestamp):
+        '''
+        Returns the slot of the station. Unknown stations get a free slot or the slot of the station that was updated the longest time ago, whose entries are cleared.
+        Returns None if every slot has been updated at the timestamp, so a dataset with more than MAX_STATIONS stations does not replace its own stations on every record.
+        '''
+
+        slot = self.__slots.get(stationId)
+        if slot is None:
+            if len(self.__slots) < self.__maxStations:
+                slot = len(self.__slots)
+            else:
+                slot = min(range(self.__maxStations), key=lambda candidate: self.__updatedAt[candidate])
+                if self.__updatedAt[slot] >= timestamp:
+                    return None
+
+                self.__slots = {key: value for key, value in self.__slots.items() if value != slot}
+
+            self.__slots[stationId] = slot
+            for fuelIndex in range(len(self.FUEL_TYPES)):
+                self.RING_HEADER.pack_into(self.__map, self.__getRingOffset(slot, fuelIndex), 0, 0)
+                self.__aggregates.pop((slot, fuelIndex), None)
+
+        self.__updatedAt[slot] = timestamp
+        self.__locations[slot] = (lat, lng)
+        self.SLOT.pack_into(self.__map, self.HEADER.size + slot * self.SLOT.size, stationId.encode('ascii', 'replace')[:40], lat, lng, timestamp)
+
+        return slot
+
+    def __append(self, slot, fuelIndex, timestamp, price):
+        offset = self.__getRingOffset(slot, fuelIndex)
+        (head, count) = self.RING_HEADER.unpack_from(self.__map, offset)
+        entriesOffset = offset + self.RING_HEADER.size
+        if count > 0:
+            (lastTimestamp, lastPrice) = self.ENTRY.unpack_from(self.__map, entriesOffset + ((head - 1) % self.__capacity) * self.ENTRY.size)
+            if lastPrice == price and timestamp - lastTimestamp < self.HEARTBEAT:
+                return False
+
+        price = min(price, 0xFFFF)
+        aggregate = self.__aggregates.get((slot, fuelIndex))
+        if aggregate is not None:
+            if aggregate.count == self.__capacity:
+                (oldTimestamp, oldPrice) = self.ENTRY.unpack_from(self.__map, entriesOffset + head * self.ENTRY.size)
+                aggregate.remove(self.__getHourOfWeek(oldTimestamp), oldPrice)
+            aggregate.add(self.__getHourOfWeek(timestamp), price)
+
+        self.ENTRY.pack_into(self.__map, entriesOffset + head * self.ENTRY.size, timestamp, price)
+        self.RING_HEADER.pack_into(self.__map, offset, (head + 1) % self.__capacity, min(count + 1, self.__capacity))
+
+        return True
+
+    def __getAggregate(self, slot, fuelIndex, since):
+        '''
+        Returns the sums and counts per hour of the week of the entries of a ring buffer from since on.
+        The counted entries are always the newest ones of the ring buffer, so moving the window only reads the entries at its start: entries older than since are removed, older entries that are within the window again are added.
+        '''
+
+        aggregate = self.__aggregates.get((slot, fuelIndex))
+        if aggregate is None:
+            aggregate = _HourAggregate(self.HOURS_PER_WEEK)
+            self.__aggregates[(slot, fuelIndex)] = aggregate
+
+        offset = self.__getRingOffset(slot, fuelIndex)
+        (head, count) = self.RING_HEADER.unpack_from(self.__map, offset)
+        entriesOffset = offset + self.RING_HEADER.size
+        while aggregate.count > 0:
+            (timestamp, price) = self.ENTRY.unpack_from(self.__map, entriesOffset + ((head - aggregate.count) % self.__capacity) * self.ENTRY.size)
+            if timestamp >= since:
+                break
+            aggregate.remove(self.__getHourOfWeek(timestamp), price)
+
+        while aggregate.count < count:
+            (timestamp, price) = self.ENTRY.unpack_from(self.__map, entriesOffset + ((head - aggregate.count - 1) % self.__capacity) * self.ENTRY.size)
+            if timestamp < since:
+                break
+            aggregate.add(self.__getHourOfWeek(timestamp), price)
+
+        return aggregate
+
+    def __readRing(self, slot, fuelIndex):
+        '''
+        Returns the entries of a ring buffer in chronological order, prices in tenths of a cent.
+        '''
+
+        offset = self.__getRingOffset(slot, fuelIndex)
+        (head, count) = self.RING_HEADER.unpack_from(self.__map, offset)
+        entriesOffset = offset + self.RING_HEADER.size
+        entries = list(self.ENTRY.iter_unpack(self.__map[entriesOffset:entriesOffset + self.__capacity * self.ENTRY.size]))
+        if count < self.__capacity:
+            return entries[:count]
+
+        return entries[head:] + entries[:head]
+
+    def __getHourOfWeek(self, timestamp):
+        '''
+        Returns the local hour of the week of the timestamp, so entries from before a change of the daylight saving time are in the right hour as well. Every UTC offset is a multiple of 15 minutes, so the results are kept per quarter of an hour.
+        '''
+
+        quarter = timestamp // 900
+        hour = self.__hoursOfWeek.get(quarter)
+        if hour is None:
+            if len(self.__hoursOfWeek) > self.MAX_CACHED_QUARTERS:
+                self.__hoursOfWeek = {}
+            localTime = time.localtime(timestamp)
+            hour = localTime.tm_wday * 24 + localTime.tm_hour
+            self.__hoursOfWeek[quarter] = hour
+
+        return hour
+
+    def __getRingOffset(self, slot, fuelIndex):
+        return self.__ringsOffset + (slot * len(self.FUEL_TYPES) + fuelIndex) * self.__ringSize
+
+class _HourAggregate():
+    '''
+    Sums and counts per hour of the week of the newest count entries of a ring buffer, prices in tenths of a cent.
+    '''
+
+    def __init__(self, hours):
+        self.sums = array('q', [0] * hours)
+        self.counts = array('l', [0] * hours)
+        self.total = 0
+        self.count = 0
+
+    def add(self, hour, price):
+        self.sums[hour] += price
+        self.counts[hour] += 1
+        self.total += price
+        self.count += 1
+
+    def remove(self, hour, price):
+        self.sums[hour] -= price
+        self.counts[hour] -= 1
+        self.total -= price
+        self.count -= 1
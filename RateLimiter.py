@@ -0,0 +1,56 @@
+import threading
+import time
+
+class RateLimiter():
+    '''
+    Author: Marian Neff
+    -------------------
+    The RateLimiter spaces out requests so that no more than requestsPerSecond are started on average, with short bursts of up to burst requests.
+    It is a token bucket that can be shared between threads, acquire() blocks until a request may be sent.
+    -------------------
+    '''
+
+    def __init__(self, requestsPerSecond, burst=1):
+        '''
+        Sets the rate of the limiter. The bucket starts full.
+        -------------------
+        Parameters:
+            requestsPerSecond: float
+            burst: integer
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        self.__rate = float(requestsPerSecond)
+        self.__capacity = float(max(1, burst))
+        self.__tokens = self.__capacity
+        self.__updatedAt = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def acquire(self):
+        '''
+        Blocks until a request may be sent and uses up one token.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        while True:
+            with self.__lock:
+                now = time.monotonic()
+                self.__tokens = min(self.__capacity, self.__tokens + (now - self.__updatedAt) * self.__rate)
+                self.__updatedAt = now
+                if self.__tokens >= 1:
+                    self.__tokens -= 1
+
+                    return
+
+                waitTime = (1 - self.__tokens) / self.__rate
+
+            time.sleep(waitTime)
@@ -0,0 +1,306 @@
+from kivy.clock import Clock
+from BackgroundLoader import BackgroundLoader
+from SettingsService import SettingsService
+from Metrics import Metrics
+from DatasetSnapshot import DatasetSnapshot
+import math
+import threading
+import time
+
+class RefreshScheduler():
+    '''
+    Author: Marian Neff
+    -------------------
+    The RefreshScheduler refreshes the station data periodically and shares every refresh between the map and the table.
+    Refresh requests from saved settings, the timer and the user that arrive within COALESCE_DELAY seconds are merged into a single fetch. A request during a running fetch causes exactly one more fetch afterwards.
+    Every fetch is tagged with a generation. Changed settings make the running fetch stale: it is cancelled, and its result, which belongs to the old location or fuel type, is neither saved, recorded nor shown.
+    The timer starts at MIN_INTERVAL, which is the minimum polling interval asked for by Tankerkoenig. As long as the prices stay the same, the interval grows up to MAX_INTERVAL, it also grows after failed fetches. Once more than VOLATILE_SHARE of the prices change or the user asks for a refresh, it goes back to MIN_INTERVAL.
+    While the app is in the background, the timer is stopped. Requests within MIN_INTERVAL are answered from the response cache of the ApiCaller, so the API is never polled more often than allowed.
+    Every freshly fetched dataset is saved as DatasetSnapshot. The first view that subscribes gets the saved snapshot right away, marked as stale, until the first refresh replaces it. If a refresh finds neither the API nor any cached data, the previous result is kept.
+    -------------------
+    '''
+
+    MIN_INTERVAL = 5 * 60
+    MAX_INTERVAL = 30 * 60
+    BACKOFF_FACTOR = 2
+    COALESCE_DELAY = 0.5
+    VOLATILE_SHARE = 0.05
+    FAILED_SOURCES = ('last_known', 'none')
+
+    __sharedScheduler = None
+    __sharedLock = threading.Lock()
+
+    def __init__(self):
+        '''
+        Creates the scheduler. The timer only starts with the first refresh.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        self.__listeners = []
+        self.__reasons = set()
+        self.__isRunning = False
+        self.__isForeground = True
+        self.__interval = self.MIN_INTERVAL
+        self.__lastRefreshAt = None
+        self.__lastResult = None
+        self.__isSnapshotLoaded = False
+        self.__snapshot = DatasetSnapshot()
+        self.__timer = None
+        self.__span = None
+        self.__isRequestedByUser = False
+        self.__generation = 0
+        self.__trigger = Clock.create_trigger(self.__startRefresh, self.COALESCE_DELAY)
+        SettingsService().subscribe(lambda changes: Clock.schedule_once(lambda dt: self.requestRefresh('settings')))
+
+    @classmethod
+    def shared(cls):
+        '''
+        Returns the scheduler shared by the whole application.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            RefreshScheduler
+        -------------------
+        '''
+
+        with cls.__sharedLock:
+            if cls.__sharedScheduler is None:
+                cls.__sharedScheduler = cls()
+
+            return cls.__sharedScheduler
+
+    def subscribe(self, onResult, onStarted=None, onError=None):
+        '''
+        Registers a view for the refreshes. If a refresh has already finished, onResult is called right away with its result, otherwise with the saved snapshot if there is one. All functions are called on the main thread.
+        -------------------
+        Parameters:
+            onResult: function with one parameter, receives the tupel (lat, lon, dataset)
+            onStarted: function without parameters or None
+            onError: function with one parameter or None
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        self.__listeners.append((onResult, onStarted, onError))
+        if self.__lastResult is None and not self.__isSnapshotLoaded:
+            self.__isSnapshotLoaded = True
+            with Metrics.timer('snapshot_load_duration_ms'):
+                self.__lastResult = self.__snapshot.load()
+
+        if self.__lastResult is not None:
+            onResult(self.__lastResult)
+
+    def requestRefresh(self, reason='manual'):
+        '''
+        Requests a refresh. Requests that arrive within COALESCE_DELAY seconds are merged into one fetch. Every reason except "timer" counts as user activity and resets the interval to MIN_INTERVAL.
+        -------------------
+        Parameters:
+            reason: string, like "start", "settings", "manual" or "timer"
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        Metrics.increment('refresh_requests', reason=reason)
+        if reason != 'timer':
+            self.__interval = self.MIN_INTERVAL
+
+        self.__reasons.add(reason)
+        if reason == 'settings' and self.__isRunning:
+            self.__generation += 1
+            BackgroundLoader.shared().cancel('refresh')
+            self.__finishRefresh('cancelled')
+        else:
+            self.__trigger()
+
+    def setForeground(self, isForeground):
+        '''
+        Stops the timer while the app is in the background. Once the app returns, the data is refreshed if the interval has passed in the meantime.
+        -------------------
+        Parameters:
+            isForeground: boolean
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        self.__isForeground = isForeground
+        if not isForeground:
+            self.__cancelTimer()
+            return
+
+        if self.__lastRefreshAt is None or time.monotonic() - self.__lastRefreshAt >= self.__interval:
+            self.requestRefresh('resume')
+        else:
+            self.__scheduleTimer(self.__interval - (time.monotonic() - self.__lastRefreshAt))
+
+    def getInterval(self):
+        '''
+        Returns the current interval of the timer in seconds.
+        '''
+
+        return self.__interval
+
+    def __startRefresh(self, dt):
+        if self.__isRunning:
+            return
+
+        reasons = self.__reasons
+        self.__reasons = set()
+        self.__isRequestedByUser = len(reasons - {'timer'}) > 0
+        self.__isRunning = True
+        self.__cancelTimer()
+        self.__span = Metrics.startSpan('refresh', reasons=','.join(sorted(reasons)))
+
+        for (onResult, onStarted, onError) in list(self.__listeners):
+            if onStarted is not None:
+                onStarted()
+
+        self.__generation += 1
+        generation = self.__generation
+        span = self.__span
+        BackgroundLoader.shared().submit('refresh', lambda: self.__load(span, generation), lambda loaded: self.__onLoaded(generation, loaded), lambda error: self.__onError(generation, error))
+
+    def __load(self, span, generation):
+        '''
+        Loads the location and the station data and records freshly fetched prices in the PriceHistory, unless the fetch has become stale in the meantime. This runs on a worker thread of the BackgroundLoader.
+        -------------------
+        Parameters:
+            span: Span or None
+            generation: integer, generation of the fetch
+        -------------------
+        Returns:
+            tupel, (lat, lon, dataset, source)
+        -------------------
+        '''
+
+        from ApiCaller import ApiCaller
+
+        with Metrics.span('refresh.load', span):
+            settingsService = SettingsService()
+            (lat, lon) = settingsService.loadLocationSettings()
+            apiCaller = ApiCaller(settingsService)
+            dataset = apiCaller.getQueriedStationDataset()
+
+        source = apiCaller.getLastSource()
+        if generation != self.__generation:
+            return (lat, lon, dataset, 'stale')
+
+        if source == 'api':
+            from PriceHistory import PriceHistory
+
+            try:
+                self.__snapshot.save(lat, lon, dataset)
+            except Exception as error:
+                print(f'An error has occurred while saving the station data, message: {error}')
+
+            try:
+                PriceHistory.shared().record(dataset)
+            except Exception as error:
+                print(f'An error has occurred while recording the price history, message: {error}')
+
+        return (lat, lon, dataset, source)
+
+    def __onLoaded(self, generation, loaded):
+        (lat, lon, dataset, source) = loaded
+        if generation != self.__generation:
+            return
+
+        previous = self.__lastResult
+        result = (lat, lon, dataset)
+        if source == 'none' and previous is not None:
+            result = previous
+        self.__lastResult = result
+
+        if source in self.FAILED_SOURCES:
+            self.__backOff('failed')
+        elif self.__isRequestedByUser or previous is None:
+            self.__interval = self.MIN_INTERVAL
+        elif previous[2] is not dataset and self.__getChangedShare(previous[2], dataset) > self.VOLATILE_SHARE:
+            self.__interval = self.MIN_INTERVAL
+        else:
+            self.__backOff('unchanged')
+
+        try:
+            with Metrics.span('refresh.apply', self.__span):
+                for (onResult, onStarted, onError) in list(self.__listeners):
+                    onResult(result)
+        finally:
+            self.__finishRefresh(source)
+
+    def __onError(self, generation, error):
+        if generation != self.__generation:
+            return
+
+        print(f'An error has occurred while refreshing the station data, message: {error}')
+        self.__backOff('failed')
+        for (onResult, onStarted, onError) in list(self.__listeners):
+            if onError is not None:
+                onError(error)
+
+        self.__finishRefresh('error')
+
+    def __finishRefresh(self, outcome):
+        if self.__span is not None:
+            self.__span.end(outcome=outcome, interval=self.__interval)
+            self.__span = None
+
+        self.__isRunning = False
+        self.__lastRefreshAt = time.monotonic()
+        Metrics.observe('refresh_interval_s', self.__interval)
+
+        if self.__reasons:
+            self.__trigger()
+        elif self.__isForeground:
+            self.__scheduleTimer(self.__interval)
+
+    def __backOff(self, cause):
+        Metrics.increment('refresh_backoffs', cause=cause)
+        self.__interval = min(self.MAX_INTERVAL, max(self.MIN_INTERVAL, self.__interval * self.BACKOFF_FACTOR))
+
+    def __getChangedShare(self, previous, dataset):
+        '''
+        Returns the share of stations of the dataset whose price differs from the previous dataset.
+        -------------------
+        Parameters:
+            previous: StationDataset
+            dataset: StationDataset
+        -------------------
+        Returns:
+            float, range 0 - 1
+        -------------------
+        '''
+
+        if dataset.size == 0 or previous.type != dataset.type:
+            return 0.0
+
+        previousPrices = {previous.getText('id', index): previous.price[index] for index in range(previous.size)}
+        changed = 0
+        for index in range(dataset.size):
+            previousPrice = previousPrices.get(dataset.getText('id', index))
+            price = dataset.price[index]
+            if previousPrice is not None and previousPrice != price and not (math.isnan(price) and math.isnan(previousPrice)):
+                changed += 1
+
+        return changed / dataset.size
+
+    def __scheduleTimer(self, delay):
+        self.__cancelTimer()
+        self.__timer = Clock.schedule_once(lambda dt: self.requestRefresh('timer'), max(delay, 0))
+
+    def __cancelTimer(self):
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
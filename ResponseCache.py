@@ -0,0 +1,213 @@
+from collections import OrderedDict
+import threading
+import time
+
+class ResponseCache():
+    '''
+    Author: Marian Neff
+    -------------------
+    The ResponseCache is a process-wide, thread safe store for responses of the Tankerkoenig API. Entries are kept for a configurable time to live and the least recently used entries are evicted once the maximum size is reached.
+    Concurrent callers asking for the same key share a single in-flight request, so the map and the table never query the API twice for the same data.
+    Expired entries stay in the cache until they are evicted, so that getLastKnown() can still return them when a new request fails.
+    -------------------
+    '''
+
+    DEFAULT_TTL = 300
+    DEFAULT_MAX_ENTRIES = 32
+    COORDINATE_PRECISION = 4
+
+    def __init__(self, ttl=DEFAULT_TTL, maxEntries=DEFAULT_MAX_ENTRIES):
+        '''
+        Sets the time to live and the maximum amount of entries for the cache.
+        -------------------
+        Parameters:
+            ttl: float, seconds an entry stays valid
+            maxEntries: integer, amount of entries before the least recently used one is evicted
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        self.__lock = threading.Lock()
+        self.__entries = OrderedDict()
+        self.__inFlight = {}
+        self.configure(ttl, maxEntries)
+
+    def configure(self, ttl=None, maxEntries=None):
+        '''
+        Changes the time to live and/or the maximum amount of entries. Surplus entries are evicted right away.
+        -------------------
+        Parameters:
+            ttl: float or None
+            maxEntries: integer or None
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        with self.__lock:
+            if ttl is not None:
+                self.__ttl = float(ttl)
+
+            if maxEntries is not None:
+                self.__maxEntries = max(1, int(maxEntries))
+
+            self.__evictSurplus()
+
+    @classmethod
+    def normalizeKey(cls, lat, lng, rad, type):
+        '''
+        Builds the cache key for a query. Coordinates are rounded to roughly 10 meters so that minimal location differences still share an entry.
+        -------------------
+        Parameters:
+            lat: float
+            lng: float
+            rad: float
+            type: string
+        -------------------
+        Returns:
+            tupel
+        -------------------
+        '''
+
+        return (round(float(lat), cls.COORDINATE_PRECISION), round(float(lng), cls.COORDINATE_PRECISION), float(rad), str(type))
+
+    def get(self, key):
+        '''
+        Returns the cached value for the key or None if there is no valid entry.
+        -------------------
+        Parameters:
+            key: tupel
+        -------------------
+        Returns:
+            any or None
+        -------------------
+        '''
+
+        with self.__lock:
+            return self.__getValid(key)
+
+    def getLastKnown(self, key):
+        '''
+        Returns the value for the key even if its time to live has expired, or None if the key has been evicted.
+        -------------------
+        Parameters:
+            key: tupel
+        -------------------
+        Returns:
+            any or None
+        -------------------
+        '''
+
+        with self.__lock:
+            entry = self.__entries.get(key)
+
+            return entry[1] if entry is not None else None
+
+    def put(self, key, value):
+        '''
+        Stores the value for the key and marks it as the most recently used entry.
+        -------------------
+        Parameters:
+            key: tupel
+            value: any
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        with self.__lock:
+            self.__store(key, value)
+
+    def getOrFetch(self, key, fetch):
+        '''
+        Returns the cached value for the key. If there is none, the provided fetch function is called exactly once, even if several threads ask for the same key at the same time.
+        The fetch function may return None to signal a failed request, which is handed to every waiting caller but never cached.
+        -------------------
+        Parameters:
+            key: tupel
+            fetch: function without parameters
+        -------------------
+        Returns:
+            any or None
+        -------------------
+        '''
+
+        with self.__lock:
+            value = self.__getValid(key)
+            if value is not None:
+                return value
+
+            request = self.__inFlight.get(key)
+            isOwner = request is None
+            if isOwner:
+                request = _InFlightRequest()
+                self.__inFlight[key] = request
+
+        if not isOwner:
+            request.done.wait()
+
+            return request.value
+
+        try:
+            request.value = fetch()
+        finally:
+            with self.__lock:
+                if request.value is not None:
+                    self.__store(key, request.value)
+                del self.__inFlight[key]
+            request.done.set()
+
+        return request.value
+
+    def invalidate(self, key=None):
+        '''
+        Removes the entry for the key or every entry if no key is provided.
+        -------------------
+        Parameters:
+            key: tupel or None
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        with self.__lock:
+            if key is None:
+                self.__entries.clear()
+            else:
+                self.__entries.pop(key, None)
+
+    def __getValid(self, key):
+        entry = self.__entries.get(key)
+        if entry is None:
+            return None
+
+        (storedAt, value) = entry
+        if time.monotonic() - storedAt > self.__ttl:
+            return None
+
+        self.__entries.move_to_end(key)
+
+        return value
+
+    def __store(self, key, value):
+        self.__entries[key] = (time.monotonic(), value)
+        self.__entries.move_to_end(key)
+        self.__evictSurplus()
+
+    def __evictSurplus(self):
+        while len(self.__entries) > self.__maxEntries:
+            self.__entries.popitem(last=False)
+
+class _InFlightRequest():
+    '''
+    Holds the result of a running fetch so that waiting callers can pick it up once it is done.
+    '''
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
@@ -0,0 +1,155 @@
+from ApiExceptions import RetryableApiError
+from email.utils import parsedate_to_datetime
+import datetime
+import random
+import time
+
+class RetryPolicy():
+    '''
+    Author: Marian Neff
+    -------------------
+    The RetryPolicy decides how often and after which delay a failed request to the Tankerkoenig API is sent again.
+    Only requests that failed with a RetryableApiError are retried. The delay grows exponentially with every attempt and is randomised (full jitter), so that many clients do not retry at the same moment.
+    If the server sent a Retry-After header, the policy waits at least that long, or gives up if the server asks for more than maxRetryAfter seconds.
+    All attempts of a call together stay within maxDuration seconds: a retry is only sent if the delay and a whole attempt up to its timeouts still fit into it. With the default values a call therefore never takes longer than 12 seconds, even if every attempt runs into a timeout.
+    -------------------
+    '''
+
+    RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+    def __init__(self, attempts=3, baseDelay=0.5, maxDelay=2.0, maxRetryAfter=5.0, connectTimeout=3.05, readTimeout=4.0, maxDuration=12.0):
+        '''
+        Sets the values of the policy.
+        -------------------
+        Parameters:
+            attempts: integer, amount of requests including the first one
+            baseDelay: float, seconds before the first retry
+            maxDelay: float, upper limit for the delay between two attempts
+            maxRetryAfter: float, upper limit for a delay requested by the server
+            connectTimeout: float, seconds to wait for the connection
+            readTimeout: float, seconds to wait for the response once connected
+            maxDuration: float, upper limit for all attempts and delays of a call together
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        self.attempts = attempts
+        self.baseDelay = baseDelay
+        self.maxDelay = maxDelay
+        self.maxRetryAfter = maxRetryAfter
+        self.connectTimeout = connectTimeout
+        self.readTimeout = readTimeout
+        self.maxDuration = maxDuration
+
+    def getTimeout(self):
+        '''
+        Returns the timeouts in the format requests expects them.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            tupel, (connectTimeout, readTimeout)
+        -------------------
+        '''
+
+        return (self.connectTimeout, self.readTimeout)
+
+    def isRetryableStatus(self, statusCode):
+        '''
+        Checks whether a response with the provided HTTP status code is worth retrying.
+        -------------------
+        Parameters:
+            statusCode: integer
+        -------------------
+        Returns:
+            boolean
+        -------------------
+        '''
+
+        return statusCode in self.RETRYABLE_STATUS_CODES
+
+    def parseRetryAfter(self, value):
+        '''
+        Reads the value of a Retry-After header, which is either a number of seconds or a HTTP date.
+        -------------------
+        Parameters:
+            value: string or None
+        -------------------
+        Returns:
+            float or None
+        -------------------
+        '''
+
+        if value is None:
+            return None
+
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+
+        try:
+            retryAt = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+
+        if retryAt.tzinfo is None:
+            retryAt = retryAt.replace(tzinfo=datetime.timezone.utc)
+
+        return max(0.0, (retryAt - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+    def getDelay(self, attempt, retryAfter=None):
+        '''
+        Calculates how long to wait before the next attempt.
+        -------------------
+        Parameters:
+            attempt: integer, number of the failed attempt starting at 0
+            retryAfter: float or None, seconds requested by the server
+        -------------------
+        Returns:
+            float
+        -------------------
+        '''
+
+        delay = random.uniform(0, min(self.maxDelay, self.baseDelay * (2 ** attempt)))
+        if retryAfter is not None:
+            delay = max(delay, retryAfter)
+
+        return delay
+
+    def run(self, request, sleep=time.sleep, clock=time.monotonic):
+        '''
+        Calls the request until it succeeds, raises an error that is not retryable, the attempts are used up or another attempt would exceed maxDuration.
+        -------------------
+        Parameters:
+            request: function without parameters
+            sleep: function with one parameter, used to wait between the attempts
+            clock: function without parameters, returns the current time in seconds
+        -------------------
+        Returns:
+            any, the result of the request
+        -------------------
+        Raises:
+            RetryableApiError, if the last attempt failed, the server asked to wait too long or there is no time left for another attempt
+            ApiError, if the request raised an error that is not retryable
+        -------------------
+        '''
+
+        startedAt = clock()
+        for attempt in range(self.attempts):
+            try:
+                return request()
+            except RetryableApiError as error:
+                isLastAttempt = attempt == self.attempts - 1
+                if isLastAttempt or (error.retryAfter is not None and error.retryAfter > self.maxRetryAfter):
+                    raise
+
+                delay = self.getDelay(attempt, error.retryAfter)
+                if clock() - startedAt + delay + self.connectTimeout + self.readTimeout > self.maxDuration:
+                    raise
+
+                print(f'An error has occurred during the API call, retrying, message: {error}')
+                sleep(delay)
@@ -1,6 +1,10 @@
 from SettingsExceptions import SettingsError, UnallowedRadiusError, UnallowedTypeError
+from Metrics import Metrics
 import json
-import geocoder
+import os
+import tempfile
+import threading
+import time
 
 class SettingsService():
     '''
@@ -8,12 +12,22 @@ class SettingsService():
     -------------------
     The SettingsService exists in order to save and load the different settings that a user has to provide while using the app.
     They are loaded in order to make API calls with the user's desired fuel type and distance to their location.
+    The location based on the IP adress is only looked up when no location is saved or a saved IP location has expired. The lookup is shared by every instance within the process.
+    Every instance shares one in-memory copy of the settings files, which is only read again once the modification time of a file changes. Writes replace the files atomically.
+    Listeners registered with subscribe() are called with the names of the changed settings ("radius", "type", "location") whenever a save or a changed file alters their values.
     -------------------
     '''    
 
     FILE_NAME = 'settings.json'
     SETTINGS_FILE_NAME = 'location_settings.json'
     ALLOWED_TYPES = ['e5', 'e10', 'diesel', 'all']
+    IP_LOCATION_MAX_AGE = 24 * 60 * 60
+
+    __ipLocation = None
+    __ipLocationLock = threading.Lock()
+    __fileCache = {}
+    __fileCacheLock = threading.Lock()
+    __listeners = []
 
     def validateSettingParameters(self, radius, type):
         '''
@@ -64,8 +78,7 @@ class SettingsService():
         }
 
         try:
-            with open(self.FILE_NAME, 'w') as jsonFile:
-                json.dump(jsonSettings, jsonFile)
+            self.__writeJsonFile(self.FILE_NAME, jsonSettings)
 
             return True
         except Exception as error:
@@ -75,7 +88,7 @@ class SettingsService():
 
     def loadSettings(self):
         '''
-        Loads the saved settings directly from the the settings.json file. If no settings are provided, it will return an empty dictionary instead of the settings.
+        Loads the saved settings from the in-memory copy of the settings.json file. If no settings are provided, it will return an empty dictionary instead of the settings.
         The returned setting dictionary should typically have the "radius" and "type" parameters.
         If there are no settings created yet, sample settings will be saved so that the functionality of the app is ensured.
         -------------------
@@ -88,10 +101,7 @@ class SettingsService():
         '''
 
         try:
-            with open(self.FILE_NAME, 'r') as jsonFile:
-                settings = json.load(jsonFile)
-
-            return settings
+            return self.__readJsonFile(self.FILE_NAME)
         except FileNotFoundError as fileNotFoundError:
             self.saveSettings(5.0, 'e10')
 
@@ -101,13 +111,15 @@ class SettingsService():
 
             return {}
     
-    def saveLocationSettings(self, lat, long):
+    def saveLocationSettings(self, lat, long, ipLocatedAt=None):
         '''
         Saves the provided location settings into the location_settings.json file.
+        Locations that were determined by the IP adress are saved with the time of the lookup, so that they can expire after IP_LOCATION_MAX_AGE seconds.
         -------------------
         Parameters:
             lat: float
             long: float
+            ipLocatedAt: float or None, unix timestamp of the IP lookup
         -------------------
         Returns:
             boolean
@@ -119,9 +131,11 @@ class SettingsService():
             'long': long
         }
 
+        if ipLocatedAt is not None:
+            jsonSettings['ipLocatedAt'] = ipLocatedAt
+
         try:
-            with open(self.SETTINGS_FILE_NAME, 'w') as jsonFile:
-                json.dump(jsonSettings, jsonFile)
+            self.__writeJsonFile(self.SETTINGS_FILE_NAME, jsonSettings)
 
             return True
         except Exception as error:
@@ -131,9 +145,9 @@ class SettingsService():
 
     def loadLocationSettings(self):
         '''
-        Loads the saved location settings directly from the the location_settings.json file. If no settings are provided, it will return the current location based on the geocoder package.
+        Loads the saved location settings from the in-memory copy of the location_settings.json file. If no settings are provided, it will return the current location based on the geocoder package.
         The returned setting tupel should typically have the "lat" and "long" parameters.
-        If there is no file created yet, the method uses the IP adress to fill the values and make a filler file.
+        If there is no file created yet, values are missing or the saved IP location has expired, the method uses the IP adress to fill the values and make a filler file.
         -------------------
         Parameters:
             none
@@ -142,23 +156,210 @@ class SettingsService():
             tupel
         -------------------
         '''
-        g = geocoder.ip('me')
 
         try:
-            with open(self.SETTINGS_FILE_NAME, 'r') as jsonFile:
-                settings = json.load(jsonFile)
-                lat = settings.get('lat', g.latlng[0])
-                lon = settings.get('long', g.latlng[1])
-
-            return (lat, lon)
+            settings = self.__readJsonFile(self.SETTINGS_FILE_NAME)
         except FileNotFoundError as fileNotFoundError:
-            lat = g.latlng[0]
-            lon = g.latlng[1]
-
-            self.saveLocationSettings(lat, lon)
-            return (lat, lon)
+            settings = {}
         except Exception as error:
-            print(error)
             print(f'An error has occured while loading the settings, message: {error}')
 
-            return ()
\ No newline at end of file
+            return ()
+
+        ipLocatedAt = settings.get('ipLocatedAt')
+        isExpired = ipLocatedAt is not None and time.time() - ipLocatedAt > self.IP_LOCATION_MAX_AGE
+        if 'lat' in settings and 'long' in settings and not isExpired:
+            return (settings.get('lat'), settings.get('long'))
+
+        try:
+            (locatedAt, (ipLat, ipLon)) = self.getIpLocation()
+        except Exception as error:
+            print(f'An error has occured while locating the IP adress, message: {error}')
+
+            return ()
+
+        if isExpired:
+            (lat, lon) = (ipLat, ipLon)
+        else:
+            lat = settings.get('lat', ipLat)
+            lon = settings.get('long', ipLon)
+
+        self.saveLocationSettings(lat, lon, locatedAt)
+
+        return (lat, lon)
+
+    def getIpLocation(self):
+        '''
+        Determines the current location based on the IP adress through the geocoder package.
+        The result is memoized for the whole process, so the lookup only happens once every IP_LOCATION_MAX_AGE seconds.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            tupel, (timestamp, (lat, long))
+        -------------------
+        Raises:
+            ValueError
+        -------------------
+        '''
+
+        cls = SettingsService
+        with cls.__ipLocationLock:
+            if cls.__ipLocation is not None and time.time() - cls.__ipLocation[0] <= self.IP_LOCATION_MAX_AGE:
+                return cls.__ipLocation
+
+            import geocoder
+
+            with Metrics.timer('geocoding_duration_ms', source='ip'):
+                g = geocoder.ip('me')
+            Metrics.increment('geocoding_requests', source='ip', outcome='ok' if g.latlng else 'not_found')
+            if not g.latlng:
+                raise ValueError('The current location could not be determined by the IP adress.')
+
+            cls.__ipLocation = (time.time(), (g.latlng[0], g.latlng[1]))
+
+            return cls.__ipLocation
+
+    def subscribe(self, listener):
+        '''
+        Registers a listener that is called whenever the radius, the type or the location change. The listener receives a set with the names of the changed settings.
+        Listeners are called on the thread that caused the change, UI code has to move the work onto the main thread itself.
+        -------------------
+        Parameters:
+            listener: function with one parameter
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        with SettingsService.__fileCacheLock:
+            if listener not in SettingsService.__listeners:
+                SettingsService.__listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        '''
+        Removes a listener that was registered with subscribe().
+        -------------------
+        Parameters:
+            listener: function with one parameter
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        with SettingsService.__fileCacheLock:
+            if listener in SettingsService.__listeners:
+                SettingsService.__listeners.remove(listener)
+
+    def __readJsonFile(self, fileName):
+        '''
+        Returns a copy of the content of the JSON file. The file is only parsed again if its modification time has changed since the last read.
+        -------------------
+        Parameters:
+            fileName: string
+        -------------------
+        Returns:
+            dictionary
+        -------------------
+        Raises:
+            FileNotFoundError
+        -------------------
+        '''
+
+        modified = os.stat(fileName).st_mtime_ns
+        with SettingsService.__fileCacheLock:
+            cached = SettingsService.__fileCache.get(fileName)
+
+        if cached is not None and cached[0] == modified:
+            Metrics.increment('settings_reads', file=fileName, source='memory')
+
+            return dict(cached[1])
+
+        Metrics.increment('settings_reads', file=fileName, source='disk')
+        with Metrics.timer('settings_io_duration_ms', file=fileName, operation='read'):
+            with open(fileName, 'r') as jsonFile:
+                content = json.load(jsonFile)
+
+        self.__updateFileCache(fileName, modified, content, cached)
+
+        return dict(content)
+
+    def __writeJsonFile(self, fileName, content):
+        '''
+        Writes the content into a temporary file and renames it to the JSON file, so that readers never see a partially written file. Every write gets a temporary file of its own, so concurrent writes can not mix their content. The in-memory copy is updated right away.
+        -------------------
+        Parameters:
+            fileName: string
+            content: dictionary
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        with SettingsService.__fileCacheLock:
+            cached = SettingsService.__fileCache.get(fileName)
+
+        if cached is None:
+            try:
+                self.__readJsonFile(fileName)
+            except Exception:
+                pass
+
+            with SettingsService.__fileCacheLock:
+                cached = SettingsService.__fileCache.get(fileName, (None, {}))
+
+        with Metrics.timer('settings_io_duration_ms', file=fileName, operation='write'):
+            (descriptor, temporaryFileName) = tempfile.mkstemp(suffix='.tmp', prefix=os.path.basename(fileName) + '.', dir=os.path.dirname(os.path.abspath(fileName)))
+            try:
+                with os.fdopen(descriptor, 'w') as jsonFile:
+                    json.dump(content, jsonFile)
+                os.replace(temporaryFileName, fileName)
+            except BaseException:
+                try:
+                    os.remove(temporaryFileName)
+                except OSError:
+                    pass
+                raise
+
+        self.__updateFileCache(fileName, os.stat(fileName).st_mtime_ns, dict(content), cached)
+
+    def __updateFileCache(self, fileName, modified, content, previous):
+        '''
+        Stores the content of a file in the shared cache and notifies the listeners about changed settings. Nothing is published for the very first read of a file.
+        -------------------
+        Parameters:
+            fileName: string
+            modified: integer, modification time in nanoseconds
+            content: dictionary
+            previous: tupel or None, the cache entry that is replaced, None for the first read
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        with SettingsService.__fileCacheLock:
+            SettingsService.__fileCache[fileName] = (modified, content)
+            listeners = list(SettingsService.__listeners)
+
+        if previous is None:
+            return
+
+        oldContent = previous[1]
+        if fileName == self.FILE_NAME:
+            changes = {key for key in ('radius', 'type') if oldContent.get(key) != content.get(key)}
+        else:
+            changes = {'location'} if (oldContent.get('lat'), oldContent.get('long')) != (content.get('lat'), content.get('long')) else set()
+
+        if changes == set():
+            return
+
+        for listener in listeners:
+            try:
+                listener(changes)
+            except Exception as error:
+                print(f'An error has occured while notifying about changed settings, message: {error}')
@@ -0,0 +1,82 @@
+import time
+
+class StartupProfiler():
+    '''
+    Author: Alexander Gajer
+    -------------------
+    The StartupProfiler records how long the different steps of the app start take, measured from the moment the profiler module was imported, so that the time to the first frame can be tracked.
+    Every step is recorded once with mark(). report() prints all recorded steps in the order they happened.
+    -------------------
+    '''
+
+    __startedAt = time.perf_counter()
+    __marks = []
+
+    @classmethod
+    def mark(cls, name):
+        '''
+        Records that the step with the provided name has finished.
+        -------------------
+        Parameters:
+            name: string
+        -------------------
+        Returns:
+            float, seconds since the start
+        -------------------
+        '''
+
+        elapsed = time.perf_counter() - cls.__startedAt
+        cls.__marks.append((name, elapsed))
+
+        return elapsed
+
+    @classmethod
+    def measure(cls, name, function, *args, **kwargs):
+        '''
+        Calls the function and records how long it took as a step of its own.
+        -------------------
+        Parameters:
+            name: string
+            function: function
+        -------------------
+        Returns:
+            any, the result of the function
+        -------------------
+        '''
+
+        startedAt = time.perf_counter()
+        result = function(*args, **kwargs)
+        cls.__marks.append((name + ' (took ' + format(time.perf_counter() - startedAt, '.3f') + ' s)', time.perf_counter() - cls.__startedAt))
+
+        return result
+
+    @classmethod
+    def getMarks(cls):
+        '''
+        Returns the recorded steps.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            list of tupels, (name, seconds since the start)
+        -------------------
+        '''
+
+        return list(cls.__marks)
+
+    @classmethod
+    def report(cls):
+        '''
+        Prints the recorded steps.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        for (name, elapsed) in cls.__marks:
+            print(f'Startup: {elapsed:.3f} s {name}')
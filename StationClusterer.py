@@ -0,0 +1,155 @@
+import math
+
+class StationClusterer():
+    '''
+    Author: Marian Neff
+    -------------------
+    The StationClusterer groups petrol stations that are close to each other on the screen into clusters, so that the map does not have to show hundreds of overlapping markers for large radiuses.
+    The stations are sorted into a grid of CELL_SIZE pixels for each zoom level of the map. A grid is only built once per dataset and zoom level, panning the map just selects the cells inside the visible area.
+    -------------------
+    '''
+
+    CELL_SIZE = 64
+    TILE_SIZE = 256
+    CLUSTER_MAX_ZOOM = 17
+
+    def __init__(self):
+        '''
+        Creates an empty clusterer.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        self.__dataset = None
+        self.__grids = {}
+
+    def setDataset(self, dataset):
+        '''
+        Replaces the stations that are clustered. Every grid built for the previous stations is dropped.
+        -------------------
+        Parameters:
+            dataset: StationDataset
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        self.__dataset = dataset
+        self.__grids = {}
+
+    def getClusters(self, zoom, bbox):
+        '''
+        Returns the clusters of stations that lie within the provided area. Cells next to the area are included as well, so that markers do not pop up only once they are fully visible.
+        Above CLUSTER_MAX_ZOOM every station gets its own cluster.
+        -------------------
+        Parameters:
+            zoom: integer
+            bbox: tupel, (latMin, lonMin, latMax, lonMax)
+        -------------------
+        Returns:
+            list of StationCluster
+        -------------------
+        '''
+
+        zoom = int(zoom)
+        grid = self.__getGrid(zoom)
+        (latMin, lonMin, latMax, lonMax) = bbox
+        (xMin, yMin) = self.__getCell(latMax, lonMin, zoom)
+        (xMax, yMax) = self.__getCell(latMin, lonMax, zoom)
+
+        return [
+            cluster
+            for cluster in grid
+            if xMin - 1 <= cluster.cell[0] <= xMax + 1 and yMin - 1 <= cluster.cell[1] <= yMax + 1
+        ]
+
+    def __getGrid(self, zoom):
+        '''
+        Returns the clusters of every grid cell for the zoom level and builds them if they do not exist yet.
+        -------------------
+        Parameters:
+            zoom: integer
+        -------------------
+        Returns:
+            list of StationCluster
+        -------------------
+        '''
+
+        grid = self.__grids.get(zoom)
+        if grid is not None:
+            return grid
+
+        dataset = self.__dataset
+        if dataset is None:
+            return []
+
+        cells = {}
+        for index in range(dataset.size):
+            cell = self.__getCell(dataset.lat[index], dataset.lng[index], zoom)
+            key = cell if zoom < self.CLUSTER_MAX_ZOOM else cell + (index,)
+            cells.setdefault(key, []).append(index)
+
+        grid = [StationCluster((zoom,) + key, key[:2], dataset, indices) for key, indices in cells.items()]
+        self.__grids[zoom] = grid
+
+        return grid
+
+    def __getCell(self, lat, lon, zoom):
+        '''
+        Projects the coordinates to web mercator pixels of the zoom level and returns the grid cell they are in.
+        -------------------
+        Parameters:
+            lat: float
+            lon: float
+            zoom: integer
+        -------------------
+        Returns:
+            tupel, (cellX, cellY)
+        -------------------
+        '''
+
+        mapSize = self.TILE_SIZE * (2 ** zoom)
+        lat = max(min(lat, 85.05112878), -85.05112878)
+        sinLat = math.sin(math.radians(lat))
+        x = (lon + 180.0) / 360.0 * mapSize
+        y = (0.5 - math.log((1 + sinLat) / (1 - sinLat)) / (4 * math.pi)) * mapSize
+
+        return (int(x // self.CELL_SIZE), int(y // self.CELL_SIZE))
+
+class StationCluster():
+    '''
+    Author: Marian Neff
+    -------------------
+    The StationCluster holds the indices of the stations of one grid cell within the StationDataset. Its position is the center of its stations and it knows the cheapest price among them.
+    -------------------
+    '''
+
+    def __init__(self, key, cell, dataset, indices):
+        '''
+        Computes the position and the cheapest price of the provided stations.
+        -------------------
+        Parameters:
+            key: tupel, identifies the cluster
+            cell: tupel, (cellX, cellY) of the grid
+            dataset: StationDataset
+            indices: list of integers
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        self.key = key
+        self.cell = cell
+        self.indices = indices
+        self.count = len(indices)
+        self.lat = sum(dataset.lat[index] for index in indices) / self.count
+        self.lon = sum(dataset.lng[index] for index in indices) / self.count
+        prices = [dataset.getPrice(index) for index in indices if dataset.getPrice(index)]
+        self.cheapestPrice = min(prices) if prices else None
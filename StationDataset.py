@@ -0,0 +1,256 @@
+from array import array
+import json
+import math
+import struct
+import sys
+import time
+
+class StationDataset():
+    '''
+    Author: Marian Neff
+    -------------------
+    The StationDataset holds the stations of one API response in columns instead of a list of dictionaries. Coordinates, distances and prices are stored in arrays of doubles, text values are interned strings.
+    It is built once per response and shared by the map and the table. The price of every station, the lowest price and the price tier of every station are computed once while building it, for the type "all" the price is the cheapest fuel of the station.
+    Missing prices are stored as NaN.
+    A dataset can be written to bytes with toBytes() and read back with fromBytes() without processing the stations again. The columns are stored as raw arrays in the byte order of the device, so the bytes are only meant for a cache on the same device.
+    -------------------
+    '''
+
+    FUEL_TYPES = ('e5', 'e10', 'diesel')
+    TEXT_FIELDS = ('id', 'name', 'brand', 'street', 'houseNumber', 'postCode', 'place')
+    HIGHEST_LOWEST_PRICE = 5
+    YELLOW_TOLERANCE = 1.02
+    TIER_GREEN = 0
+    TIER_YELLOW = 1
+    TIER_RED = 2
+    TIER_SOURCES = ('images/green32.png', 'images/yellow32.png', 'images/red32.png')
+    MAGIC = b'SDS1'
+    HEADER = struct.Struct('<4sIId')
+
+    def __init__(self, data, type):
+        '''
+        Builds the columns from a response of the list endpoint.
+        -------------------
+        Parameters:
+            data: dictionary
+            type: string, ["e5", "e10", "diesel", "all"]
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        stations = data.get('stations', [])
+        self.type = type
+        self.size = len(stations)
+        self.lat = array('d', (station.get('lat') for station in stations))
+        self.lng = array('d', (station.get('lng') for station in stations))
+        self.dist = array('d', (self.__toFloat(station.get('dist')) for station in stations))
+        self.fuelPrices = {
+            fuel: array('d', (self.__toFloat(station.get(fuel)) for station in stations))
+            for fuel in self.FUEL_TYPES
+        }
+        self.text = {
+            field: [self.__intern(station.get(field)) for station in stations]
+            for field in self.TEXT_FIELDS
+        }
+
+        if type == 'all':
+            columns = [self.fuelPrices.get(fuel) for fuel in self.FUEL_TYPES]
+            self.price = array('d', (self.__minimum(prices) for prices in zip(*columns)))
+        else:
+            self.price = array('d', (self.__toFloat(station.get('price', station.get(type))) for station in stations))
+
+        self.lowestPrice = self.HIGHEST_LOWEST_PRICE
+        for price in self.price:
+            if price < self.lowestPrice:
+                self.lowestPrice = price
+
+        self.tier = self.__classify(self.price, self.lowestPrice)
+        self.fetchedAt = None
+        self.isStale = False
+
+    def toBytes(self):
+        '''
+        Writes the dataset into a compact binary format: a header, the text values as JSON and the columns as raw arrays.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            bytes
+        -------------------
+        '''
+
+        text = json.dumps({'type': self.type, 'lowestPrice': self.lowestPrice, 'text': self.text}).encode('utf-8')
+        parts = [self.HEADER.pack(self.MAGIC, self.size, len(text), self.fetchedAt or 0.0), text]
+        for column in self.__getColumns():
+            parts.append(column.tobytes())
+        parts.append(self.tier.tobytes())
+
+        return b''.join(parts)
+
+    @classmethod
+    def fromBytes(cls, content):
+        '''
+        Reads a dataset that was written with toBytes().
+        -------------------
+        Parameters:
+            content: bytes
+        -------------------
+        Returns:
+            StationDataset
+        -------------------
+        Raises:
+            ValueError
+        -------------------
+        '''
+
+        (magic, size, textLength, fetchedAt) = cls.HEADER.unpack_from(content, 0)
+        if magic != cls.MAGIC:
+            raise ValueError('The content is not a StationDataset.')
+
+        offset = cls.HEADER.size
+        meta = json.loads(bytes(content[offset:offset + textLength]).decode('utf-8'))
+        offset += textLength
+
+        dataset = cls.__new__(cls)
+        dataset.type = meta.get('type')
+        dataset.size = size
+        dataset.lowestPrice = meta.get('lowestPrice')
+        dataset.fetchedAt = fetchedAt or None
+        dataset.isStale = False
+        dataset.text = {field: [sys.intern(value) if isinstance(value, str) else value for value in values] for field, values in meta.get('text').items()}
+        dataset.fuelPrices = {}
+
+        columnLength = size * array('d').itemsize
+        columns = []
+        for index in range(3 + len(cls.FUEL_TYPES) + 1):
+            column = array('d')
+            column.frombytes(content[offset:offset + columnLength])
+            offset += columnLength
+            columns.append(column)
+
+        (dataset.lat, dataset.lng, dataset.dist) = columns[:3]
+        for fuel, column in zip(cls.FUEL_TYPES, columns[3:-1]):
+            dataset.fuelPrices[fuel] = column
+        dataset.price = columns[-1]
+        dataset.tier = array('b')
+        dataset.tier.frombytes(content[offset:offset + size])
+
+        if len(dataset.tier) != size or any(len(column) != size for column in columns):
+            raise ValueError('The content of the StationDataset is incomplete.')
+
+        return dataset
+
+    def getFetchedAtText(self):
+        '''
+        Returns the time the prices were fetched at, like "24.12. 18:05", or an empty string if it is unknown.
+        '''
+
+        if not self.fetchedAt:
+            return ''
+
+        return time.strftime('%d.%m. %H:%M', time.localtime(self.fetchedAt))
+
+    def __getColumns(self):
+        return [self.lat, self.lng, self.dist] + [self.fuelPrices.get(fuel) for fuel in self.FUEL_TYPES] + [self.price]
+
+    def getPrice(self, index):
+        '''
+        Returns the price of the station or None if it has no price.
+        -------------------
+        Parameters:
+            index: integer
+        -------------------
+        Returns:
+            float or None
+        -------------------
+        '''
+
+        price = self.price[index]
+
+        return None if math.isnan(price) else price
+
+    def getText(self, field, index):
+        '''
+        Returns a text value of the station, like its name or street.
+        -------------------
+        Parameters:
+            field: string, one of TEXT_FIELDS
+            index: integer
+        -------------------
+        Returns:
+            string or None
+        -------------------
+        '''
+
+        return self.text.get(field)[index]
+
+    def getMarkerSource(self, index):
+        '''
+        Returns the icon for the price tier of the station.
+        -------------------
+        Parameters:
+            index: integer
+        -------------------
+        Returns:
+            string
+        -------------------
+        '''
+
+        return self.TIER_SOURCES[self.tier[index]]
+
+    def getMarkerSourceForPrice(self, price):
+        '''
+        Checks the provided price to see if it is a bad, mediocre or good price compared to the lowest price of the dataset.
+        Stations with prices equal to the best price are marked in green.
+        Stations with prices within 2% of the best prices are marked in yellow.
+        Any other station is marked in red.
+        -------------------
+        Parameters:
+            price: float or None
+        -------------------
+        Returns:
+            string
+        -------------------
+        '''
+
+        return self.TIER_SOURCES[self.__classify(array('d', [self.__toFloat(price)]), self.lowestPrice)[0]]
+
+    def __classify(self, prices, lowestPrice):
+        '''
+        Sorts the prices into the green, yellow and red tier in one pass. Stations without a price count as 0.0, like they are shown on the map.
+        -------------------
+        Parameters:
+            prices: array of doubles
+            lowestPrice: float
+        -------------------
+        Returns:
+            array of bytes
+        -------------------
+        '''
+
+        yellowLimit = lowestPrice * self.YELLOW_TOLERANCE
+
+        return array('b', (
+            self.TIER_GREEN if price == lowestPrice else self.TIER_YELLOW if price <= yellowLimit else self.TIER_RED
+            for price in (0.0 if math.isnan(price) else price for price in prices)
+        ))
+
+    def __minimum(self, prices):
+        valid = [price for price in prices if not math.isnan(price)]
+
+        return min(valid) if valid else math.nan
+
+    def __toFloat(self, value):
+        if value is None or value is False:
+            return math.nan
+
+        return float(value)
+
+    def __intern(self, value):
+        if isinstance(value, str):
+            return sys.intern(value)
+
+        return value
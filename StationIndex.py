@@ -0,0 +1,168 @@
+from GeoMath import GeoMath
+from collections import OrderedDict
+import math
+import threading
+import time
+
+class StationIndex():
+    '''
+    Author: Marian Neff
+    -------------------
+    The StationIndex keeps the stations of recent API responses in a spatial grid, so that a query whose circle lies completely within a fresh, larger circle can be answered without the API.
+    The stations of every response are sorted into grid cells of CELL_SIZE kilometers. A query only looks at the cells that overlap its circle, filters their stations by the haversine distance and sorts them by distance.
+    A response for the type "all" also answers queries for a single fuel type, because it contains the prices of every fuel.
+    -------------------
+    '''
+
+    CELL_SIZE = 2.0
+    DEFAULT_TTL = 300
+    DEFAULT_MAX_AREAS = 8
+    FUEL_TYPES = ('e5', 'e10', 'diesel')
+
+    def __init__(self, ttl=DEFAULT_TTL, maxAreas=DEFAULT_MAX_AREAS):
+        '''
+        Sets how long responses may be used and how many of them are kept.
+        -------------------
+        Parameters:
+            ttl: float, seconds a response may answer queries
+            maxAreas: integer, amount of responses before the least recently used one is dropped
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        self.ttl = ttl
+        self.maxAreas = maxAreas
+        self.__areas = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def add(self, lat, lng, radius, type, data):
+        '''
+        Adds the stations of a response to the index. A previous response for the same query is replaced.
+        -------------------
+        Parameters:
+            lat: float
+            lng: float
+            radius: float
+            type: string
+            data: dictionary, response of the list endpoint
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        grid = {}
+        for station in data.get('stations', []):
+            grid.setdefault(self.__getCell(station.get('lat'), station.get('lng')), []).append(station)
+
+        key = (lat, lng, radius, type)
+        with self.__lock:
+            self.__areas[key] = _IndexedArea(lat, lng, radius, type, time.monotonic(), grid)
+            self.__areas.move_to_end(key)
+            while len(self.__areas) > self.maxAreas:
+                self.__areas.popitem(last=False)
+
+    def query(self, lat, lng, radius, type):
+        '''
+        Answers the query from a fresh response whose circle contains the whole circle of the query.
+        -------------------
+        Parameters:
+            lat: float
+            lng: float
+            radius: float
+            type: string
+        -------------------
+        Returns:
+            dictionary with the same structure as a response of the list endpoint, or None if no response covers the query
+        -------------------
+        '''
+
+        area = self.__findCoveringArea(lat, lng, radius, type)
+        if area is None:
+            return None
+
+        (north, east) = GeoMath.offset(lat, lng, radius, radius)
+        (south, west) = GeoMath.offset(lat, lng, -radius, -radius)
+        (xMin, yMin) = self.__getCell(south, west)
+        (xMax, yMax) = self.__getCell(north, east)
+
+        stations = []
+        for x in range(xMin, xMax + 1):
+            for y in range(yMin, yMax + 1):
+                for station in area.grid.get((x, y), []):
+                    dist = GeoMath.haversine(lat, lng, station.get('lat'), station.get('lng'))
+                    if dist > radius:
+                        continue
+
+                    result = dict(station, dist=round(dist, 2))
+                    if area.type != type:
+                        for fuel in self.FUEL_TYPES:
+                            result.pop(fuel, None)
+                        result['price'] = station.get(type)
+                    stations.append(result)
+
+        stations.sort(key=lambda station: station.get('dist'))
+
+        return { "ok": True, "stations": stations }
+
+    def clear(self):
+        '''
+        Removes every response from the index.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        with self.__lock:
+            self.__areas.clear()
+
+    def __findCoveringArea(self, lat, lng, radius, type):
+        now = time.monotonic()
+        with self.__lock:
+            for key, area in reversed(self.__areas.items()):
+                if now - area.indexedAt > self.ttl or area.type not in (type, 'all'):
+                    continue
+
+                if GeoMath.haversine(lat, lng, area.lat, area.lng) + radius <= area.radius:
+                    self.__areas.move_to_end(key)
+
+                    return area
+
+        return None
+
+    def __getCell(self, lat, lng):
+        '''
+        Returns the grid cell of the coordinates. Cells are CELL_SIZE kilometers high, their width is corrected for the latitude of Germany.
+        -------------------
+        Parameters:
+            lat: float
+            lng: float
+        -------------------
+        Returns:
+            tupel, (x, y)
+        -------------------
+        '''
+
+        cellHeight = math.degrees(self.CELL_SIZE / GeoMath.EARTH_RADIUS)
+        cellWidth = cellHeight / math.cos(math.radians(51.0))
+
+        return (int(math.floor(lng / cellWidth)), int(math.floor(lat / cellHeight)))
+
+class _IndexedArea():
+    '''
+    Holds the circle, the age and the grid of stations of one response.
+    '''
+
+    def __init__(self, lat, lng, radius, type, indexedAt, grid):
+        self.lat = lat
+        self.lng = lng
+        self.radius = radius
+        self.type = type
+        self.indexedAt = indexedAt
+        self.grid = grid
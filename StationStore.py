@@ -0,0 +1,164 @@
+import json
+import sqlite3
+import threading
+import time
+
+class StationStore():
+    '''
+    Author: Marian Neff
+    -------------------
+    The StationStore keeps the metadata of petrol stations (name, brand, address and coordinates) in a local SQLite database, because it hardly ever changes while the prices change all the time.
+    For every queried area it remembers which stations belong to it and how far away they are, so that later refreshes of the same area only have to query the current prices.
+    Every save prunes the database, so it does not keep growing on the device: areas older than maxAge and all but the newest maxAreas areas are deleted, together with the stations that no remaining area refers to.
+    -------------------
+    '''
+
+    FILE_NAME = 'stations.sqlite'
+    PRICE_FIELDS = ('price', 'e5', 'e10', 'diesel', 'isOpen')
+    MAX_AGE = 24 * 60 * 60
+    MAX_AREAS = 32
+
+    def __init__(self, fileName=FILE_NAME, maxAge=MAX_AGE, maxAreas=MAX_AREAS):
+        '''
+        Sets the database file and the limits of the pruning. The connection is only opened once the store is used for the first time.
+        -------------------
+        Parameters:
+            fileName: string
+            maxAge: float, seconds after which an area is deleted
+            maxAreas: integer, amount of areas that are kept
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        self.__fileName = fileName
+        self.maxAge = maxAge
+        self.maxAreas = maxAreas
+        self.__connection = None
+        self.__lock = threading.Lock()
+
+    def saveArea(self, areaKey, stations):
+        '''
+        Saves the metadata of the provided stations and remembers them as the stations of the area. Prices are not saved. Afterwards the outdated areas and their stations are deleted.
+        -------------------
+        Parameters:
+            areaKey: tupel, (lat, lng, rad)
+            stations: list of dictionaries as returned by list.php
+        -------------------
+        Returns:
+            boolean
+        -------------------
+        '''
+
+        stationRows = []
+        areaStations = []
+        for station in stations:
+            metadata = {key: value for key, value in station.items() if key not in self.PRICE_FIELDS and key != 'dist'}
+            stationRows.append((station.get('id'), json.dumps(metadata)))
+            areaStations.append((station.get('id'), station.get('dist')))
+
+        try:
+            with self.__lock:
+                connection = self.__getConnection()
+                with connection:
+                    connection.executemany('INSERT OR REPLACE INTO stations (id, metadata) VALUES (?, ?)', stationRows)
+                    connection.execute(
+                        'INSERT OR REPLACE INTO areas (areaKey, fetchedAt, stations) VALUES (?, ?, ?)',
+                        (json.dumps(list(areaKey)), time.time(), json.dumps(areaStations))
+                    )
+                    self.__prune(connection)
+
+            return True
+        except Exception as error:
+            print(f'An error has occurred while saving the stations, message: {error}')
+
+            return False
+
+    def loadArea(self, areaKey, maxAge):
+        '''
+        Loads the stations of the area with their distance but without prices, sorted by distance.
+        Returns None if the area is unknown, older than maxAge seconds or one of its stations is missing.
+        -------------------
+        Parameters:
+            areaKey: tupel, (lat, lng, rad)
+            maxAge: float, seconds
+        -------------------
+        Returns:
+            list of dictionaries or None
+        -------------------
+        '''
+
+        try:
+            with self.__lock:
+                connection = self.__getConnection()
+                area = connection.execute('SELECT fetchedAt, stations FROM areas WHERE areaKey = ?', (json.dumps(list(areaKey)),)).fetchone()
+                if area is None or time.time() - area[0] > maxAge:
+                    return None
+
+                areaStations = json.loads(area[1])
+                ids = [stationId for (stationId, dist) in areaStations]
+                metadata = {}
+                for index in range(0, len(ids), 500):
+                    batch = ids[index:index + 500]
+                    placeholders = ', '.join('?' * len(batch))
+                    for (stationId, stationMetadata) in connection.execute('SELECT id, metadata FROM stations WHERE id IN (' + placeholders + ')', batch):
+                        metadata[stationId] = stationMetadata
+        except Exception as error:
+            print(f'An error has occurred while loading the stations, message: {error}')
+
+            return None
+
+        stations = []
+        for (stationId, dist) in areaStations:
+            if stationId not in metadata:
+                return None
+
+            station = json.loads(metadata[stationId])
+            station['dist'] = dist
+            stations.append(station)
+
+        return stations
+
+    def __prune(self, connection):
+        '''
+        Deletes the areas older than maxAge and all but the newest maxAreas areas, then the stations that are not part of any remaining area. Has to be called while holding the lock.
+        -------------------
+        Parameters:
+            connection: sqlite3.Connection
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        connection.execute('DELETE FROM areas WHERE fetchedAt < ?', (time.time() - self.maxAge,))
+        connection.execute('DELETE FROM areas WHERE areaKey NOT IN (SELECT areaKey FROM areas ORDER BY fetchedAt DESC LIMIT ?)', (self.maxAreas,))
+
+        referenced = set()
+        for (areaStations,) in connection.execute('SELECT stations FROM areas'):
+            referenced.update(stationId for (stationId, dist) in json.loads(areaStations))
+
+        unreferenced = [(stationId,) for (stationId,) in connection.execute('SELECT id FROM stations') if stationId not in referenced]
+        connection.executemany('DELETE FROM stations WHERE id = ?', unreferenced)
+
+    def __getConnection(self):
+        '''
+        Opens the database and creates the tables on first use. Has to be called while holding the lock.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            sqlite3.Connection
+        -------------------
+        '''
+
+        if self.__connection is None:
+            connection = sqlite3.connect(self.__fileName, check_same_thread=False)
+            with connection:
+                connection.execute('CREATE TABLE IF NOT EXISTS stations (id TEXT PRIMARY KEY, metadata TEXT NOT NULL)')
+                connection.execute('CREATE TABLE IF NOT EXISTS areas (areaKey TEXT PRIMARY KEY, fetchedAt REAL NOT NULL, stations TEXT NOT NULL)')
+            self.__connection = connection
+
+        return self.__connection
@@ -0,0 +1,172 @@
+from collections import OrderedDict
+import os
+import threading
+
+class TileCache():
+    '''
+    Author: Marian Neff
+    -------------------
+    The TileCache is a disk cache for map tiles of limited size. It uses the directory and the file names of the cache of kivy_garden.mapview, so the MapView loads prefetched tiles directly from disk instead of downloading them.
+    The mapview counts the rows of the tiles from the bottom, so the y of the usual XYZ tile scheme is flipped in the file names.
+    The tiles are kept in the order they were last used. Once the files together exceed maxBytes, the least recently used tiles are deleted. The modification time of a file marks its last use, so the order survives a restart of the app.
+    The MapView writes its own downloads into the same directory without the TileCache noticing. trim() therefore reads the directory again, so it has to be called regularly for those tiles to count against maxBytes.
+    -------------------
+    '''
+
+    DIRECTORY = 'cache'
+    MAX_BYTES = 50 * 1024 * 1024
+    FILE_FORMAT = '{cacheKey}_{zoom}_{x}_{y}.{imageExt}'
+
+    def __init__(self, directory=DIRECTORY, maxBytes=MAX_BYTES):
+        '''
+        Sets the directory and the size limit. The directory is only read once the cache is used.
+        -------------------
+        Parameters:
+            directory: string
+            maxBytes: integer
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.__lock = threading.Lock()
+        self.__files = None
+        self.__totalBytes = 0
+
+    def getFileName(self, source, zoom, x, y):
+        '''
+        Returns the path of the tile in the cache. x and y are the XYZ tile coordinates, as used in the URLs of the tile servers.
+        -------------------
+        Parameters:
+            source: TileSource
+            zoom: integer
+            x: integer
+            y: integer
+        -------------------
+        Returns:
+            string
+        -------------------
+        '''
+
+        row = 2 ** zoom - y - 1
+
+        return os.path.join(self.directory, self.FILE_FORMAT.format(cacheKey=source.cacheKey, zoom=zoom, x=x, y=row, imageExt=source.imageExt))
+
+    def contains(self, source, zoom, x, y):
+        '''
+        Checks whether the tile is cached and marks it as recently used.
+        -------------------
+        Parameters:
+            source: TileSource
+            zoom: integer
+            x: integer
+            y: integer
+        -------------------
+        Returns:
+            boolean
+        -------------------
+        '''
+
+        fileName = self.getFileName(source, zoom, x, y)
+        with self.__lock:
+            self.__load()
+            if fileName not in self.__files:
+                if not os.path.exists(fileName):
+                    return False
+
+                self.__add(fileName, os.path.getsize(fileName))
+
+            self.__files.move_to_end(fileName)
+
+        try:
+            os.utime(fileName)
+        except OSError:
+            return False
+
+        return True
+
+    def put(self, source, zoom, x, y, content):
+        '''
+        Saves the tile atomically and deletes the least recently used tiles if the cache got too large.
+        -------------------
+        Parameters:
+            source: TileSource
+            zoom: integer
+            x: integer
+            y: integer
+            content: bytes
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        fileName = self.getFileName(source, zoom, x, y)
+        temporaryFileName = fileName + '.' + str(threading.get_ident()) + '.tmp'
+        os.makedirs(self.directory, exist_ok=True)
+        with open(temporaryFileName, 'wb') as tileFile:
+            tileFile.write(content)
+        os.replace(temporaryFileName, fileName)
+
+        with self.__lock:
+            self.__load()
+            self.__add(fileName, len(content))
+            self.__evict()
+
+    def getSize(self):
+        '''
+        Returns the size of all cached tiles in bytes.
+        '''
+
+        with self.__lock:
+            self.__load()
+
+            return self.__totalBytes
+
+    def trim(self):
+        '''
+        Reads the directory again, including the tiles downloaded by the MapView, and deletes the least recently used tiles until the cache is within maxBytes.
+        '''
+
+        with self.__lock:
+            self.__files = None
+            self.__load()
+            self.__evict()
+
+    def __load(self):
+        '''
+        Reads the files of the directory ordered by their last use, unless they have already been read.
+        '''
+
+        if self.__files is not None:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+        entries.sort()
+
+        self.__files = OrderedDict()
+        self.__totalBytes = 0
+        for (modified, fileName, size) in entries:
+            self.__add(fileName, size)
+
+    def __add(self, fileName, size):
+        self.__totalBytes += size - self.__files.get(fileName, 0)
+        self.__files[fileName] = size
+        self.__files.move_to_end(fileName)
+
+    def __evict(self):
+        while self.__totalBytes > self.maxBytes and len(self.__files) > 1:
+            (fileName, size) = self.__files.popitem(last=False)
+            self.__totalBytes -= size
+            try:
+                os.remove(fileName)
+            except OSError:
+                pass
@@ -0,0 +1,275 @@
+from concurrent.futures import ThreadPoolExecutor
+from GeoMath import GeoMath
+from Metrics import Metrics
+from RateLimiter import RateLimiter
+from TileCache import TileCache
+import math
+import threading
+
+class TileSource():
+    '''
+    Author: Marian Neff
+    -------------------
+    The TileSource describes a tile server: the URL template with {z}, {x} and {y}, the key of its tiles in the TileCache and the available zoom levels. It downloads single tiles through the shared session of the HttpTransport.
+    Any object with cacheKey, imageExt, minZoom, maxZoom and fetch() can be used as a source instead, for example a local stand-in of a tile server.
+    -------------------
+    '''
+
+    URL = 'https://tile.openstreetmap.org/{z}/{x}/{y}.png'
+    HEADERS = {
+        'User-Agent': 'Tankerkoenig/1.0 (gsog.eigeneDomain.tankerkoenig)',
+        'Accept': 'image/png,image/*;q=0.8'
+    }
+    TIMEOUT = 10
+
+    def __init__(self, url=URL, cacheKey='osm', imageExt='png', minZoom=0, maxZoom=19):
+        '''
+        Sets the tile server.
+        -------------------
+        Parameters:
+            url: string, template with {z}, {x} and {y}
+            cacheKey: string
+            imageExt: string
+            minZoom: integer
+            maxZoom: integer
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        self.url = url
+        self.cacheKey = cacheKey
+        self.imageExt = imageExt
+        self.minZoom = minZoom
+        self.maxZoom = maxZoom
+
+    def fetch(self, zoom, x, y):
+        '''
+        Downloads a single tile.
+        -------------------
+        Parameters:
+            zoom: integer
+            x: integer
+            y: integer
+        -------------------
+        Returns:
+            bytes
+        -------------------
+        Raises:
+            requests.RequestException: if the tile could not be downloaded
+        -------------------
+        '''
+
+        from HttpTransport import HttpTransport
+
+        response = HttpTransport.getSession().get(self.url.format(z=zoom, x=x, y=y), headers=self.HEADERS, timeout=self.TIMEOUT)
+        response.raise_for_status()
+
+        return response.content
+
+class TilePrefetcher():
+    '''
+    Author: Marian Neff
+    -------------------
+    The TilePrefetcher downloads the map tiles of the search circle into the TileCache ahead of time, so that the map does not wait for tiles after a cold start or when the location changes.
+    The zoom levels go from the one on which the whole circle fits onto about one tile up to maxZoom. The tiles are fetched level by level and on every level the ones closest to the center first, at most maxTiles per prefetch. The tile usage policy of OpenStreetMap forbids downloading more than 250 tiles at zoom 13 and above ahead of time, so MAX_TILES stays at 250 for all levels together.
+    The downloads run on a few worker threads under a shared RateLimiter. A newer prefetch makes the remaining tiles of an older one obsolete, they are skipped.
+    -------------------
+    '''
+
+    MAX_WORKERS = 2
+    REQUESTS_PER_SECOND = 2.0
+    MAX_TILES = 250
+    MAX_ZOOM = 15
+
+    __sharedPrefetcher = None
+    __sharedLock = threading.Lock()
+
+    def __init__(self, source=None, cache=None, maxWorkers=MAX_WORKERS, requestsPerSecond=REQUESTS_PER_SECOND, maxTiles=MAX_TILES):
+        '''
+        Sets the source and the cache of the tiles and creates the worker pool.
+        -------------------
+        Parameters:
+            source: TileSource or None for OpenStreetMap
+            cache: TileCache or None for the default cache
+            maxWorkers: integer
+            requestsPerSecond: float
+            maxTiles: integer, tiles per prefetch
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        self.source = source if source is not None else TileSource()
+        self.cache = cache if cache is not None else TileCache()
+        self.maxTiles = maxTiles
+        self.__rateLimiter = RateLimiter(requestsPerSecond)
+        self.__executor = ThreadPoolExecutor(max_workers=maxWorkers, thread_name_prefix='TilePrefetcher')
+        self.__lock = threading.Lock()
+        self.__generation = 0
+
+    @classmethod
+    def shared(cls):
+        '''
+        Returns the prefetcher shared by the whole application.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            TilePrefetcher
+        -------------------
+        '''
+
+        with cls.__sharedLock:
+            if cls.__sharedPrefetcher is None:
+                cls.__sharedPrefetcher = cls()
+
+            return cls.__sharedPrefetcher
+
+    def getZoomLevels(self, lat, radius, maxZoom=MAX_ZOOM):
+        '''
+        Returns the zoom levels that are relevant for the circle: from the one on which the circle fits onto about one tile up to maxZoom, within the zoom levels of the source.
+        -------------------
+        Parameters:
+            lat: float
+            radius: float, kilometers
+            maxZoom: integer
+        -------------------
+        Returns:
+            range
+        -------------------
+        '''
+
+        circumference = 2 * math.pi * GeoMath.EARTH_RADIUS * math.cos(math.radians(lat))
+        minZoom = int(math.floor(math.log2(circumference / (2 * max(radius, 0.1)))))
+        maxZoom = min(maxZoom, self.source.maxZoom)
+
+        return range(max(self.source.minZoom, min(minZoom, maxZoom)), maxZoom + 1)
+
+    def getTiles(self, lat, lon, radius, zoomLevels):
+        '''
+        Returns the tiles that overlap the circle, level by level and on every level sorted by the distance of the tile to the center.
+        -------------------
+        Parameters:
+            lat: float
+            lon: float
+            radius: float, kilometers
+            zoomLevels: iterable of integers
+        -------------------
+        Returns:
+            list of tupels, (zoom, x, y)
+        -------------------
+        '''
+
+        (south, west) = GeoMath.offset(lat, lon, -radius, -radius)
+        (north, east) = GeoMath.offset(lat, lon, radius, radius)
+        tiles = []
+        for zoom in zoomLevels:
+            (minX, minY) = self.__getTile(north, west, zoom)
+            (maxX, maxY) = self.__getTile(south, east, zoom)
+            levelTiles = []
+            for x in range(minX, maxX + 1):
+                for y in range(minY, maxY + 1):
+                    distance = self.__getDistance(lat, lon, zoom, x, y)
+                    if distance <= radius:
+                        levelTiles.append((distance, x, y))
+
+            levelTiles.sort()
+            tiles.extend((zoom, x, y) for (distance, x, y) in levelTiles)
+
+        return tiles
+
+    def prefetch(self, lat, lon, radius, zoomLevels=None):
+        '''
+        Downloads the missing tiles of the circle into the cache and waits until they are done. Tiles that are already cached are only marked as recently used.
+        This blocks, so it is meant to run on a worker thread like the ones of the BackgroundLoader.
+        -------------------
+        Parameters:
+            lat: float
+            lon: float
+            radius: float, kilometers
+            zoomLevels: iterable of integers or None for getZoomLevels()
+        -------------------
+        Returns:
+            dictionary with the amount of tiles, cached, fetched, failed and skipped tiles
+        -------------------
+        '''
+
+        with self.__lock:
+            self.__generation += 1
+            generation = self.__generation
+
+        if zoomLevels is None:
+            zoomLevels = self.getZoomLevels(lat, radius)
+
+        with Metrics.span('tiles.prefetch', radius=radius), Metrics.timer('tile_prefetch_duration_ms'):
+            self.cache.trim()
+            tiles = self.getTiles(lat, lon, radius, zoomLevels)[:self.maxTiles]
+            counts = {'tiles': len(tiles), 'cached': 0, 'fetched': 0, 'failed': 0, 'skipped': 0}
+            futures = []
+            for (zoom, x, y) in tiles:
+                if self.cache.contains(self.source, zoom, x, y):
+                    counts['cached'] += 1
+                else:
+                    futures.append(self.__executor.submit(self.__fetch, generation, zoom, x, y))
+
+            for future in futures:
+                counts[future.result()] += 1
+
+        for outcome in ('cached', 'fetched', 'failed', 'skipped'):
+            Metrics.increment('tiles_prefetched', counts[outcome], outcome=outcome)
+
+        return counts
+
+    def __fetch(self, generation, zoom, x, y):
+        '''
+        Downloads a single tile into the cache, unless a newer prefetch has started in the meantime. This runs on a worker thread.
+        -------------------
+        Returns:
+            string, ["fetched", "failed", "skipped"]
+        -------------------
+        '''
+
+        if generation != self.__generation:
+            return 'skipped'
+
+        self.__rateLimiter.acquire()
+        if generation != self.__generation:
+            return 'skipped'
+
+        try:
+            self.cache.put(self.source, zoom, x, y, self.source.fetch(zoom, x, y))
+        except Exception as error:
+            print(f'An error has occurred while prefetching the tile {zoom}/{x}/{y}, message: {error}')
+
+            return 'failed'
+
+        return 'fetched'
+
+    def __getTile(self, lat, lon, zoom):
+        '''
+        Returns the XYZ tile that contains the coordinate.
+        '''
+
+        count = 2 ** zoom
+        latRadians = math.radians(max(-85.0511, min(85.0511, lat)))
+        x = int((lon + 180) / 360 * count)
+        y = int((1 - math.asinh(math.tan(latRadians)) / math.pi) / 2 * count)
+
+        return (max(0, min(count - 1, x)), max(0, min(count - 1, y)))
+
+    def __getDistance(self, lat, lon, zoom, x, y):
+        '''
+        Returns the distance from the coordinate to the closest point of the tile, 0 if the tile contains it.
+        '''
+
+        count = 2 ** zoom
+        west = x / count * 360 - 180
+        east = (x + 1) / count * 360 - 180
+        north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / count))))
+        south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / count))))
+
+        return GeoMath.haversine(lat, lon, max(south, min(north, lat)), max(west, min(east, lon)))
@@ -0,0 +1,255 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import json
+import math
+import random
+import threading
+import time
+
+class StandInServer():
+    '''
+    Author: Marian Neff
+    -------------------
+    The StandInServer is a local stand-in for the list and prices endpoints of the Tankerkoenig API, so that the ApiCaller can be measured without network access and without using up the API key.
+    It also serves map tiles of TILE_SIZE bytes under tileUrl, as a stand-in for the tile server of the TilePrefetcher.
+    It answers with a recorded list.php response or with synthetic stations around the queried location. Every response can be delayed by a fixed latency and a share of the requests fails with a 503 error.
+    -------------------
+    '''
+
+    TILE_SIZE = 16 * 1024
+    BRANDS = ('ARAL', 'Shell', 'ESSO', 'TotalEnergies', 'JET', 'AVIA', 'Freie Tankstelle')
+
+    def __init__(self, stationCount=100, latency=0.0, failureRate=0.0, payload=None, seed=1):
+        '''
+        Sets how the server answers.
+        -------------------
+        Parameters:
+            stationCount: integer, amount of synthetic stations per list response
+            latency: float, seconds every response is delayed
+            failureRate: float, range 0 - 1, share of requests that fail with status 503
+            payload: dictionary or None, recorded list.php response that is replayed instead of synthetic stations
+            seed: integer, seed for the synthetic stations and the failures
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        self.stationCount = stationCount
+        self.latency = latency
+        self.failureRate = failureRate
+        self.payload = payload
+        self.requestCount = 0
+        self.failureCount = 0
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+        self.__stations = {}
+        self.__server = None
+        self.__thread = None
+
+    @property
+    def url(self):
+        '''
+        Returns the base URL of the running server, like http://127.0.0.1:12345/json
+        '''
+
+        (host, port) = self.__server.server_address[:2]
+
+        return 'http://' + host + ':' + str(port) + '/json'
+
+    @property
+    def tileUrl(self):
+        '''
+        Returns the URL template of the tiles of the running server, like http://127.0.0.1:12345/tiles/{z}/{x}/{y}.png
+        '''
+
+        (host, port) = self.__server.server_address[:2]
+
+        return 'http://' + host + ':' + str(port) + '/tiles/{z}/{x}/{y}.png'
+
+    def start(self):
+        '''
+        Starts the server on a free local port in a background thread.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            StandInServer
+        -------------------
+        '''
+
+        standIn = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                standIn._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.__server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.__server.daemon_threads = True
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+        self.__thread.start()
+
+        return self
+
+    def stop(self):
+        '''
+        Stops the server.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server = None
+
+    def resetCounters(self):
+        '''
+        Sets the request and failure counters back to 0.
+        '''
+
+        with self.__lock:
+            self.requestCount = 0
+            self.failureCount = 0
+
+    def _handle(self, request):
+        '''
+        Answers a single request. It is called by the request handler on the thread of the request.
+        -------------------
+        Parameters:
+            request: BaseHTTPRequestHandler
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        url = urlparse(request.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        with self.__lock:
+            self.requestCount += 1
+            isFailure = self.__random.random() < self.failureRate
+            if isFailure:
+                self.failureCount += 1
+
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+        if isFailure:
+            self.__send(request, 503, {'ok': False, 'message': 'stand-in failure'}, {'Retry-After': '0'})
+        elif url.path.endswith('/list.php'):
+            self.__send(request, 200, self.__getList(query))
+        elif url.path.endswith('/prices.php'):
+            self.__send(request, 200, self.__getPrices(query))
+        elif url.path.startswith('/tiles/'):
+            self.__sendTile(request, url.path)
+        else:
+            self.__send(request, 404, {'ok': False, 'message': 'unknown endpoint'})
+
+    def __getList(self, query):
+        if self.payload is not None:
+            stations = self.payload.get('stations', [])
+        else:
+            stations = self.createStations(float(query.get('lat', 50.0)), float(query.get('lng', 8.0)), float(query.get('rad', 5)))
+
+        with self.__lock:
+            for station in stations:
+                self.__stations[station.get('id')] = station
+
+        type = query.get('type', 'all')
+        if type == 'all':
+            return {'ok': True, 'status': 'ok', 'stations': stations}
+
+        projected = []
+        for station in stations:
+            singleStation = {key: value for key, value in station.items() if key not in ('e5', 'e10', 'diesel')}
+            singleStation['price'] = station.get(type)
+            projected.append(singleStation)
+
+        return {'ok': True, 'status': 'ok', 'stations': projected}
+
+    def __getPrices(self, query):
+        prices = {}
+        with self.__lock:
+            for stationId in query.get('ids', '').split(','):
+                station = self.__stations.get(stationId)
+                if station is None:
+                    prices[stationId] = {'status': 'no prices'}
+                    continue
+
+                prices[stationId] = {'status': 'open'}
+                for fuel in ('e5', 'e10', 'diesel'):
+                    price = station.get(fuel, station.get('price'))
+                    prices[stationId][fuel] = round(price + self.__random.choice((-0.01, 0, 0.01)), 3) if price else False
+
+        return {'ok': True, 'status': 'ok', 'prices': prices}
+
+    def createStations(self, lat, lng, radius):
+        '''
+        Creates stationCount synthetic stations within the circle, sorted by distance. The same circle always gets the same stations.
+        -------------------
+        Parameters:
+            lat: float
+            lng: float
+            radius: float
+        -------------------
+        Returns:
+            list of dictionaries
+        -------------------
+        '''
+
+        generator = random.Random(hash((round(lat, 4), round(lng, 4), radius)))
+        stations = []
+        for index in range(self.stationCount):
+            dist = radius * math.sqrt(generator.random())
+            angle = generator.random() * 2 * math.pi
+            stationLat = lat + math.degrees(dist * math.cos(angle) / 6371.0)
+            stationLng = lng + math.degrees(dist * math.sin(angle) / (6371.0 * math.cos(math.radians(lat))))
+            diesel = round(generator.uniform(1.55, 1.85), 3)
+            stations.append({
+                'id': 'stand-in-' + format(round(stationLat, 5), '.5f') + '-' + format(round(stationLng, 5), '.5f'),
+                'name': 'Tankstelle ' + str(index),
+                'brand': generator.choice(self.BRANDS),
+                'street': 'Musterstrasse',
+                'houseNumber': str(index + 1),
+                'postCode': 65183,
+                'place': 'Wiesbaden',
+                'lat': round(stationLat, 6),
+                'lng': round(stationLng, 6),
+                'dist': round(dist, 1),
+                'isOpen': True,
+                'e5': round(diesel + 0.12, 3),
+                'e10': round(diesel + 0.06, 3),
+                'diesel': diesel
+            })
+
+        stations.sort(key=lambda station: station.get('dist'))
+
+        return stations
+
+    def __sendTile(self, request, path):
+        content = (path.encode('utf-8') * (self.TILE_SIZE // len(path) + 1))[:self.TILE_SIZE]
+        request.send_response(200)
+        request.send_header('Content-Type', 'image/png')
+        request.send_header('Content-Length', str(len(content)))
+        request.end_headers()
+        request.wfile.write(content)
+
+    def __send(self, request, status, body, headers=None):
+        content = json.dumps(body).encode('utf-8')
+        request.send_response(status)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(content)))
+        for key, value in (headers or {}).items():
+            request.send_header(key, value)
+        request.end_headers()
+        request.wfile.write(content)
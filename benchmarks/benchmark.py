@@ -0,0 +1,301 @@
+'''
+Author: Marian Neff
+-------------------
+Offline benchmarks for the hot paths of the app. The ApiCaller and the TilePrefetcher are measured against the local StandInServer, the SettingsService in a temporary directory and the processing of the map data without a window.
+The results are saved as JSON, so that two runs (for example of two commits) can be compared with --compare.
+
+Usage:
+    python benchmarks/benchmark.py [--stations 200] [--latency 0.02] [--failure-rate 0.1] [--payload list.json] [--output results.json]
+    python benchmarks/benchmark.py --compare old.json new.json
+-------------------
+'''
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIRECTORY)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from StandInServer import StandInServer
+
+REGRESSION_THRESHOLD = 1.10
+
+def measure(function, runs, setup=None):
+    '''
+    Calls the function the provided amount of times and returns statistics about the durations in milliseconds. The setup function is called before every run and is not measured.
+    '''
+
+    durations = []
+    for run in range(runs):
+        if setup is not None:
+            setup()
+
+        startedAt = time.perf_counter()
+        function()
+        durations.append((time.perf_counter() - startedAt) * 1000)
+
+    durations.sort()
+
+    return {
+        'runs': runs,
+        'mean': statistics.mean(durations),
+        'median': statistics.median(durations),
+        'p95': durations[min(len(durations) - 1, int(round(0.95 * (len(durations) - 1))))],
+        'min': durations[0],
+        'max': durations[-1]
+    }
+
+def benchmarkApiCaller(arguments, workingDirectory):
+    '''
+    Measures getQueriedTankerData against the StandInServer: a cold query through list.php, a refresh through prices.php, a cached query and queries against a failing server.
+    '''
+
+    from ApiCaller import ApiCaller
+    from CircuitBreaker import CircuitBreaker
+    from RetryPolicy import RetryPolicy
+    from SettingsService import SettingsService
+    from StationStore import StationStore
+
+    payload = None
+    if arguments.payload is not None:
+        with open(arguments.payload, 'r') as payloadFile:
+            payload = json.load(payloadFile)
+
+    server = StandInServer(arguments.stations, arguments.latency, 0.0, payload).start()
+    ApiCaller.URL = server.url + '/list.php'
+    ApiCaller.PRICES_URL = server.url + '/prices.php'
+    ApiCaller.RETRY_POLICY = RetryPolicy(baseDelay=0.001, maxDelay=0.01)
+    ApiCaller.STATION_STORE = StationStore(os.path.join(workingDirectory, 'stations.sqlite'))
+    settingsService = SettingsService()
+    settingsService.saveSettings(10.0, 'all')
+    settingsService.saveLocationSettings(50.0826, 8.2493)
+    apiCaller = ApiCaller(settingsService)
+    results = {}
+
+    def resetCaches():
+        ApiCaller.RESPONSE_CACHE.invalidate()
+        ApiCaller.STATION_INDEX.clear()
+        ApiCaller.CIRCUIT_BREAKER = CircuitBreaker()
+
+    def resetAll():
+        resetCaches()
+        ApiCaller.STATION_STORE = StationStore(os.path.join(workingDirectory, 'stations-' + str(time.perf_counter_ns()) + '.sqlite'))
+
+    try:
+        results['api.list'] = measure(apiCaller.getQueriedTankerData, arguments.runs, resetAll)
+        apiCaller.getQueriedTankerData()
+        results['api.prices_refresh'] = measure(apiCaller.getQueriedTankerData, arguments.runs, resetCaches)
+        results['api.cached'] = measure(apiCaller.getQueriedTankerData, arguments.runs * 10)
+
+        if arguments.failure_rate > 0:
+            server.failureRate = arguments.failure_rate
+            server.resetCounters()
+            results['api.list_with_failures'] = measure(apiCaller.getQueriedTankerData, arguments.runs, resetAll)
+            results['api.list_with_failures']['requestsPerCall'] = server.requestCount / arguments.runs
+            results['api.list_with_failures']['failuresPerCall'] = server.failureCount / arguments.runs
+    finally:
+        server.stop()
+
+    return results
+
+def benchmarkSettingsService(arguments):
+    '''
+    Measures a save followed by a load of both settings files and a load from the in-memory copy.
+    '''
+
+    from SettingsService import SettingsService
+
+    settingsService = SettingsService()
+    radiuses = [5.0, 10.0]
+    counter = [0]
+
+    def saveAndLoad():
+        counter[0] += 1
+        settingsService.saveSettings(radiuses[counter[0] % 2], 'e10')
+        settingsService.saveLocationSettings(50.0 + counter[0] * 0.0001, 8.0)
+        settingsService.loadSettings()
+        settingsService.loadLocationSettings()
+
+    def load():
+        settingsService.loadSettings()
+        settingsService.loadLocationSettings()
+
+    return {
+        'settings.save_load': measure(saveAndLoad, arguments.runs * 10),
+        'settings.load': measure(load, arguments.runs * 100)
+    }
+
+def benchmarkMapProcessing(arguments):
+    '''
+    Measures the processing of a response for the map: building the StationDataset, clustering the stations for the visible area and, if Kivy can create widgets here, creating the markers.
+    '''
+
+    from StationClusterer import StationClusterer
+    from StationDataset import StationDataset
+
+    data = {'ok': True, 'stations': StandInServer(arguments.stations).createStations(50.0826, 8.2493, 25.0)}
+    bbox = (49.98, 8.10, 50.18, 8.40)
+    results = {
+        'map.dataset_all': measure(lambda: StationDataset(data, 'all'), arguments.runs * 10),
+        'map.dataset_diesel': measure(lambda: StationDataset(data, 'diesel'), arguments.runs * 10)
+    }
+
+    dataset = StationDataset(data, 'all')
+
+    def cluster():
+        clusterer = StationClusterer()
+        clusterer.setDataset(dataset)
+        for zoom in (11, 13, 15):
+            clusterer.getClusters(zoom, bbox)
+
+    results['map.cluster'] = measure(cluster, arguments.runs * 10)
+
+    try:
+        os.environ.setdefault('KIVY_NO_ARGS', '1')
+        os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+        from kivy_garden.mapview import MapMarkerPopup
+
+        results['map.marker_creation'] = measure(
+            lambda: [MapMarkerPopup(lat=dataset.lat[index], lon=dataset.lng[index], source=dataset.getMarkerSource(index)) for index in range(dataset.size)],
+            arguments.runs
+        )
+    except Exception as error:
+        print(f'The marker creation is skipped, message: {error}')
+
+    return results
+
+def benchmarkTilePrefetcher(arguments, workingDirectory):
+    '''
+    Measures a prefetch of the tiles of a 5 km circle against the StandInServer: into an empty cache, into a full cache and into a cache that is too small for the circle.
+    '''
+
+    from TileCache import TileCache
+    from TilePrefetcher import TilePrefetcher, TileSource
+
+    server = StandInServer(latency=arguments.latency).start()
+    source = TileSource(server.tileUrl, 'stand-in')
+    counter = [0]
+
+    def createPrefetcher(maxBytes=TileCache.MAX_BYTES):
+        counter[0] += 1
+        cache = TileCache(os.path.join(workingDirectory, 'tiles-' + str(counter[0])), maxBytes)
+
+        return TilePrefetcher(source, cache, maxWorkers=4, requestsPerSecond=10000)
+
+    prefetcher = [None]
+
+    def emptyCache():
+        prefetcher[0] = createPrefetcher()
+
+    def smallCache():
+        prefetcher[0] = createPrefetcher(50 * StandInServer.TILE_SIZE)
+
+    def prefetch():
+        prefetcher[0].prefetch(50.0826, 8.2493, 5.0)
+
+    try:
+        results = {'tiles.prefetch_cold': measure(prefetch, arguments.runs, emptyCache)}
+        emptyCache()
+        prefetch()
+        results['tiles.prefetch_warm'] = measure(prefetch, arguments.runs)
+        results['tiles.prefetch_evicting'] = measure(prefetch, arguments.runs, smallCache)
+    finally:
+        server.stop()
+
+    return results
+
+def getCommit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIRECTORY, stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+def compare(oldFileName, newFileName):
+    '''
+    Prints the median of every benchmark of both runs and marks the ones that got slower by more than REGRESSION_THRESHOLD. Returns 1 if there is a regression.
+    '''
+
+    with open(oldFileName, 'r') as oldFile:
+        old = json.load(oldFile)
+    with open(newFileName, 'r') as newFile:
+        new = json.load(newFile)
+
+    hasRegression = False
+    print(f'{"benchmark":32} {str(old.get("commit")):>12} {str(new.get("commit")):>12}   ratio')
+    for name in sorted(set(old.get('results', {})) | set(new.get('results', {}))):
+        oldResult = old.get('results', {}).get(name)
+        newResult = new.get('results', {}).get(name)
+        if oldResult is None or newResult is None:
+            print(f'{name:32} {"-" if oldResult is None else format(oldResult["median"], ".3f"):>12} {"-" if newResult is None else format(newResult["median"], ".3f"):>12}')
+            continue
+
+        ratio = newResult['median'] / oldResult['median'] if oldResult['median'] > 0 else float('inf')
+        isRegression = ratio > REGRESSION_THRESHOLD
+        hasRegression = hasRegression or isRegression
+        print(f'{name:32} {oldResult["median"]:12.3f} {newResult["median"]:12.3f} {ratio:7.2f}{"  slower" if isRegression else ""}')
+
+    return 1 if hasRegression else 0
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmarks for the Tankerkoenig app.')
+    parser.add_argument('--stations', type=int, default=200, help='amount of synthetic stations per list response')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds every stand-in response is delayed')
+    parser.add_argument('--failure-rate', type=float, default=0.2, help='share of failing requests for the failure benchmark')
+    parser.add_argument('--payload', help='recorded list.php response that is replayed instead of synthetic stations')
+    parser.add_argument('--runs', type=int, default=20, help='amount of runs per benchmark')
+    parser.add_argument('--output', help='file the results are saved to, defaults to benchmarks/results/<commit>.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compares two result files instead of running the benchmarks')
+    parser.add_argument('--skip-api', action='store_true', help='skips the benchmarks against the StandInServer')
+    arguments = parser.parse_args()
+
+    if arguments.compare is not None:
+        return compare(*arguments.compare)
+
+    results = {}
+    previousDirectory = os.getcwd()
+    with tempfile.TemporaryDirectory() as workingDirectory:
+        os.chdir(workingDirectory)
+        try:
+            results.update(benchmarkSettingsService(arguments))
+            results.update(benchmarkMapProcessing(arguments))
+            if not arguments.skip_api:
+                results.update(benchmarkApiCaller(arguments, workingDirectory))
+                results.update(benchmarkTilePrefetcher(arguments, workingDirectory))
+        finally:
+            os.chdir(previousDirectory)
+
+    commit = getCommit()
+    report = {
+        'commit': commit,
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {'stations': arguments.stations, 'latency': arguments.latency, 'failureRate': arguments.failure_rate, 'runs': arguments.runs, 'payload': arguments.payload},
+        'results': results
+    }
+
+    output = arguments.output
+    if output is None:
+        output = os.path.join(ROOT_DIRECTORY, 'benchmarks', 'results', (commit or 'unknown') + '.json')
+    directory = os.path.dirname(output)
+    if directory != '':
+        os.makedirs(directory, exist_ok=True)
+    with open(output, 'w') as outputFile:
+        json.dump(report, outputFile, indent=2)
+
+    for name, result in sorted(results.items()):
+        print(f'{name:32} median {result["median"]:10.3f} ms   p95 {result["p95"]:10.3f} ms')
+    print(f'The results have been saved to {output}')
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
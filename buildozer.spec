@@ -6,10 +6,10 @@ package.name = Tankerkoenig
 package.domain = gsog.eigeneDomain
 
 source.dir = .
-source.include_exts = py,png,jpg,kv,atlas
+source.include_exts = py,png,jpg,kv,atlas,bin
 
 version = 0.1
-requirements = python3,kivy,kivymd,kivy_garden.mapview,requests,geopy,geocoder,ratelim,decorator,click,future,six
+requirements = python3,sqlite3,kivy,kivymd,kivy_garden.mapview,requests,certifi,geopy,geocoder,ratelim,decorator,click,future,six
 
 orientation = portrait
 fullscreen = 0
@@ -18,6 +18,9 @@ android.permissions = INTERNET
 
 icon.filename = %(source.dir)s/images/tankericon.png
 
+# Creates the postal code table data/plz_centroids.bin before the APK is built, see BuildHooks.py
+p4a.hook = BuildHooks.py
+
 # iOS specific
 ios.kivy_ios_url = https://github.com/kivy/kivy-ios
 ios.kivy_ios_branch = main
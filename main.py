@@ -1,22 +1,103 @@
+from StartupProfiler import StartupProfiler
 from kivymd.app import MDApp
 from kivy.uix.floatlayout import FloatLayout
 from kivy.uix.boxlayout import BoxLayout
-from kivymd.uix.menu import MDDropdownMenu
 from kivy.uix.label import Label
 from kivy.lang import Builder
-from kivy_garden.mapview import MapView, MapMarkerPopup
+from kivy_garden.mapview import MapView, MapMarkerPopup, MapSource
 from kivymd.uix.bottomnavigation.bottomnavigation import MDBottomNavigation, MDBottomNavigationItem
-from kivymd.uix.label import MDLabel
-from kivymd.uix.datatables import MDDataTable
 from kivy.uix.anchorlayout import AnchorLayout
 from kivy.core.window import Window
-from kivy.metrics import dp
-from kivy.properties import NumericProperty, StringProperty
-import ssl
-from ApiCaller import ApiCaller
+from kivy.clock import Clock
+from kivy.properties import BooleanProperty, NumericProperty, StringProperty
 from SettingsService import SettingsService
-from geopy.geocoders import Nominatim
-import geocoder
+from BackgroundLoader import BackgroundLoader
+from StationClusterer import StationClusterer
+from RefreshScheduler import RefreshScheduler
+from Metrics import Metrics
+from collections import deque
+import math
+import os
+import time
+
+StartupProfiler.mark('imports')
+
+class StationMarker(MapMarkerPopup):
+    '''
+    Author: Marian Neff
+    -------------------
+    The StationMarker is a MapMarkerPopup for a single petrol station. The label of its popup is only created once the marker gets tapped for the first time, so that markers which are never opened stay cheap.
+    Markers can be reused for other stations, the popup text is simply replaced.
+    -------------------
+    '''
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.popup_size = 100, 100
+        self.__popupText = ''
+        self.__label = None
+
+    def setPopupText(self, text):
+        '''
+        Sets the text that is shown in the popup of the marker.
+        -------------------
+        Parameters:
+            text: string
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        self.__popupText = text
+        if self.__label is not None:
+            self.__label.text = text
+
+    def on_release(self, *args):
+        if self.__label is None:
+            self.__label = Label(text=self.__popupText)
+            self.__label.font_size = 32
+            self.__label.color = 1,0.64,0,1
+            self.__label.outline_color = 0,0,0,1
+            self.__label.outline_width = 4
+            self.add_widget(self.__label)
+
+        super().on_release(*args)
+
+class ClusterMarker(StationMarker):
+    '''
+    Author: Marian Neff
+    -------------------
+    The ClusterMarker represents several petrol stations that are too close to each other to be shown separately at the current zoom level.
+    It shows the amount of stations on top of its icon, its popup lists the cheapest price of the cluster.
+    -------------------
+    '''
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.__countLabel = Label(font_size=14, bold=True)
+        self.__countLabel.outline_color = 0,0,0,1
+        self.__countLabel.outline_width = 2
+        self.bind(pos=self.__placeCountLabel, size=self.__placeCountLabel)
+        super(MapMarkerPopup, self).add_widget(self.__countLabel)
+
+    def setCount(self, count):
+        '''
+        Sets the amount of stations that is shown on the marker.
+        -------------------
+        Parameters:
+            count: integer
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        self.__countLabel.text = str(count)
+
+    def __placeCountLabel(self, *args):
+        self.__countLabel.size = self.size
+        self.__countLabel.pos = self.pos
 
 class MapViewTanker(FloatLayout):
     '''
@@ -25,12 +106,25 @@ class MapViewTanker(FloatLayout):
     The MapViewTanker class uses the MapView class from kivy_garden.mapview to provide the different map capabilities of the application.
     The main purpose is to display an OpenStreetMap and fill it with different markers for petrol stations around the user's location.
     The MapView gets arranged into a FloatLayout to allow easy control of the map space. It can be dynamically updated whenever the settings change.
+    The data for the map comes from the RefreshScheduler, which refreshes it periodically and whenever the settings change. The loading property is set while a refresh is running.
+    At the start, the map shows the saved data of the last session right away. The stale property is set as long as the shown prices are such saved ones.
+    Nearby stations are combined into clusters depending on the zoom level and only the markers within the visible area are created.
+    New markers are added progressively: every frame only gets markerFrameBudget milliseconds for them, the closest stations first or the cheapest ones if markerOrder is "price". A newer dataset or a move of the map cancels the markers that are still pending.
+    The MapView takes its tiles from the TileCache of the TilePrefetcher, which downloads the tiles of the search circle ahead of time whenever the location or the radius changes. The tiles the MapView downloads itself while the map is moved are trimmed to the size of the cache TILE_CACHE_TRIM_DELAY seconds after the last move.
     -------------------
     '''  
 
     lat = NumericProperty()
     lon = NumericProperty()
     zoom = NumericProperty()
+    loading = BooleanProperty(False)
+    stale = BooleanProperty(False)
+    staleSince = StringProperty('')
+    markerFrameBudget = NumericProperty(8)
+    markerOrder = StringProperty('dist')
+
+    MARKER_POOL_SIZE = 200
+    TILE_CACHE_TRIM_DELAY = 30
 
     def __init__(self, **kwargs):
         '''
@@ -44,147 +138,251 @@ class MapViewTanker(FloatLayout):
         -------------------
         '''
 
-        ssl._create_default_https_context = ssl._create_stdlib_context
         super().__init__(**kwargs)
         self.__map = self.ids.tankerMap
         self.zoom = 15
-        self.__markerList = []
-
-        self.updateMap()
-
-    def __generateMarkersForData(self, data):
+        self.__markers = {}
+        self.__markerPools = {}
+        self.__dataset = None
+        self.__center = None
+        self.__prefetchedArea = None
+        self.__pendingMarkers = deque()
+        self.__renderEvent = None
+        self.__renderStartedAt = 0.0
+        self.__clusterer = StationClusterer()
+        from TilePrefetcher import TilePrefetcher
+
+        tileSource = TilePrefetcher.shared().source
+        self.__map.cache_dir = TilePrefetcher.shared().cache.directory
+        self.__map.map_source = MapSource(url=tileSource.url, cache_key=tileSource.cacheKey, image_ext=tileSource.imageExt, min_zoom=tileSource.minZoom, max_zoom=tileSource.maxZoom)
+        self.__visibleMarkersTrigger = Clock.create_trigger(self.__showVisibleMarkers, 0.1)
+        self.__tileCacheTrigger = Clock.create_trigger(self.__trimTileCache, self.TILE_CACHE_TRIM_DELAY)
+        self.__map.bind(on_map_relocated=lambda *args: self.__onMapRelocated())
+        RefreshScheduler.shared().subscribe(self.__applyMapData, self.__onLoadStarted, self.__onLoadError)
+
+        RefreshScheduler.shared().requestRefresh('start')
+
+    def __onMapRelocated(self):
+        self.__visibleMarkersTrigger()
+        self.__tileCacheTrigger()
+
+    def __trimTileCache(self, *args):
+        from TilePrefetcher import TilePrefetcher
+
+        BackgroundLoader.shared().submit('tileCache', TilePrefetcher.shared().cache.trim)
+
+    def __generateMarkersForData(self, dataset):
         '''
-        Uses the provided dataset to generate according MapMarkerPopups on the MapView element. 
+        Uses the provided dataset to generate according markers on the MapView element. 
         This will be visible in the UI so that the user can see where each station is and what the prices are like.
+        The stations are handed to the clusterer, only the markers within the visible area are created.
         -------------------
         Parameters:
-            data: dictionary
+            dataset: StationDataset
         -------------------
         Returns:
             void
         -------------------
         '''
-        self.__resetMarkerDisplay()
+        self.__dataset = dataset
+        self.__clusterer.setDataset(dataset)
+        self.__showVisibleMarkers()
 
-        for dataSet in data.get('stations'):
-            stationLat = dataSet.get('lat')
-            stationLon = dataSet.get('lng')
-            title = dataSet.get('brand')
-            price = dataSet.get('price')
-            if price is None:
-                price = 0.0
-            street = dataSet.get('street') + " " + str(dataSet.get('houseNumber'))
-            location = str(dataSet.get('postCode')) + " " + dataSet.get('place')
+    def __showVisibleMarkers(self, *args):
+        '''
+        Shows a marker for every station or cluster of stations within the visible area of the map. It is called again whenever the map is moved or zoomed.
+        The markers are matched to the previously shown ones by the station id or cluster: known markers stay on the map and only get a new icon and popup text, markers that are no longer needed are returned to the pool.
+        The missing markers are only queued in the order of markerOrder and added by __addPendingMarkers over the next frames. Markers of an earlier call that are still pending are dropped.
+        -------------------
+        Parameters:
+            None
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+        self.__cancelPendingMarkers()
+        dataset = self.__dataset
+        previousMarkers = self.__markers
+        self.__markers = {}
+
+        for cluster in self.__getOrderedClusters(dataset):
+            (key, markerClass, markerSource, text) = self.__describeCluster(dataset, cluster)
+            marker = previousMarkers.pop(key, None)
+            if marker is not None and (marker.lat != cluster.lat or marker.lon != cluster.lon):
+                self.__releaseMarker(marker)
+                marker = None
+
+            if marker is None:
+                self.__pendingMarkers.append((dataset, cluster))
+                continue
 
-            address = street
-            address += "\n" + location
-            address += "\n" + title
-            address += "\n" + str(price) + "€"
+            if marker.source != markerSource:
+                marker.source = markerSource
+            marker.setPopupText(text)
+            if markerClass is ClusterMarker:
+                marker.setCount(cluster.count)
+            self.__markers[key] = marker
 
-            markerSource = self.__getMarkerSourceForPrice(price)
-            marker = MapMarkerPopup(lat=stationLat, lon=stationLon, source=markerSource)
+        for marker in previousMarkers.values():
+            self.__releaseMarker(marker)
 
-            label = Label(text=address)
-            label.font_size = 32
-            label.color = 1,0.64,0,1   
-            label.outline_color = 0,0,0,1
-            label.outline_width = 4
-            marker.popup_size = 100, 100
-            marker.add_widget(label)
+        Metrics.increment('marker_updates')
+        Metrics.increment('markers_released', len(previousMarkers))
+        if self.__pendingMarkers:
+            self.__renderStartedAt = time.perf_counter()
+            self.__renderEvent = Clock.schedule_interval(self.__addPendingMarkers, 0)
 
-            self.__markerList.append(marker)
+    def __addPendingMarkers(self, dt):
+        '''
+        Adds the queued markers to the map until markerFrameBudget milliseconds of the frame are used up, at least one per frame. It is called every frame until the queue is empty.
+        -------------------
+        Parameters:
+            dt: float, seconds since the last frame
+        -------------------
+        Returns:
+            False once every marker has been added, which stops the calls
+        -------------------
+        '''
+        deadline = time.perf_counter() + self.markerFrameBudget / 1000
+        added = 0
+        while self.__pendingMarkers:
+            (dataset, cluster) = self.__pendingMarkers.popleft()
+            (key, markerClass, markerSource, text) = self.__describeCluster(dataset, cluster)
+            marker = self.__acquireMarker(markerClass)
+            marker.lat = cluster.lat
+            marker.lon = cluster.lon
+            marker.source = markerSource
+            marker.setPopupText(text)
+            if markerClass is ClusterMarker:
+                marker.setCount(cluster.count)
             self.__map.add_marker(marker)
-    
-    def __resetMarkerDisplay(self):
+            self.__markers[key] = marker
+            added += 1
+            if time.perf_counter() >= deadline:
+                break
+
+        Metrics.observe('marker_batch_size', added)
+        if self.__pendingMarkers:
+            return True
+
+        Metrics.observe('marker_render_duration_ms', (time.perf_counter() - self.__renderStartedAt) * 1000)
+        self.__renderEvent = None
+
+        return False
+
+    def __cancelPendingMarkers(self):
+        '''
+        Stops adding the queued markers and drops them. The markers that have already been added stay on the map.
         '''
-        Resets all the markers displayed on the map to allow updates to the map.
+        if self.__renderEvent is not None:
+            self.__renderEvent.cancel()
+            self.__renderEvent = None
+            Metrics.increment('marker_renders_cancelled')
+        self.__pendingMarkers.clear()
+
+    def __getOrderedClusters(self, dataset):
+        '''
+        Returns the clusters within the visible area in the order of markerOrder: by the distance of the closest station or by the cheapest price. Clusters without a price or distance come last.
         -------------------
         Parameters:
-            None
+            dataset: StationDataset
         -------------------
         Returns:
-            void
+            list of StationClusters
         -------------------
         '''
-                
-        if self.__markerList == []:
-            return
-        
-        for marker in self.__markerList:
-            self.__map.remove_marker(marker)
-        
-        self.__markerList = []
+        clusters = self.__clusterer.getClusters(self.__map.zoom, self.__map.get_bbox())
+        if self.markerOrder == 'price':
+            clusters.sort(key=lambda cluster: cluster.cheapestPrice if cluster.cheapestPrice is not None else math.inf)
+        else:
+            clusters.sort(key=lambda cluster: min((dataset.dist[index] for index in cluster.indices if not math.isnan(dataset.dist[index])), default=math.inf))
 
-    def __getMarkerSourceForPrice(self, price):
+        return clusters
+
+    def __describeCluster(self, dataset, cluster):
         '''
-        Checks the provided price to see if it is a bad, mediocre or good price compared to the highest and lowest price of the queried dataset.
-        Stations with prices equal to the best price are marked in green.
-        Stations with prices within 20% of the best prices are marked in yellow.
-        Any other station is marked in red.
+        Returns the key, the marker class, the icon and the popup text of the marker for a single station or a cluster of stations.
         -------------------
         Parameters:
-            price: float
+            dataset: StationDataset
+            cluster: StationCluster
         -------------------
         Returns:
-            string
+            tupel, (key, markerClass, markerSource, text)
         -------------------
         '''
-            
-        if (self.__lowestPrice == price):
-            return 'images/green32.png'
-        
-        if (self.__lowestPrice * 1.02 >= price):
-            return 'images/yellow32.png'
-        
-        return 'images/red32.png'
+        if cluster.count == 1:
+            index = cluster.indices[0]
+
+            return (dataset.getText('id', index), StationMarker, dataset.getMarkerSource(index), self.__getStationText(dataset, index))
+
+        price = cluster.cheapestPrice if cluster.cheapestPrice is not None else 0.0
+        text = str(cluster.count) + " Tankstellen\nab " + str(price) + "€"
 
-    def __setLowestPrice(self, data):
+        return (cluster.key, ClusterMarker, dataset.getMarkerSourceForPrice(cluster.cheapestPrice), text)
+
+    def __acquireMarker(self, markerClass):
         '''
-        Sets the lowest price based off of the dataset.
+        Returns an unused marker of the provided class from the pool or creates a new one if the pool is empty.
         -------------------
         Parameters:
-            data: dictionary
+            markerClass: StationMarker or ClusterMarker
         -------------------
         Returns:
-            void
+            StationMarker
         -------------------
         '''
 
-        self.__lowestPrice = 5
-        for dataSet in data.get('stations'):
-            price = dataSet.get('price')
-            if price is None:
-                continue
+        pool = self.__markerPools.setdefault(markerClass, [])
+        if pool:
+            return pool.pop()
 
-            if (price) < self.__lowestPrice:
-                self.__lowestPrice = price
+        return markerClass()
 
-    def __updateDataIfTypeAll(self, data):
+    def __releaseMarker(self, marker):
         '''
-        This function updates the dataset from the queried API if the type is set to "all".
-        The setting "all" returns the price for all different fuel types per station, which then get filtered to choose the cheapest one when displaying the prices.
+        Removes the marker from the map and keeps it in the pool for later updates, as long as the pool is not full.
         -------------------
         Parameters:
-            data: Dictionary
+            marker: StationMarker
         -------------------
         Returns:
-            Dictionary
+            void
         -------------------
         '''
-        key = 0
-        for dataSet in data.get('stations'):
-            dataPrices = {'diesel': dataSet.get('diesel'), 'e5': dataSet.get('e5'), 'e10': dataSet.get('e10')}
-            minPrice = min(dataPrices.values())
-            data.get('stations')[key]['price'] = minPrice
-            key += 1
 
-        return data
-            
+        marker.is_open = False
+        self.__map.remove_marker(marker)
+        pool = self.__markerPools.setdefault(type(marker), [])
+        if len(pool) < self.MARKER_POOL_SIZE:
+            pool.append(marker)
+
+    def __getStationText(self, dataset, index):
+        '''
+        Puts together the address, the brand and the price of a station for its popup.
+        -------------------
+        Parameters:
+            dataset: StationDataset
+            index: integer
+        -------------------
+        Returns:
+            string
+        -------------------
+        '''
+
+        price = dataset.getPrice(index)
+        if price is None:
+            price = 0.0
+        street = str(dataset.getText('street', index)) + " " + str(dataset.getText('houseNumber', index))
+        location = str(dataset.getText('postCode', index)) + " " + str(dataset.getText('place', index))
+
+        return "\n".join((street, location, str(dataset.getText('brand', index)), str(price) + "€"))
+
     def updateMap(self):
         '''
         This function dynamically updates the map markers with a fresh API call based on newer location and user settings and can be used freely after initialisation.
-        In case the desired fuel type is "all", a special function is used to determine the cheapest fuel per station.
-        It calls all the other functions for selecting and generating the correct markers.
+        The refresh is requested from the RefreshScheduler, which shares it with the table. Once the data arrives, the markers are generated on the main thread.
         -------------------
         Parameters:
             None
@@ -193,66 +391,210 @@ class MapViewTanker(FloatLayout):
             void
         -------------------
         '''
-        settingsService = SettingsService()
-        (lat, lon) = settingsService.loadLocationSettings()
-        self.__map.center_on(lat, lon)
-        settings = settingsService.loadSettings()
-        apiCaller = ApiCaller(settingsService)
-        data = apiCaller.getQueriedTankerData()
-        if ('all' == settings.get('type')):
-            data = self.__updateDataIfTypeAll(data)
+        RefreshScheduler.shared().requestRefresh('manual')
+
+    def __onLoadStarted(self):
+        self.loading = True
+
+    def __applyMapData(self, result):
+        '''
+        Centers the map on the loaded location and calls all the other functions for selecting and generating the correct markers.
+        The map is only centered again if the location has changed, so periodic refreshes do not move the map away from where the user has moved it.
+        -------------------
+        Parameters:
+            result: tupel, (lat, lon, dataset)
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+        (lat, lon, dataset) = result
+        self.stale = dataset.isStale
+        self.staleSince = dataset.getFetchedAtText()
+        with Metrics.span('map.markers', stations=dataset.size), Metrics.timer('marker_build_duration_ms'):
+            if self.__center != (lat, lon):
+                self.__center = (lat, lon)
+                self.__map.center_on(lat, lon)
+            self.__generateMarkersForData(dataset)
+        self.__prefetchTiles(lat, lon)
+        self.loading = False
+
+    def __prefetchTiles(self, lat, lon):
+        '''
+        Lets the TilePrefetcher download the tiles of the search circle in the background, if the location or the radius has changed since the last prefetch.
+        -------------------
+        Parameters:
+            lat: float
+            lon: float
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+        radius = SettingsService().loadSettings().get('radius')
+        if radius is None or self.__prefetchedArea == (lat, lon, radius):
+            return
+
+        from TilePrefetcher import TilePrefetcher
+
+        self.__prefetchedArea = (lat, lon, radius)
+        BackgroundLoader.shared().submit('tiles', lambda: TilePrefetcher.shared().prefetch(lat, lon, radius))
 
-        self.__setLowestPrice(data)
-        self.__generateMarkersForData(data)
+    def __onLoadError(self, error):
+        print(f'An error has occurred while loading the map data, message: {error}')
+        self.loading = False
 
 
 
+class StationRow(BoxLayout):
+    '''
+    Author: Alexander Gajer
+    -------------------
+    The StationRow is a single row of the TableView. The RecycleView of the table only creates rows for the visible part of the table and reuses them while scrolling, it fills them through the properties.
+    -------------------
+    '''
+
+    stationId = StringProperty()
+    stationName = StringProperty()
+    distance = StringProperty()
+    price = StringProperty()
+
 class TableView(AnchorLayout):
     '''
     Author: Alexander Gajer
     -------------------
     The TableView extends the AnchorLayout to allow easy positioning to the different cardinal directions. It provides the table widget that allows the user to display all the different petrol station data.
+    The table is a RecycleView, so only the visible rows are created as widgets. It can be sorted by distance or price without another API call.
+    The data for the table comes from the RefreshScheduler, which shares every refresh with the map. The rows are built in the background, the loading property is set while a refresh is running. The stale property is set while the table shows the saved data of the last session.
     -------------------
     ''' 
 
+    loading = BooleanProperty(False)
+    stale = BooleanProperty(False)
+    staleSince = StringProperty('')
+    sortKey = StringProperty('dist')
+
     def __init__(self, **kwargs):
         '''
-        Initializes the TableView and fills it with queried data from the Tankerkoenig API. It uses the settings from the SettingsService to determine which data to query for when calling the API.
+        Initializes the TableView and subscribes it to the RefreshScheduler. If the map has already loaded data, the table shows it right away.
         The TableView displays rows for the name, distance and price of each petrol station.
         -------------------
         Parameters:
-            price: float
+            none
         -------------------
         Returns:
-            string
+            void
         -------------------
         '''
                 
         super().__init__(**kwargs)
 
-        settingsService = SettingsService()
-        apiCaller = ApiCaller(settingsService)
-        data = apiCaller.getQueriedTankerData()
-        stationData = data['stations']
+        self.__rows = []
+        RefreshScheduler.shared().subscribe(self.__onDataLoaded, self.__onLoadStarted, self.__onLoadError)
 
-        row_data = [
-            (station['name'], station['dist'], station.get('price', station.get('diesel')))
-            for station in stationData
-        ]
+    def updateTable(self):
+        '''
+        Requests a refresh of the data from the RefreshScheduler. It uses the settings from the SettingsService to determine which data to query for when calling the API.
+        Requests of the table and the map that arrive close together share a single API call.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        RefreshScheduler.shared().requestRefresh('manual')
+
+    def sortBy(self, sortKey):
+        '''
+        Sorts the rows of the table by the provided column. Stations without a price are listed last.
+        -------------------
+        Parameters:
+            sortKey: string, ["dist", "price"]
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        self.sortKey = sortKey
+        self.__showRows()
+
+    def __onLoadStarted(self):
+        self.loading = True
+
+    def __onDataLoaded(self, result):
+        (lat, lon, dataset) = result
+        self.loading = True
+        self.stale = dataset.isStale
+        self.staleSince = dataset.getFetchedAtText()
+        BackgroundLoader.shared().submit('table', lambda: self.__buildRows(dataset), self.__applyTableData, self.__onLoadError)
+
+    def __buildRows(self, dataset):
+        '''
+        Builds the rows for the table from the dataset. This runs on a worker thread of the BackgroundLoader.
+        -------------------
+        Parameters:
+            dataset: StationDataset
+        -------------------
+        Returns:
+            list of tupels, (dist, price, row)
+        -------------------
+        '''
+
+        rows = []
+        for index in range(dataset.size):
+            price = dataset.getPrice(index)
+            row = {
+                'stationId': str(dataset.getText('id', index)),
+                'stationName': str(dataset.getText('name', index)),
+                'distance': format(dataset.dist[index], '.1f') + ' km',
+                'price': format(price, '.3f') + ' €' if price is not None else '-'
+            }
+            rows.append((dataset.dist[index], price if price is not None else float('inf'), row))
+
+        return rows
+
+    def __applyTableData(self, rows):
+        with Metrics.timer('table_build_duration_ms'):
+            self.__rows = rows
+            self.__showRows()
+        self.loading = False
+
+    def __onLoadError(self, error):
+        print(f'An error has occurred while loading the table data, message: {error}')
+        self.loading = False
+
+    def __showRows(self):
+        '''
+        Hands the sorted rows to the RecycleView. If the table still shows the same stations in the same order, only the rows that changed are replaced, so the visible rows are not rebuilt.
+        -------------------
+        Parameters:
+            none
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        sortIndex = 1 if self.sortKey == 'price' else 0
+        rows = [row for (dist, price, row) in sorted(self.__rows, key=lambda entry: (entry[sortIndex], entry[0]))]
+        table = self.ids.stationTable
+        currentRows = table.data
 
-        self.data_tables = MDDataTable(
-            size_hint = (0.95, 0.8),
-            elevation = 2,
-            rows_num = len(row_data),
-            column_data = [
-                ("Name", dp(70)),
-                ("Distanz", dp(30)),
-                ("Preis", dp(30))
-            ],
-            row_data = row_data
+        isSameOrder = len(currentRows) == len(rows) and all(
+            currentRow.get('stationId') == row.get('stationId') for (currentRow, row) in zip(currentRows, rows)
         )
+        if not isSameOrder:
+            table.data = rows
+
+            return
 
-        self.add_widget(self.data_tables)
+        for index, row in enumerate(rows):
+            if currentRows[index] != row:
+                currentRows[index] = row
 
 class SettingsLayout(BoxLayout):
     '''
@@ -267,6 +609,8 @@ class SettingsLayout(BoxLayout):
         self.__type = 'e5'
 
     def typeDropdown(self):
+        from kivymd.uix.menu import MDDropdownMenu
+
         self.menu_list = [
             {
                 "viewclass": "OneLineListItem",
@@ -296,6 +640,8 @@ class SettingsLayout(BoxLayout):
         self.menu.open()
 
     def radiusDropdown(self):
+        from kivymd.uix.menu import MDDropdownMenu
+
         self.menu_list = [
             {
                 "viewclass": "OneLineListItem",
@@ -336,19 +682,50 @@ class SettingsLayout(BoxLayout):
     
     def saveSettings(self):
         location = self.ids.plzInput.text
+        radius = self.__radius
+        type = self.__type
+
+        self.ids.saveSettings.disabled = True
+        BackgroundLoader.shared().submit('settings', lambda: self.__persistSettings(location, radius, type), self.__onSettingsSaved, self.__onSettingsError)
+
+    def __persistSettings(self, location, radius, type):
+        '''
+        Saves the settings and resolves the entered postal code into coordinates through the PostalCodeLookup. This runs on a worker thread of the BackgroundLoader, because locations that are not in the postal code table need network access.
+        -------------------
+        Parameters:
+            location: string
+            radius: float
+            type: string
+        -------------------
+        Returns:
+            void
+        -------------------
+        Raises:
+            ValueError
+        -------------------
+        '''
+
+        from PostalCodeLookup import PostalCodeLookup
 
         settingsService = SettingsService()
-        settingsService.saveSettings(self.__radius, self.__type)
+        settingsService.saveSettings(radius, type)
 
         if (location != ''):
-            loc = Nominatim(user_agent="Geopy Library")
-            getLoc = loc.geocode(location)
-            settingsService.saveLocationSettings(getLoc.latitude, getLoc.longitude)
+            coordinates = PostalCodeLookup.shared().lookup(location)
+            if coordinates is None:
+                raise ValueError('The location "' + location + '" could not be found.')
+
+            settingsService.saveLocationSettings(*coordinates)
         else:
-            g = geocoder.ip('me')
-            settingsService.saveLocationSettings(g.latlng[0], g.latlng[1])
+            (locatedAt, (lat, lon)) = settingsService.getIpLocation()
+            settingsService.saveLocationSettings(lat, lon, locatedAt)
 
-        MDApp.get_running_app().root.first_widget.children[0].updateMap()
+    def __onSettingsSaved(self, result):
+        self.ids.saveSettings.disabled = False
+
+    def __onSettingsError(self, error):
+        print(f'An error has occured while saving the settings, message: {error}')
+        self.ids.saveSettings.disabled = False
                 
 class TankerApp(MDApp):
     '''
@@ -356,12 +733,16 @@ class TankerApp(MDApp):
     -------------------
     The TankerApp extends the MDApp and is the main application used to display all the different functionalities.
     It loads the navigation, table view, map view and settings layout so that the user has access to these types of displays.
+    Only the map is built at the start, the settings and the table are built once their tab is selected for the first time. The durations of the start are printed once the first frame has been drawn.
+    Every frame that takes longer than FRAME_STALL_THRESHOLD milliseconds is counted as stall in the Metrics. If the environment variable TANKER_METRICS_PORT is set, the Metrics are served on that local port.
     -------------------
     ''' 
 
+    FRAME_STALL_THRESHOLD = 50
+
     def build(self):
         '''
-        Builds all the different UI elements needed for the application. The different views get created and are then loaded into the Bottom Navigation to allow easy cycling.
+        Builds all the different UI elements needed for the application. The map view gets created right away, the other views get created when their tab is pressed for the first time. They are loaded into the Bottom Navigation to allow easy cycling.
         -------------------
         Parameters:
             none
@@ -373,32 +754,112 @@ class TankerApp(MDApp):
 
         Builder.load_file("map.kv")
 
+        self.mapView = None
+        self.tableView = None
+        self.__builtTabs = set()
+
         nav_items_config = [
             {
                 'name': 'map_screen',
                 'icon': 'map',
-                'widget': MapViewTanker(),
+                'factory': self.__buildMapView,
             },
             {
                 'name': 'home_screen',
                 'icon': 'home',
-                'widget': SettingsLayout(),
+                'factory': SettingsLayout,
             },
             { 
                 'name': 'table_screen',
                 'icon': 'table',
-                'widget': TableView(), 
+                'factory': self.__buildTableView, 
             }
         ]
 
         layout = MDBottomNavigation()
 
-        for nav_item in nav_items_config:
+        for index, nav_item in enumerate(nav_items_config):
             item = MDBottomNavigationItem(name=nav_item['name'], icon=nav_item['icon'])
-            item.add_widget(nav_item['widget'])
+            if index == 0:
+                item.add_widget(StartupProfiler.measure('build ' + nav_item['name'], nav_item['factory']))
+            else:
+                item.bind(on_tab_press=lambda item, factory=nav_item['factory']: self.__buildTabContent(item, factory))
             layout.add_widget(item)
 
+        StartupProfiler.mark('build')
+        Clock.schedule_once(self.__onFirstFrame)
+
+        port = os.environ.get('TANKER_METRICS_PORT')
+        if port:
+            try:
+                Metrics.startServer(int(port))
+            except (OSError, ValueError) as error:
+                print(f'The metrics endpoint could not be started, message: {error}')
+
         return layout
+
+    def __buildMapView(self):
+        self.mapView = MapViewTanker()
+
+        return self.mapView
+
+    def __buildTableView(self):
+        self.tableView = TableView()
+
+        return self.tableView
+
+    def __buildTabContent(self, item, factory):
+        '''
+        Builds the view of the tab the first time it is pressed.
+        -------------------
+        Parameters:
+            item: MDBottomNavigationItem
+            factory: function without parameters that returns the view
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        if item.name in self.__builtTabs:
+            return
+
+        self.__builtTabs.add(item.name)
+        item.add_widget(StartupProfiler.measure('build ' + item.name, factory))
+
+    def on_pause(self):
+        '''
+        Stops the periodic refresh while the app is in the background. Returning True keeps the app alive on Android.
+        '''
+
+        RefreshScheduler.shared().setForeground(False)
+
+        return True
+
+    def on_resume(self):
+        RefreshScheduler.shared().setForeground(True)
+
+    def __onFirstFrame(self, dt):
+        StartupProfiler.mark('first frame')
+        StartupProfiler.report()
+        Clock.schedule_interval(self.__onFrame, 0)
+
+    def __onFrame(self, dt):
+        '''
+        Records the duration of the last frame and counts it as stall if it exceeds FRAME_STALL_THRESHOLD.
+        -------------------
+        Parameters:
+            dt: float, seconds since the last frame
+        -------------------
+        Returns:
+            void
+        -------------------
+        '''
+
+        frameTime = dt * 1000
+        Metrics.observe('frame_time_ms', frameTime)
+        if frameTime > self.FRAME_STALL_THRESHOLD:
+            Metrics.increment('frame_stalls')
     
 if __name__ == '__main__':
     TankerApp().run()
@@ -0,0 +1,219 @@
+'''
+Author: Marian Neff
+-------------------
+Headless command line interface for price queries without the Kivy GUI, for example for cron jobs and scripts on servers. Nothing of Kivy is imported, the ApiCaller and the StationDataset are only imported once the first query is sent.
+Every input line is either a coordinate pair like "50.08,8.24" or "50.08 8.24", or a postal code or place name, which is resolved through the PostalCodeLookup. Empty lines and lines starting with # are skipped.
+The queries run concurrently under a shared rate limit. The stations of every query are written to stdout as soon as the query is answered, as NDJSON or CSV, so the order of the queries is not kept. Messages of the services are moved to stderr, so stdout only holds the results.
+
+Usage:
+    python -m tanker query [--input queries.txt] [--radius 5] [--type all] [--format ndjson] [--workers 4] [--rate 1.0]
+    echo "65183" | python -m tanker query --format csv
+-------------------
+'''
+
+import argparse
+import contextlib
+import csv
+import json
+import sys
+
+FIELDS = ('input', 'queryLat', 'queryLng', 'radius', 'type', 'id', 'name', 'brand', 'street', 'houseNumber', 'postCode', 'place', 'lat', 'lng', 'dist', 'price', 'tier', 'error')
+TIERS = ('green', 'yellow', 'red')
+
+def readQueries(lines):
+    '''
+    Yields the non-empty input lines without comments. The lines are read lazily, so queries can start before the whole input has arrived.
+    '''
+
+    for line in lines:
+        line = line.strip()
+        if line != '' and not line.startswith('#'):
+            yield line
+
+def parseCoordinates(text):
+    '''
+    Returns the coordinates of a line like "50.08,8.24", "50.08;8.24" or "50.08 8.24", or None if the line is not a coordinate pair.
+    '''
+
+    parts = text.replace(',', ' ').replace(';', ' ').split()
+    if len(parts) != 2:
+        return None
+
+    try:
+        (lat, lng) = (float(parts[0]), float(parts[1]))
+    except ValueError:
+        return None
+
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+
+    return (lat, lng)
+
+def query(text, radius, type, rateLimiter):
+    '''
+    Resolves the input line into coordinates, queries the stations around them and returns one record per station.
+    This runs on a worker thread. Failures are returned as a single record with an error instead of being raised.
+    -------------------
+    Parameters:
+        text: string, input line
+        radius: float
+        type: string, ["e5", "e10", "diesel", "all"]
+        rateLimiter: RateLimiter
+    -------------------
+    Returns:
+        list of dictionaries
+    -------------------
+    '''
+
+    from ApiCaller import ApiCaller
+    from SettingsService import SettingsService
+    from StationDataset import StationDataset
+
+    record = {'input': text, 'radius': radius, 'type': type}
+    coordinates = parseCoordinates(text)
+    if coordinates is None:
+        from PostalCodeLookup import PostalCodeLookup
+
+        try:
+            coordinates = PostalCodeLookup.shared().lookup(text)
+        except Exception as error:
+            return [dict(record, error='The location could not be resolved, message: ' + str(error))]
+
+        if coordinates is None:
+            return [dict(record, error='The location could not be found.')]
+
+    (lat, lng) = coordinates
+    record.update(queryLat=lat, queryLng=lng)
+    rateLimiter.acquire()
+    apiCaller = ApiCaller(SettingsService())
+    data = apiCaller.getTankerDataAround(lat, lng, radius, type)
+    if apiCaller.getLastSource() in ('last_known', 'none'):
+        error = 'The API could not be reached.'
+        if apiCaller.getLastSource() == 'none':
+            return [dict(record, error=error)]
+        record['error'] = error + ' The prices are outdated.'
+
+    dataset = StationDataset(data, type)
+    records = []
+    for index in range(dataset.size):
+        stationRecord = dict(record)
+        for field in StationDataset.TEXT_FIELDS:
+            stationRecord[field] = dataset.getText(field, index)
+        stationRecord.update(
+            lat=dataset.lat[index],
+            lng=dataset.lng[index],
+            dist=dataset.dist[index],
+            price=dataset.getPrice(index),
+            tier=TIERS[dataset.tier[index]]
+        )
+        records.append(stationRecord)
+
+    return records
+
+def runQueries(lines, radius, type, workers, rate):
+    '''
+    Runs the queries on a pool of worker threads and yields the record lists in the order in which the queries are answered.
+    At most twice the amount of workers queries are pending at the same time, so large inputs are not read into memory at once.
+    -------------------
+    Parameters:
+        lines: iterable of strings
+        radius: float
+        type: string
+        workers: integer
+        rate: float, requests per second
+    -------------------
+    Returns:
+        generator of lists of dictionaries
+    -------------------
+    '''
+
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+    from RateLimiter import RateLimiter
+
+    rateLimiter = RateLimiter(rate)
+    pending = set()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for text in readQueries(lines):
+            pending.add(executor.submit(query, text, radius, type, rateLimiter))
+            if len(pending) >= workers * 2:
+                (done, pending) = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+        while pending:
+            (done, pending) = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+class NdjsonWriter():
+    '''
+    Writes every record as one JSON line.
+    '''
+
+    def __init__(self, output):
+        self.__output = output
+
+    def write(self, records):
+        for record in records:
+            self.__output.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.__output.flush()
+
+class CsvWriter():
+    '''
+    Writes the records as CSV with a header line and the columns of FIELDS.
+    '''
+
+    def __init__(self, output):
+        self.__output = output
+        self.__writer = csv.DictWriter(output, fieldnames=FIELDS, extrasaction='ignore')
+        self.__writer.writeheader()
+
+    def write(self, records):
+        self.__writer.writerows(records)
+        self.__output.flush()
+
+def commandQuery(arguments):
+    from SettingsService import SettingsService
+
+    try:
+        SettingsService().validateSettingParameters(arguments.radius, arguments.type)
+    except Exception as error:
+        print(f'The query parameters are not allowed, message: {error}', file=sys.stderr)
+
+        return 2
+
+    lines = sys.stdin if arguments.input in (None, '-') else open(arguments.input, 'r', encoding='utf-8')
+    writer = (CsvWriter if arguments.format == 'csv' else NdjsonWriter)(sys.stdout)
+    hasErrors = False
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            for records in runQueries(lines, arguments.radius, arguments.type, arguments.workers, arguments.rate):
+                hasErrors = hasErrors or any(record.get('error') for record in records)
+                writer.write(records)
+    except BrokenPipeError:
+        return 0
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+
+    return 1 if hasErrors else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m tanker', description='Headless price queries against the Tankerkoenig API.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    queryParser = commands.add_parser('query', help='queries the stations around coordinates or postal codes')
+    queryParser.add_argument('--input', help='file with one query per line, defaults to stdin')
+    queryParser.add_argument('--radius', type=float, default=5.0, help='search radius in kilometers, 1 - 25')
+    queryParser.add_argument('--type', default='all', help='fuel type: e5, e10, diesel or all')
+    queryParser.add_argument('--format', choices=('ndjson', 'csv'), default='ndjson', help='output format')
+    queryParser.add_argument('--workers', type=int, default=4, help='amount of concurrent queries')
+    queryParser.add_argument('--rate', type=float, default=1.0, help='API requests per second')
+    arguments = parser.parse_args(argv)
+
+    if arguments.command == 'query':
+        return commandQuery(arguments)
+
+    return 2
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ApiExceptions import CircuitOpenError, FatalApiError, RetryableApiError
+from CircuitBreaker import CircuitBreaker
+from RetryPolicy import RetryPolicy
+
+class CircuitBreakerTest(unittest.TestCase):
+    '''
+    Author: Marian Neff
+    -------------------
+    Tests the transitions of the CircuitBreaker between closed, open and half-open.
+    -------------------
+    '''
+
+    def setUp(self):
+        self.breaker = CircuitBreaker(failureThreshold=3, resetTimeout=0.05)
+        self.calls = []
+
+    def fail(self):
+        self.calls.append('fail')
+        raise RetryableApiError('The API responded with status 503.')
+
+    def succeed(self):
+        self.calls.append('succeed')
+
+        return {'ok': True}
+
+    def openCircuit(self):
+        for index in range(self.breaker.failureThreshold):
+            with self.assertRaises(RetryableApiError):
+                self.breaker.call(self.fail)
+
+    def testOpensAfterThresholdAndFailsFast(self):
+        self.openCircuit()
+
+        self.assertEqual(self.breaker.getState(), CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.call(self.succeed)
+        self.assertEqual(self.calls, ['fail'] * 3)
+
+    def testSuccessResetsFailures(self):
+        for index in range(self.breaker.failureThreshold - 1):
+            with self.assertRaises(RetryableApiError):
+                self.breaker.call(self.fail)
+        self.breaker.call(self.succeed)
+        with self.assertRaises(RetryableApiError):
+            self.breaker.call(self.fail)
+
+        self.assertEqual(self.breaker.getState(), CircuitBreaker.CLOSED)
+
+    def testFatalErrorsDoNotCount(self):
+        def reject():
+            raise FatalApiError('The API responded with status 403.')
+
+        for index in range(self.breaker.failureThreshold + 1):
+            with self.assertRaises(FatalApiError):
+                self.breaker.call(reject)
+
+        self.assertEqual(self.breaker.getState(), CircuitBreaker.CLOSED)
+
+    def testHalfOpenTrialClosesCircuit(self):
+        self.openCircuit()
+        time.sleep(0.1)
+
+        states = []
+
+        def trial():
+            states.append(self.breaker.getState())
+            with self.assertRaises(CircuitOpenError):
+                self.breaker.call(self.succeed)
+
+            return self.succeed()
+
+        self.assertEqual(self.breaker.call(trial), {'ok': True})
+        self.assertEqual(states, [CircuitBreaker.HALF_OPEN])
+        self.assertEqual(self.breaker.getState(), CircuitBreaker.CLOSED)
+
+    def testFailedTrialOpensCircuitAgain(self):
+        self.openCircuit()
+        time.sleep(0.1)
+
+        with self.assertRaises(RetryableApiError):
+            self.breaker.call(self.fail)
+
+        self.assertEqual(self.breaker.getState(), CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.call(self.succeed)
+
+    def testEveryRetriedAttemptCounts(self):
+        policy = RetryPolicy(attempts=3, baseDelay=0.0, maxDelay=0.0)
+
+        with self.assertRaises(RetryableApiError):
+            policy.run(lambda: self.breaker.call(self.fail), lambda delay: None)
+
+        self.assertEqual(self.calls, ['fail'] * 3)
+        self.assertEqual(self.breaker.getState(), CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            policy.run(lambda: self.breaker.call(self.succeed), lambda delay: None)
+
+if __name__ == '__main__':
+    unittest.main()
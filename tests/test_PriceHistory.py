@@ -0,0 +1,99 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PriceHistory import PriceHistory
+from StationDataset import StationDataset
+
+class PriceHistoryTest(unittest.TestCase):
+    '''
+    Author: Marian Neff
+    -------------------
+    Tests the PriceHistory with a file in a temporary directory.
+    -------------------
+    '''
+
+    def setUp(self):
+        self.__directory = tempfile.TemporaryDirectory()
+        self.history = PriceHistory(os.path.join(self.__directory.name, 'price_history.bin'), maxStations=8, capacity=16)
+
+    def tearDown(self):
+        self.history.close()
+        self.__directory.cleanup()
+
+    def createDataset(self, count, diesel=1.659):
+        stations = [
+            {'id': 's' + str(index), 'lat': 50.0 + index * 0.001, 'lng': 8.0, 'dist': index * 0.1, 'e5': diesel + 0.1, 'e10': diesel + 0.05, 'diesel': diesel}
+            for index in range(count)
+        ]
+
+        return StationDataset({'ok': True, 'stations': stations}, 'all')
+
+    def testRecordKeepsHistoryOfDatasetLargerThanTable(self):
+        dataset = self.createDataset(12)
+
+        self.assertEqual(self.history.record(dataset, 1000), 8 * 3)
+        self.assertEqual(self.history.record(dataset, 1010), 0)
+        self.assertEqual(self.history.getSeries('s0', 'diesel'), [(1000, 1.659)])
+        self.assertEqual(self.history.getSeries('s11', 'diesel'), [])
+
+        self.assertEqual(self.history.record(self.createDataset(12, 1.699), 1020), 8 * 3)
+        self.assertEqual(self.history.getSeries('s0', 'diesel'), [(1000, 1.659), (1020, 1.699)])
+
+    def testRecordReplacesStationsOfEarlierRecords(self):
+        self.history.record(self.createDataset(8), 1000)
+        stations = [{'id': 'new', 'lat': 51.0, 'lng': 9.0, 'dist': 1.0, 'e5': 1.8, 'e10': 1.75, 'diesel': 1.7}]
+
+        self.assertEqual(self.history.record(StationDataset({'ok': True, 'stations': stations}, 'all'), 2000), 3)
+        self.assertEqual(self.history.getSeries('new', 'diesel'), [(2000, 1.7)])
+
+    def testRecordStoresEveryFuelOfSingleTypeDataset(self):
+        stations = [{'id': 's0', 'lat': 50.0, 'lng': 8.0, 'dist': 0.5, 'e5': 1.859, 'e10': 1.799, 'diesel': 1.659}]
+
+        self.assertEqual(self.history.record(StationDataset({'ok': True, 'stations': stations}, 'diesel'), 1000), 3)
+        self.assertEqual(self.history.getSeries('s0', 'e5'), [(1000, 1.859)])
+
+    def testCheapestHoursFollowAppendsAndOverwrittenEntries(self):
+        now = int(time.time())
+        for step in range(40):
+            self.history.record(self.createDataset(4, 1.6 + (step % 5) * 0.01), now - (40 - step) * 3600)
+            self.assertEqual(self.roundDifferences(self.history.getCheapestHours(50.0, 8.0, 10.0, 'diesel', limit=200)), self.getCheapestHours(4, 'diesel', 28 * 24 * 60 * 60))
+
+        hours = self.history.getCheapestHours(50.0, 8.0, 10.0, 'diesel', limit=200, window=5 * 3600 + 1800)
+        self.assertEqual(self.roundDifferences(hours), self.getCheapestHours(4, 'diesel', 5 * 3600 + 1800))
+
+    def roundDifferences(self, hours):
+        return [dict(hour, difference=round(hour['difference'], 6)) for hour in hours]
+
+    def getCheapestHours(self, count, fuel, window):
+        '''
+        Calculates the cheapest hours from the series of every station, as reference for getCheapestHours().
+        '''
+
+        sums = [0.0] * PriceHistory.HOURS_PER_WEEK
+        counts = [0] * PriceHistory.HOURS_PER_WEEK
+        for index in range(count):
+            series = self.history.getSeries('s' + str(index), fuel, time.time() - window)
+            if not series:
+                continue
+
+            average = sum(price for (timestamp, price) in series) / len(series)
+            for (timestamp, price) in series:
+                localTime = time.localtime(timestamp)
+                sums[localTime.tm_wday * 24 + localTime.tm_hour] += price - average
+                counts[localTime.tm_wday * 24 + localTime.tm_hour] += 1
+
+        hours = [
+            {'weekday': hour // 24, 'hour': hour % 24, 'difference': sums[hour] / counts[hour], 'samples': counts[hour]}
+            for hour in range(PriceHistory.HOURS_PER_WEEK) if counts[hour] > 0
+        ]
+        hours.sort(key=lambda hour: hour['difference'])
+
+        return self.roundDifferences(hours)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ResponseCache import ResponseCache
+
+class ResponseCacheTest(unittest.TestCase):
+    '''
+    Author: Marian Neff
+    -------------------
+    Tests the expiry, the eviction and the shared in-flight requests of the ResponseCache.
+    -------------------
+    '''
+
+    def testEntryExpiresAfterTtlButStaysLastKnown(self):
+        cache = ResponseCache(ttl=0.05)
+        key = ResponseCache.normalizeKey(50.0, 8.0, 5, 'e5')
+        cache.put(key, {'stations': []})
+
+        self.assertEqual(cache.get(key), {'stations': []})
+
+        time.sleep(0.1)
+
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(cache.getLastKnown(key), {'stations': []})
+
+    def testExpiredEntryIsFetchedAgain(self):
+        cache = ResponseCache(ttl=0.05)
+        fetches = []
+
+        def fetch():
+            fetches.append(len(fetches))
+
+            return {'fetch': len(fetches)}
+
+        self.assertEqual(cache.getOrFetch('key', fetch), {'fetch': 1})
+        self.assertEqual(cache.getOrFetch('key', fetch), {'fetch': 1})
+
+        time.sleep(0.1)
+
+        self.assertEqual(cache.getOrFetch('key', fetch), {'fetch': 2})
+
+    def testNormalizeKeyRoundsCoordinates(self):
+        self.assertEqual(ResponseCache.normalizeKey(50.00001, 8.00004, 5, 'e5'), ResponseCache.normalizeKey(50.0, 8.0, 5.0, 'e5'))
+
+    def testConcurrentCallersShareOneFetch(self):
+        cache = ResponseCache()
+        started = threading.Event()
+        release = threading.Event()
+        fetches = []
+
+        def fetch():
+            fetches.append(threading.get_ident())
+            started.set()
+            release.wait(5)
+
+            return {'stations': ['s1']}
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.getOrFetch('key', fetch))) for index in range(5)]
+        threads[0].start()
+        self.assertTrue(started.wait(5))
+        for thread in threads[1:]:
+            thread.start()
+
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(fetches), 1)
+        self.assertEqual(results, [{'stations': ['s1']}] * 5)
+
+    def testFailedFetchIsNotCached(self):
+        cache = ResponseCache()
+        fetches = []
+
+        def fetch():
+            fetches.append(None)
+
+            return None
+
+        self.assertIsNone(cache.getOrFetch('key', fetch))
+        self.assertIsNone(cache.getOrFetch('key', fetch))
+        self.assertEqual(len(fetches), 2)
+        self.assertIsNone(cache.getLastKnown('key'))
+
+    def testLeastRecentlyUsedEntryIsEvicted(self):
+        cache = ResponseCache(maxEntries=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.getLastKnown('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+if __name__ == '__main__':
+    unittest.main()
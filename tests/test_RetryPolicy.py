@@ -0,0 +1,113 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ApiExceptions import FatalApiError, RetryableApiError
+from RetryPolicy import RetryPolicy
+
+class RetryPolicyTest(unittest.TestCase):
+    '''
+    Author: Marian Neff
+    -------------------
+    Tests the retries, the backoff and the time budget of the RetryPolicy with a simulated clock, so no test actually waits.
+    -------------------
+    '''
+
+    def setUp(self):
+        self.now = 0.0
+        self.delays = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.delays.append(delay)
+        self.now += delay
+
+    def createRequest(self, failures, duration=0.1, error=None):
+        '''
+        Returns a request that fails the first failures times and takes duration simulated seconds per attempt.
+        '''
+
+        attempts = []
+
+        def request():
+            attempts.append(self.now)
+            self.now += duration
+            if len(attempts) <= failures:
+                raise error if error is not None else RetryableApiError('The API responded with status 503.')
+
+            return {'ok': True}
+
+        return (request, attempts)
+
+    def testRetriesUntilSuccessWithGrowingDelays(self):
+        policy = RetryPolicy(attempts=3, baseDelay=0.5, maxDelay=2.0)
+        (request, attempts) = self.createRequest(2)
+
+        self.assertEqual(policy.run(request, self.sleep, self.clock), {'ok': True})
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(len(self.delays), 2)
+        for attempt, delay in enumerate(self.delays):
+            self.assertLessEqual(delay, min(policy.maxDelay, policy.baseDelay * 2 ** attempt))
+
+    def testGivesUpAfterLastAttempt(self):
+        policy = RetryPolicy(attempts=3)
+        (request, attempts) = self.createRequest(5)
+
+        with self.assertRaises(RetryableApiError):
+            policy.run(request, self.sleep, self.clock)
+        self.assertEqual(len(attempts), 3)
+
+    def testFatalErrorIsNotRetried(self):
+        policy = RetryPolicy()
+        (request, attempts) = self.createRequest(1, error=FatalApiError('The API responded with status 403.'))
+
+        with self.assertRaises(FatalApiError):
+            policy.run(request, self.sleep, self.clock)
+        self.assertEqual(len(attempts), 1)
+
+    def testTimeoutIsNotRetriedBeyondMaxDuration(self):
+        policy = RetryPolicy()
+        (request, attempts) = self.createRequest(5, duration=policy.connectTimeout + policy.readTimeout)
+
+        with self.assertRaises(RetryableApiError):
+            policy.run(request, self.sleep, self.clock)
+        self.assertEqual(len(attempts), 1)
+        self.assertLessEqual(self.now, policy.maxDuration)
+
+    def testCallStaysWithinMaxDuration(self):
+        policy = RetryPolicy()
+        for duration in (0.1, 1.0, 2.5, 4.0, policy.connectTimeout + policy.readTimeout):
+            self.now = 0.0
+            (request, attempts) = self.createRequest(5, duration=duration)
+            with self.assertRaises(RetryableApiError):
+                policy.run(request, self.sleep, self.clock)
+
+            self.assertLessEqual(self.now, policy.maxDuration)
+            self.assertLess(self.now, 15.0)
+
+    def testRetryAfterIsRespectedAndLimited(self):
+        policy = RetryPolicy(maxRetryAfter=5.0)
+        (request, attempts) = self.createRequest(1, error=RetryableApiError('The API responded with status 429.', 3.0))
+
+        self.assertEqual(policy.run(request, self.sleep, self.clock), {'ok': True})
+        self.assertGreaterEqual(self.delays[0], 3.0)
+
+        (request, attempts) = self.createRequest(1, error=RetryableApiError('The API responded with status 429.', 60.0))
+        with self.assertRaises(RetryableApiError):
+            policy.run(request, self.sleep, self.clock)
+        self.assertEqual(len(attempts), 1)
+
+    def testParseRetryAfter(self):
+        policy = RetryPolicy()
+
+        self.assertEqual(policy.parseRetryAfter('2'), 2.0)
+        self.assertEqual(policy.parseRetryAfter('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+        self.assertIsNone(policy.parseRetryAfter('soon'))
+        self.assertIsNone(policy.parseRetryAfter(None))
+
+if __name__ == '__main__':
+    unittest.main()
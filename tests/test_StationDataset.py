@@ -0,0 +1,84 @@
+import math
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from StationDataset import StationDataset
+
+class StationDatasetTest(unittest.TestCase):
+    '''
+    Author: Marian Neff
+    -------------------
+    Tests the columns of the StationDataset and its binary round trip through toBytes() and fromBytes().
+    -------------------
+    '''
+
+    def createDataset(self, type='all'):
+        stations = [
+            {'id': 's1', 'name': 'Aral', 'brand': 'ARAL', 'street': 'Hauptstr.', 'houseNumber': '1', 'postCode': 10115, 'place': 'Berlin', 'lat': 52.53, 'lng': 13.38, 'dist': 0.4, 'e5': 1.859, 'e10': 1.799, 'diesel': 1.689, 'isOpen': True},
+            {'id': 's2', 'name': 'Shell', 'brand': 'Shell', 'street': 'Nebenstr.', 'houseNumber': None, 'postCode': 10117, 'place': 'Berlin', 'lat': 52.52, 'lng': 13.39, 'dist': 1.2, 'e5': False, 'e10': None, 'diesel': 1.729, 'isOpen': False},
+            {'id': 's3', 'name': 'Jet', 'brand': 'JET', 'street': 'Ring', 'houseNumber': '7a', 'postCode': 10119, 'place': 'Berlin', 'lat': 52.51, 'lng': 13.40, 'dist': 2.5, 'e5': None, 'e10': None, 'diesel': None, 'isOpen': True}
+        ]
+
+        return StationDataset({'ok': True, 'stations': stations}, type)
+
+    def assertColumnEqual(self, column, expected):
+        self.assertEqual(len(column), len(expected))
+        for (value, expectedValue) in zip(column, expected):
+            if math.isnan(expectedValue):
+                self.assertTrue(math.isnan(value))
+            else:
+                self.assertEqual(value, expectedValue)
+
+    def testColumnsOfTypeAll(self):
+        dataset = self.createDataset()
+
+        self.assertEqual(dataset.size, 3)
+        self.assertColumnEqual(dataset.price, [1.689, 1.729, float('nan')])
+        self.assertTrue(math.isnan(dataset.fuelPrices['e5'][1]))
+        self.assertEqual(dataset.lowestPrice, 1.689)
+        self.assertEqual(dataset.getText('id', 2), 's3')
+
+    def testRoundTripKeepsEveryColumn(self):
+        dataset = self.createDataset()
+        dataset.fetchedAt = 1700000000.5
+
+        restored = StationDataset.fromBytes(dataset.toBytes())
+
+        self.assertEqual(restored.type, dataset.type)
+        self.assertEqual(restored.size, dataset.size)
+        self.assertEqual(restored.lowestPrice, dataset.lowestPrice)
+        self.assertEqual(restored.fetchedAt, dataset.fetchedAt)
+        self.assertEqual(restored.text, dataset.text)
+        self.assertEqual(list(restored.tier), list(dataset.tier))
+        for name in ('lat', 'lng', 'dist', 'price'):
+            self.assertColumnEqual(getattr(restored, name), getattr(dataset, name))
+        for fuel in StationDataset.FUEL_TYPES:
+            self.assertColumnEqual(restored.fuelPrices[fuel], dataset.fuelPrices[fuel])
+        for index in range(dataset.size):
+            self.assertEqual(restored.getMarkerSource(index), dataset.getMarkerSource(index))
+
+    def testRoundTripOfSingleTypeAndEmptyDataset(self):
+        dataset = self.createDataset('e10')
+        restored = StationDataset.fromBytes(dataset.toBytes())
+
+        self.assertEqual(restored.type, 'e10')
+        self.assertIsNone(restored.fetchedAt)
+        self.assertColumnEqual(restored.price, dataset.price)
+
+        empty = StationDataset.fromBytes(StationDataset({'stations': []}, 'e5').toBytes())
+        self.assertEqual(empty.size, 0)
+        self.assertEqual(len(empty.price), 0)
+
+    def testFromBytesRejectsInvalidContent(self):
+        content = self.createDataset().toBytes()
+
+        with self.assertRaises(ValueError):
+            StationDataset.fromBytes(b'XXXX' + content[4:])
+        with self.assertRaises(ValueError):
+            StationDataset.fromBytes(content[:-5])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from GeoMath import GeoMath
+from StationIndex import StationIndex
+
+class StationIndexTest(unittest.TestCase):
+    '''
+    Author: Marian Neff
+    -------------------
+    Tests that the StationIndex answers covered queries like the list endpoint and leaves the others to the API.
+    -------------------
+    '''
+
+    CENTER = (52.52, 13.40)
+
+    def setUp(self):
+        self.index = StationIndex(ttl=60)
+        stations = []
+        for index in range(20):
+            (lat, lng) = GeoMath.offset(self.CENTER[0], self.CENTER[1], index - 10, (index % 5) - 2)
+            stations.append({'id': 's' + str(index), 'lat': lat, 'lng': lng, 'e5': 1.8 + index / 1000, 'e10': 1.75, 'diesel': 1.65})
+        self.stations = stations
+        self.index.add(self.CENTER[0], self.CENTER[1], 25.0, 'all', {'ok': True, 'stations': stations})
+
+    def testCoveredQueryIsFilteredAndSorted(self):
+        data = self.index.query(self.CENTER[0], self.CENTER[1], 5.0, 'all')
+
+        expected = [station['id'] for station in self.stations if GeoMath.haversine(self.CENTER[0], self.CENTER[1], station['lat'], station['lng']) <= 5.0]
+        self.assertEqual(sorted(station['id'] for station in data['stations']), sorted(expected))
+        distances = [station['dist'] for station in data['stations']]
+        self.assertEqual(distances, sorted(distances))
+        self.assertTrue(all(distance <= 5.0 for distance in distances))
+
+    def testSingleTypeIsProjectedFromTypeAll(self):
+        data = self.index.query(self.CENTER[0], self.CENTER[1], 5.0, 'e5')
+
+        self.assertTrue(len(data['stations']) > 0)
+        for station in data['stations']:
+            self.assertNotIn('e10', station)
+            self.assertEqual(station['price'], next(original['e5'] for original in self.stations if original['id'] == station['id']))
+
+    def testUncoveredQueryIsNotAnswered(self):
+        (lat, lng) = GeoMath.offset(self.CENTER[0], self.CENTER[1], 22.0, 0.0)
+
+        self.assertIsNone(self.index.query(lat, lng, 5.0, 'all'))
+        self.assertIsNone(self.index.query(self.CENTER[0], self.CENTER[1], 25.0 + 0.1, 'all'))
+
+    def testExpiredResponseIsNotUsed(self):
+        index = StationIndex(ttl=0.05)
+        index.add(self.CENTER[0], self.CENTER[1], 25.0, 'all', {'ok': True, 'stations': self.stations})
+        self.assertIsNotNone(index.query(self.CENTER[0], self.CENTER[1], 5.0, 'all'))
+
+        time.sleep(0.1)
+
+        self.assertIsNone(index.query(self.CENTER[0], self.CENTER[1], 5.0, 'all'))
+
+    def testSingleTypeResponseDoesNotAnswerOtherTypes(self):
+        index = StationIndex()
+        index.add(self.CENTER[0], self.CENTER[1], 25.0, 'e5', {'ok': True, 'stations': []})
+
+        self.assertIsNotNone(index.query(self.CENTER[0], self.CENTER[1], 5.0, 'e5'))
+        self.assertIsNone(index.query(self.CENTER[0], self.CENTER[1], 5.0, 'diesel'))
+
+if __name__ == '__main__':
+    unittest.main()
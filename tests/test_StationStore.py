@@ -0,0 +1,71 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from StationStore import StationStore
+
+class StationStoreTest(unittest.TestCase):
+    '''
+    Author: Marian Neff
+    -------------------
+    Tests the StationStore with a database in a temporary directory.
+    -------------------
+    '''
+
+    def setUp(self):
+        self.__directory = tempfile.TemporaryDirectory()
+        self.fileName = os.path.join(self.__directory.name, 'stations.sqlite')
+
+    def tearDown(self):
+        self.__directory.cleanup()
+
+    def createStations(self, first, count):
+        return [
+            {'id': 's' + str(index), 'name': 'Station ' + str(index), 'lat': 50.0, 'lng': 8.0, 'dist': float(index - first), 'price': 1.799, 'isOpen': True}
+            for index in range(first, first + count)
+        ]
+
+    def count(self, table):
+        connection = sqlite3.connect(self.fileName)
+        try:
+            return connection.execute('SELECT COUNT(*) FROM ' + table).fetchone()[0]
+        finally:
+            connection.close()
+
+    def testAreaIsLoadedWithoutPrices(self):
+        store = StationStore(self.fileName)
+        self.assertTrue(store.saveArea((50.0, 8.0, 5.0), self.createStations(0, 3)))
+
+        stations = store.loadArea((50.0, 8.0, 5.0), 60)
+
+        self.assertEqual([station['id'] for station in stations], ['s0', 's1', 's2'])
+        self.assertEqual([station['dist'] for station in stations], [0.0, 1.0, 2.0])
+        self.assertTrue(all('price' not in station and 'isOpen' not in station for station in stations))
+        self.assertIsNone(store.loadArea((50.1, 8.0, 5.0), 60))
+        self.assertIsNone(store.loadArea((50.0, 8.0, 5.0), -1))
+
+    def testSaveKeepsOnlyNewestAreasAndTheirStations(self):
+        store = StationStore(self.fileName, maxAreas=2)
+        for area in range(5):
+            store.saveArea((50.0 + area, 8.0, 5.0), self.createStations(area * 2, 3))
+
+        self.assertEqual(self.count('areas'), 2)
+        self.assertEqual(self.count('stations'), 5)
+        self.assertIsNone(store.loadArea((50.0, 8.0, 5.0), 60))
+        self.assertEqual(len(store.loadArea((54.0, 8.0, 5.0), 60)), 3)
+        self.assertEqual(len(store.loadArea((53.0, 8.0, 5.0), 60)), 3)
+
+    def testSaveDeletesOutdatedAreas(self):
+        store = StationStore(self.fileName, maxAge=-1)
+        store.saveArea((50.0, 8.0, 5.0), self.createStations(0, 3))
+        store.saveArea((51.0, 8.0, 5.0), self.createStations(10, 3))
+
+        self.assertEqual(self.count('areas'), 0)
+        self.assertEqual(self.count('stations'), 0)
+
+if __name__ == '__main__':
+    unittest.main()